@@ -0,0 +1,45 @@
+from fastapi import APIRouter, BackgroundTasks, Query, Request
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.cache_manager import LocalCache, PIPELINE_VERSION
+from app.core.memory_cache import memory_cache
+from app.core.progress_logger import ProgressEmitter
+from app.core.ws_manager import ws_manager
+from app.pipeline.cache_warmup import warm_cache
+from app.schemas.session_schema import PipelineSession
+
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+@router.get("/stats")
+async def cache_stats():
+    cache = LocalCache(pipeline_ver=PIPELINE_VERSION)
+    disk = await run_in_threadpool(cache.index.stats)
+    return {"disk": disk, "memory": memory_cache.stats()}
+
+@router.post("/purge")
+async def cache_purge(dry_run: bool = Query(False)):
+    cache = LocalCache(pipeline_ver=PIPELINE_VERSION)
+    return await run_in_threadpool(cache.purge, dry_run)
+
+@router.post("/evict")
+async def cache_evict(max_gb: float = Query(..., ge=0)):
+    cache = LocalCache(pipeline_ver=PIPELINE_VERSION)
+    freed = await run_in_threadpool(cache.enforce_quota, int(max_gb * 1024 ** 3))
+    return {"freed_bytes": freed}
+
+@router.post("/warmup")
+async def cache_warmup(
+    request: Request,
+    session: PipelineSession,
+    background_tasks: BackgroundTasks,
+    runId: str = Query(...),
+    cohort_level: bool = Query(True),
+):
+    progress_emitter = ProgressEmitter(lambda msg: ws_manager.send(runId, msg))
+    pm = request.app.state.participant_manager
+
+    # Runs after the response is sent; progress is reported over the ws channel
+    background_tasks.add_task(warm_cache, pm, session, progress_emitter, cohort_level=cohort_level)
+    await progress_emitter.log("Warm-up scheduled")
+    return {"status": "scheduled", "runId": runId}
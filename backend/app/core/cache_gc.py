@@ -0,0 +1,49 @@
+"""Command-line maintenance for the on-disk EEG cache.
+
+Usage (from the backend directory):
+
+    python -m app.core.cache_gc stats
+    python -m app.core.cache_gc purge [--dry-run]
+    python -m app.core.cache_gc evict --max-gb 50
+
+`purge` removes entries written by other PIPELINE_VERSIONs, quarantined .bad
+files and abandoned temp directories; `evict` shrinks the cache to a size
+using the configured LRU/LFU policy (EEG_CACHE_EVICTION); `--max-gb 0`
+evicts every entry not in use.
+"""
+import argparse
+import json
+import logging
+from pathlib import Path
+
+from app.core.cache_manager import LocalCache, PIPELINE_VERSION
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.core.cache_gc", description=__doc__.splitlines()[0])
+    parser.add_argument("--base", type=Path, default=None, help="cache directory (default: <repo>/.eegcache)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="show index size and per-version usage")
+    purge = sub.add_parser("purge", help="remove old pipeline versions, .bad files and stale temp dirs")
+    purge.add_argument("--dry-run", action="store_true")
+    evict = sub.add_parser("evict", help="evict entries until the cache fits --max-gb")
+    evict.add_argument("--max-gb", type=float, required=True, help="target size in GB (0 = evict all)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    cache = LocalCache(base_dir=args.base, pipeline_ver=PIPELINE_VERSION)
+
+    if args.command == "stats":
+        cache.index.sync()
+        result = cache.index.stats()
+    elif args.command == "purge":
+        result = cache.purge(dry_run=args.dry_run)
+    else:
+        result = {"freed_bytes": cache.enforce_quota(int(args.max_gb * 1024 ** 3))}
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,360 @@
+"""SQLite index of LocalCache entries with quota-driven eviction.
+
+Every committed artifact is recorded with its CacheKey fields (subject, task,
+run, stage, pipeline version), the full params JSON behind the filename hash,
+the source-file fingerprint, its on-disk files, total size, sfreq/n_epochs, creation time, last access
+time and hit count. The index lives next to the data
+(`<cache>/index.sqlite3`) so every process sharing the cache directory sees
+the same bookkeeping, and "which tasks already have stage X for these
+params?" is a single query (see `cached_tasks`).
+
+The disk quota comes from EEG_CACHE_MAX_GB (0/unset = unlimited) and the
+eviction policy from EEG_CACHE_EVICTION ("lru", the default, or "lfu").
+
+The database uses SQLite's default rollback journal: WAL needs shared memory
+between processes, which network file systems do not provide. Hits are
+counted in memory and written in batches, so cache reads do not each write
+to the database. Entries whose lock is held are skipped by eviction and
+purge, because lazy readers still have their files open.
+"""
+import atexit
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+INDEX_FILE = "index.sqlite3"
+# <16 hex hash>-<pipeline ver>_<type>.<ext>, e.g. 1aba45b406c86ea1-v3_epo.fif
+_ENTRY_RE = re.compile(r"^[0-9a-f]{16}-(?P<ver>[^_]+)_(?P<type>[a-z]+)\.(?:fif|npz|d)$")
+TMP_MAX_AGE_S = 6 * 3600
+# Pending hit counts are written once this many entries or seconds have accumulated
+HIT_FLUSH_MAX = 256
+HIT_FLUSH_SEC = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    pipeline_ver TEXT,
+    files TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+# Key metadata columns, added in place to indexes created before they existed
+_META_COLUMNS = {
+    "type": "TEXT",
+    "subject": "TEXT",
+    "task": "TEXT",
+    "run": "INTEGER",
+    "stage": "TEXT",
+    "params_hash": "TEXT",
+    "params": "TEXT",
+    "source": "TEXT",
+    "sfreq": "REAL",
+    "n_epochs": "INTEGER",
+}
+
+
+def default_quota_bytes() -> int:
+    """Return the disk quota from EEG_CACHE_MAX_GB (0 = unlimited)."""
+    return int(float(os.getenv("EEG_CACHE_MAX_GB", "0") or 0) * 1024 ** 3)
+
+
+def default_policy() -> str:
+    """Return the eviction policy from EEG_CACHE_EVICTION ("lru" or "lfu")."""
+    policy = os.getenv("EEG_CACHE_EVICTION", "lru").lower()
+    return policy if policy in ("lru", "lfu") else "lru"
+
+
+def _size_of(p: Path) -> int:
+    if p.is_dir():
+        return sum(f.stat().st_size for f in p.rglob("*") if f.is_file())
+    return p.stat().st_size if p.exists() else 0
+
+
+def _remove(p: Path):
+    if p.is_dir():
+        shutil.rmtree(p, ignore_errors=True)
+    else:
+        p.unlink(missing_ok=True)
+
+
+_shared: dict[Path, "CacheIndex"] = {}
+_shared_lock = threading.Lock()
+
+
+class CacheIndex:
+    """Per-entry size/access bookkeeping for one cache root."""
+
+    def __init__(self, base: Path, quota_bytes: int | None = None, policy: str | None = None):
+        """Open (and create/migrate if needed) the index database under base."""
+        self.base = Path(base)
+        self.db_path = self.base / INDEX_FILE
+        self.quota_bytes = default_quota_bytes() if quota_bytes is None else int(quota_bytes)
+        self.policy = policy or default_policy()
+        self._hits: dict[str, list] = {}  # rel path -> [pending hits, last access]
+        self._hits_lock = threading.Lock()
+        self._hits_flushed = time.monotonic()
+        atexit.register(self.flush_hits)
+        with self._connect() as db:
+            # Indexes created with WAL stay in WAL mode until switched back
+            try:
+                db.execute("PRAGMA journal_mode=DELETE")
+            except sqlite3.OperationalError as e:
+                log.warning("[cache-index] could not leave WAL mode (in use elsewhere?): %s", e)
+            db.execute(_SCHEMA)
+            existing = {row[1] for row in db.execute("PRAGMA table_info(entries)")}
+            for name, sql_type in _META_COLUMNS.items():
+                if name not in existing:
+                    db.execute(f"ALTER TABLE entries ADD COLUMN {name} {sql_type}")
+            db.execute("CREATE INDEX IF NOT EXISTS entries_lookup ON entries (stage, params_hash, pipeline_ver)")
+
+    @classmethod
+    def shared(cls, base: Path) -> "CacheIndex":
+        """Return the process-wide index of base, opened and migrated once."""
+        with _shared_lock:
+            index = _shared.get(Path(base).resolve())
+            if index is None:
+                index = _shared[Path(base).resolve()] = cls(base)
+            return index
+
+    def __reduce__(self):
+        # Pickled into worker processes with LocalCache: reopen that process's shared index
+        return CacheIndex.shared, (self.base,)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _rel(self, p: Path) -> str:
+        return Path(p).relative_to(self.base).as_posix()
+
+    # --- bookkeeping ---
+    def record_save(self, p: Path, files: list[Path], pipeline_ver: str | None, meta: dict | None = None):
+        """Register (or replace) an entry made of files after a commit.
+
+        `meta` may carry any of the key metadata columns (subject, task, run,
+        stage, type, params_hash, params, source, sfreq, n_epochs).
+        """
+        now = time.time()
+        size = sum(_size_of(f) for f in files)
+        names = ",".join(sorted(f.name for f in files))
+        meta = {k: v for k, v in (meta or {}).items() if k in _META_COLUMNS}
+        columns = ["path", "pipeline_ver", "files", "size", "created", "last_access", "hits", *meta]
+        values = [self._rel(p), pipeline_ver, names, size, now, now, 0, *meta.values()]
+        updates = ", ".join(f"{c}=excluded.{c}" for c in columns if c not in ("path", "hits"))
+        try:
+            with self._connect() as db:
+                db.execute(
+                    f"INSERT INTO entries ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT(path) DO UPDATE SET {updates}",
+                    values,
+                )
+        except sqlite3.Error as e:
+            log.warning("[cache-index] record_save failed for %s: %s", p.name, e)
+
+    def record_hit(self, p: Path):
+        """Count a hit of an entry; pending hits are written in batches (see flush_hits)."""
+        rel = self._rel(p)
+        with self._hits_lock:
+            entry = self._hits.setdefault(rel, [0, 0.0])
+            entry[0] += 1
+            entry[1] = time.time()
+            due = len(self._hits) >= HIT_FLUSH_MAX or time.monotonic() - self._hits_flushed >= HIT_FLUSH_SEC
+        if due:
+            self.flush_hits()
+
+    def flush_hits(self):
+        """Write pending hit counts and last access times to the database."""
+        with self._hits_lock:
+            pending, self._hits = self._hits, {}
+            self._hits_flushed = time.monotonic()
+        if not pending:
+            return
+        try:
+            with self._connect() as db:
+                db.executemany(
+                    "UPDATE entries SET hits = hits + ?, last_access = MAX(last_access, ?) WHERE path = ?",
+                    [(n, last, rel) for rel, (n, last) in pending.items()],
+                )
+        except sqlite3.Error as e:
+            log.warning("[cache-index] writing %d pending hits failed: %s", len(pending), e)
+
+    def forget(self, p: Path):
+        """Drop an entry from the index (files are left alone)."""
+        with self._connect() as db:
+            db.execute("DELETE FROM entries WHERE path = ?", (self._rel(p),))
+
+    def cached_tasks(self, stage: str, params_hash: str, pipeline_ver: str) -> set[tuple]:
+        """Return the (subject, task, run, source) tuples that have stage cached for params_hash."""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT subject, task, run, source FROM entries WHERE stage = ? AND params_hash = ? AND pipeline_ver = ?",
+                (stage, params_hash, pipeline_ver),
+            ).fetchall()
+        return {tuple(r) for r in rows}
+
+    def entries(self, **where) -> list[dict]:
+        """Return index rows (as dicts) matching column=value filters."""
+        clause = " AND ".join(f"{c} IS ?" for c in where) or "1"
+        with self._connect() as db:
+            db.row_factory = sqlite3.Row
+            rows = db.execute(f"SELECT * FROM entries WHERE {clause}", tuple(where.values())).fetchall()
+        return [dict(r) for r in rows]
+
+    def total_size(self) -> int:
+        """Return the summed size of indexed entries in bytes."""
+        with self._connect() as db:
+            return int(db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0])
+
+    def stats(self) -> dict:
+        """Return entry count, size, quota and a per-version breakdown."""
+        self.flush_hits()
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT pipeline_ver, COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) "
+                "FROM entries GROUP BY pipeline_ver"
+            ).fetchall()
+        return {
+            "entries": sum(r[1] for r in rows),
+            "bytes": sum(r[2] for r in rows),
+            "quota_bytes": self.quota_bytes,
+            "policy": self.policy,
+            "versions": {r[0]: {"entries": r[1], "bytes": r[2], "hits": r[3]} for r in rows},
+        }
+
+    # --- maintenance ---
+    def sync(self) -> int:
+        """Index artifacts found on disk but missing from the index; return count added."""
+        with self._connect() as db:
+            known = {r[0] for r in db.execute("SELECT path FROM entries")}
+        added = 0
+        for p in self.base.rglob("*"):
+            m = _ENTRY_RE.match(p.name)
+            if not m or self._rel(p) in known or any(part.startswith(".tmp-") for part in p.parts):
+                continue
+            files = [p] + [
+                f for f in p.parent.glob(f"{p.name.rsplit('.', 1)[0]}*")
+                if f != p and not f.name.endswith((".lock", ".bad")) and ".tmp-" not in f.name
+            ]
+            self.record_save(p, files, m.group("ver"), self._meta_from_path(p, m))
+            mtime = p.stat().st_mtime
+            with self._connect() as db:
+                db.execute(
+                    "UPDATE entries SET created = ?, last_access = ? WHERE path = ?",
+                    (mtime, mtime, self._rel(p)),
+                )
+            added += 1
+        return added
+
+    def _meta_from_path(self, p: Path, m: re.Match) -> dict:
+        """Recover key fields from <subject>/<task>/run-*/<stage>/<hash>-<ver>_<type>.<ext>."""
+        meta = {"type": m.group("type"), "params_hash": p.name.split("-", 1)[0]}
+        parts = Path(self._rel(p)).parts
+        if len(parts) == 5 and parts[2].startswith("run-"):
+            run = parts[2][len("run-"):]
+            meta.update(
+                subject=parts[0], task=parts[1], stage=parts[3], run=int(run) if run.isdigit() else None
+            )
+        elif len(parts) == 4 and parts[0] == "cohort":
+            meta.update(task=parts[1], stage=parts[2], params_hash=None)
+        return meta
+
+    def _delete(self, rel: str, names: str, lock_fn) -> int | None:
+        """Remove an entry's files and lock file under its exclusive lock; return bytes freed.
+
+        Returns None, leaving the entry alone, if its lock is held (a reader
+        is using the files).
+        """
+        p = self.base / rel
+        freed = 0
+        try:
+            with lock_fn(p, blocking=False):
+                for name in names.split(","):
+                    f = p.parent / name
+                    if f.exists():
+                        freed += _size_of(f)
+                        _remove(f)
+                p.with_name(p.name + ".lock").unlink(missing_ok=True)
+        except BlockingIOError:
+            log.info("[cache-index] %s is in use, not deleted", rel)
+            return None
+        self.forget(p)
+        return freed
+
+    def evict(self, lock_fn, protect: Path | None = None, target_bytes: int | None = None) -> int:
+        """Evict entries by policy until the index fits target_bytes (default quota).
+
+        A quota of 0 means unlimited; an explicit target_bytes of 0 evicts
+        every entry that is not protected or in use.
+        """
+        if target_bytes is None:
+            if self.quota_bytes <= 0:
+                return 0
+            target = self.quota_bytes
+        else:
+            target = max(0, target_bytes)
+        total = self.total_size()
+        if total <= target:
+            return 0
+        self.flush_hits()
+        order = "last_access ASC" if self.policy == "lru" else "hits ASC, last_access ASC"
+        with self._connect() as db:
+            rows = db.execute(f"SELECT path, files, size FROM entries ORDER BY {order}").fetchall()
+        protected = self._rel(protect) if protect is not None else None
+        freed = 0
+        for rel, names, size in rows:
+            if total - freed <= target:
+                break
+            if rel == protected:
+                continue
+            deleted = self._delete(rel, names, lock_fn)
+            if deleted is None:
+                continue
+            freed += deleted
+            log.info("[cache-index] EVICT %s (%.1f MB, policy=%s)", rel, size / 1e6, self.policy)
+        return freed
+
+    def purge(self, lock_fn, keep_version: str, dry_run: bool = False) -> dict:
+        """Remove entries of other pipeline versions, .bad files and stale temp dirs."""
+        self.sync()
+        with self._connect() as db:
+            old = db.execute(
+                "SELECT path, files, size FROM entries WHERE pipeline_ver IS NOT ? ", (keep_version,)
+            ).fetchall()
+        report = {"old_versions": len(old), "bad_files": 0, "tmp_dirs": 0, "bytes": sum(r[2] for r in old)}
+        if not dry_run:
+            for rel, names, size in old:
+                if self._delete(rel, names, lock_fn) is None:
+                    report["bytes"] -= size
+                    report.setdefault("in_use", []).append(rel)
+
+        now = time.time()
+        for p in list(self.base.rglob("*.bad")):
+            report["bad_files"] += 1
+            report["bytes"] += _size_of(p)
+            if not dry_run:
+                _remove(p)
+        for p in [p for p in self.base.rglob("*") if ".tmp-" in p.name]:
+            if not p.exists() or now - p.stat().st_mtime < TMP_MAX_AGE_S:
+                continue  # may belong to a write still in progress
+            report["tmp_dirs"] += 1
+            report["bytes"] += _size_of(p)
+            if not dry_run:
+                _remove(p)
+        return report
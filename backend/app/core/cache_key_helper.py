@@ -16,6 +16,7 @@ def get_cleaning_key(session: PipelineSession) -> dict[str, float | bool]:
         "clean_flatline_sec",
         "clean_hf_noise_sd_max",
         "clean_corr_min",
+        "clean_corr_window_sec",
         "clean_asr_max_std",
         "clean_power_min_sd",
         "clean_power_max_sd",
@@ -28,6 +29,8 @@ def get_cleaning_key(session: PipelineSession) -> dict[str, float | bool]:
 
     if session.filter.clean_asr_remove_only:
         key["clean_asr_remove_only"] = True
+    if session.filter.clean_window_hop:
+        key["clean_window_hop"] = True
 
     return key
 
@@ -43,3 +46,17 @@ def get_evoked_key(session: PipelineSession):
         **get_epochs_key(session),
         "stimulus": session.epochs.stimulus,
     }
+
+def get_evoked_by_condition_key(session: PipelineSession):
+    return {
+        **get_epochs_key(session),
+        "by_condition": True,
+    }
+
+def get_psd_key(session: PipelineSession, tmin: float | None, tmax: float | None, fft_sec: float):
+    return {
+        **get_epochs_key(session),
+        "psd_tmin": tmin,
+        "psd_tmax": tmax,
+        "fft_sec": fft_sec,
+    }
@@ -1,11 +1,17 @@
 """File-system backed cache for intermediate EEG processing artifacts.
 
 Provides simple hashed-path storage for:
-    - filtered Raw FIF files
-    - Epochs FIF + optional labels JSON
-    - Evoked FIF files
-
-Corruption detection quarantines bad files automatically.
+    - filtered Raw FIF files + annotation events JSON
+    - Epochs FIF + optional labels JSON (or chunked float32 arrays, EEG_EPOCHS_FORMAT=chunked)
+    - Evoked FIF files (single or one condition per Evoked)
+    - per-epoch power spectra (NPZ + measurement info sidecar)
+    - cohort-level artifacts (grand average, epochs store, label aggregates)
+
+Epochs and evoked reads are fronted by the in-process LRU tier in
+`app.core.memory_cache`. Writes go to a private temp directory and are renamed
+into place under a per-entry file lock, so concurrent workers sharing one
+cache directory never see half-written files. Corruption detection
+quarantines bad files automatically.
 """
 
 from __future__ import annotations
@@ -13,16 +19,36 @@ from __future__ import annotations
 import hashlib
 import json
 import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager
 from typing import Literal
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from pathlib import Path
 import mne
+import numpy as np
 from mne.io import Raw
-
+from mne.time_frequency import EpochsSpectrumArray
+
+from app.core.cache_index import CacheIndex
+from app.core.chunked_epochs import (
+    read_chunked_epochs,
+    read_chunked_manifest,
+    select_epochs,
+    select_labels,
+    write_chunked_epochs,
+)
+from app.core.memory_cache import memory_cache
 from app.schemas.task_schema import SingleSubjectTask
 
+try:
+    import fcntl
+except ImportError:  # non-POSIX: fall back to rename atomicity only
+    fcntl = None
 
-PIPELINE_VERSION = "v3"
+
+PIPELINE_VERSION = "v4"
 log = logging.getLogger(__name__)
 
 def _repo_root(start: Path) -> Path:
@@ -32,6 +58,52 @@ def _repo_root(start: Path) -> Path:
     return start
 
 
+@contextmanager
+def _entry_lock(p: Path, shared: bool = False, blocking: bool = True):
+    """Hold an inter-process flock on <p>.lock (shared for readers, exclusive for writers).
+
+    With blocking=False a held lock raises BlockingIOError instead of waiting.
+    """
+    if fcntl is None:
+        yield
+        return
+    p.parent.mkdir(parents=True, exist_ok=True)
+    with open(p.with_name(p.name + ".lock"), "a") as f:
+        fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class _EntryHold:
+    """Shared entry lock kept for as long as a lazy reader of the entry's files lives.
+
+    Attached to the reader (see LocalCache.hold), it keeps eviction and purge
+    off files MNE re-opens on every read. Copies of the reader share it and
+    pickled copies drop it; the lock is released when the last one is gone.
+    """
+
+    def __init__(self, p: Path | None = None):
+        self._f = None
+        if p is not None and fcntl is not None:
+            self._f = open(p.with_name(p.name + ".lock"), "a")
+            fcntl.flock(self._f, fcntl.LOCK_SH)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return _EntryHold, ()
+
+    def __del__(self):
+        if self._f is not None:
+            self._f.close()
+
+
 def _hash_of_dict(d):
     s = json.dumps(d, sort_keys=True, separators=(",", ":"))
     return hashlib.sha256(s.encode()).hexdigest()[:16]
@@ -42,13 +114,16 @@ class CacheKey:
     """Immutable identifier for a cached artifact.
 
     Attributes map to subject/task/run/stage and a params dict whose hash
-    plus pipeline version form the filename stem.
+    plus pipeline version form the filename stem. `source` is the fingerprint
+    of the source files the artifact derives from; it is hashed into the stem
+    so edited recordings miss the cache without a pipeline version bump.
     """
 
     single_subject_task: SingleSubjectTask
     stage: Literal["rawfilt", "epochs", "evoked"]
     params: dict  # DTO -> dict
     pipeline_ver: str  # bump when processing logic changes
+    source: str | None = None
 
     def subdir(self):
         """Return relative subdirectory path for this key."""
@@ -57,28 +132,69 @@ class CacheKey:
         return f"{sst.subject}/{sst.task}/{r}/{self.stage}"
 
     def filename_stem(self):
-        """Return deterministic stem (params hash + pipeline version)."""
-        return f"{_hash_of_dict(self.params)}-{self.pipeline_ver}"
+        """Return deterministic stem (params+source hash + pipeline version)."""
+        payload = self.params if self.source is None else {"params": self.params, "source": self.source}
+        return f"{_hash_of_dict(payload)}-{self.pipeline_ver}"
+
+
+@dataclass(frozen=True)
+class CohortCacheKey:
+    """Immutable identifier for a cohort-level artifact.
+
+    The filename stem hashes the sorted (subject, task, run) set together with
+    the params dict and the per-task source fingerprints, so the same cohort
+    and session map to the same file until one of the recordings changes.
+    """
+
+    tasks: tuple  # sorted (subject, task, run) tuples
+    stage: Literal["evoked", "epochs", "psd_grid", "snr_grid"]
+    params: dict
+    pipeline_ver: str
+    sources: tuple = ()  # source fingerprints, in tasks order
+
+    def subdir(self):
+        """Return relative subdirectory path for this key."""
+        task = self.tasks[0][1] if self.tasks else "none"
+        return f"cohort/{task}/{self.stage}"
+
+    def filename_stem(self):
+        """Return deterministic stem (cohort+params hash + pipeline version)."""
+        payload = {"tasks": [list(t) for t in self.tasks], "params": self.params}
+        if self.sources:
+            payload["sources"] = list(self.sources)
+        return f"{_hash_of_dict(payload)}-{self.pipeline_ver}"
 
 
 class LocalCache:
     """Persist and retrieve pipeline artifacts (filtered raw, epochs, evoked).
 
     Uses hashed filenames under .eegcache/<subject>/<task>/run-*/<stage>.
-    Corrupted files are renamed with .bad suffix and treated as misses.
+    Corrupted files are renamed with .bad suffix and treated as misses. Entries
+    are tracked in a CacheIndex that enforces the disk quota on every save.
     """
 
-    def __init__(self, base_dir: Path | None = None, pipeline_ver: str = "v1"):
-        """Initialize cache root directory and record pipeline version stamp."""
+    def __init__(self, base_dir: Path | None = None, pipeline_ver: str = "v1", epochs_format: str | None = None):
+        """Initialize cache root directory and record pipeline version stamp.
+
+        epochs_format selects how epochs are stored: "fif" (default) or
+        "chunked" (see app.core.chunked_epochs); it defaults to EEG_EPOCHS_FORMAT.
+        """
         self.repo_root = _repo_root(Path.cwd())
         self.base = base_dir or (self.repo_root / ".eegcache")
         self.base.mkdir(exist_ok=True)
         self.pipeline_ver = pipeline_ver
+        self.epochs_format = (epochs_format or os.getenv("EEG_EPOCHS_FORMAT", "fif")).lower()
+        self.index = CacheIndex.shared(self.base)
         log.info("[cache] init base=%s pipeline=%s repo_root=%s", self.base, self.pipeline_ver, self.repo_root)
 
     # --- logging helpers ---
     def _key_summary(self, key: CacheKey) -> str:
         """Return brief string identifying a cache key for logging."""
+        if isinstance(key, CohortCacheKey):
+            return (
+                f"cohort={len(key.tasks)} tasks, stage={key.stage}, "
+                f"ver={key.pipeline_ver}, params_hash={_hash_of_dict(key.params)}"
+            )
         try:
             sst = key.single_subject_task
             return (
@@ -114,27 +230,187 @@ class LocalCache:
         p = d / f"{key.filename_stem()}_{type}.{ext}"
         return p
 
+    def token_for(self, key: CacheKey | CohortCacheKey, type) -> str:
+        """Return a process-wide token for an artifact (memory tier, single-flight)."""
+        return f"{self.base}/{key.subdir()}/{key.filename_stem()}_{type}"
+
+    def _commit(
+            self,
+            p: Path,
+            key: CacheKey | CohortCacheKey,
+            write_fn,
+            stale: list[Path] | None = None,
+            meta: dict | None = None,
+        ):
+        """Write via write_fn into a private temp dir, then rename into place.
+
+        write_fn receives the temp path carrying p's final name, so FIF split
+        parts and sidecars keep the names the main file refers to. Everything
+        is moved under the entry's exclusive lock, the main file last, so
+        readers never observe a partial entry. `stale` files are removed.
+        The entry is then indexed (with `meta` such as sfreq/n_epochs) and the
+        disk quota enforced.
+        """
+        tmp_dir = p.parent / f".tmp-{os.getpid()}-{threading.get_ident()}-{p.name}"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            write_fn(tmp_dir / p.name)
+            with _entry_lock(p):
+                for f in stale or []:
+                    f.unlink(missing_ok=True)
+                files = []
+                for f in sorted(tmp_dir.iterdir(), key=lambda f: f.name == p.name):
+                    if f.is_dir() and (p.parent / f.name).is_dir():
+                        shutil.rmtree(p.parent / f.name)
+                    os.replace(f, p.parent / f.name)
+                    files.append(p.parent / f.name)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self._index_entry(p, key, files, meta)
+        return p
+
+    @staticmethod
+    def _key_meta(p: Path, key: CacheKey | CohortCacheKey) -> dict:
+        """Return index metadata (key fields + full params JSON) for an entry."""
+        meta = {
+            "type": p.name.rsplit("_", 1)[-1].split(".", 1)[0],
+            "stage": key.stage,
+            "params_hash": _hash_of_dict(key.params),
+            "params": json.dumps(key.params, sort_keys=True, default=str),
+        }
+        if isinstance(key, CohortCacheKey):
+            meta["task"] = key.tasks[0][1] if key.tasks else None
+        else:
+            sst = key.single_subject_task
+            meta.update(subject=sst.subject, task=sst.task, run=sst.run, source=key.source)
+        return meta
+
+    def _index_entry(self, p: Path, key: CacheKey | CohortCacheKey, files: list[Path], meta: dict | None = None):
+        """Record a committed entry and evict others if over the disk quota."""
+        self.index.record_save(p, files, key.pipeline_ver, {**self._key_meta(p, key), **(meta or {})})
+        freed = self.index.evict(_entry_lock, protect=p)
+        if freed:
+            log.info("[cache] quota enforced, freed %.1f MB", freed / 1e6)
+
+    def register_dir(self, key: CacheKey | CohortCacheKey, type, meta: dict | None = None):
+        """Index a directory-shaped artifact created in place by the caller."""
+        p = self.dir_for(key, type)
+        self._index_entry(p, key, [p], meta)
+
+    def plan(
+            self,
+            tasks: list[SingleSubjectTask],
+            stage: str,
+            params: dict,
+            sources: list[str | None] | None = None,
+        ):
+        """Split tasks into (cached, missing) for stage/params with one index query.
+
+        `sources` gives each task's source fingerprint (see CacheKey.source);
+        a task only counts as cached if the entry was built from that source.
+        """
+        hit = self.index.cached_tasks(stage, _hash_of_dict(params), self.pipeline_ver)
+        sources = sources if sources is not None else [None] * len(tasks)
+        cached, missing = [], []
+        for t, source in zip(tasks, sources):
+            (cached if (t.subject, t.task, t.run, source) in hit else missing).append(t)
+        return cached, missing
+
+    def find_covering(self, key: CacheKey, lo: str = "tmin", hi: str = "tmax") -> CacheKey | None:
+        """Return the key of an indexed entry that equals key except for a wider [lo, hi] window.
+
+        Lets callers serve a narrower time window by cropping. The narrowest
+        covering window wins; entries indexed without params are ignored.
+        """
+        want = key.params
+        if want.get(lo) is None or want.get(hi) is None:
+            return None
+        rest = {k: v for k, v in want.items() if k not in (lo, hi)}
+        sst = key.single_subject_task
+        try:
+            rows = self.index.entries(
+                subject=sst.subject,
+                task=sst.task,
+                run=sst.run,
+                stage=key.stage,
+                pipeline_ver=key.pipeline_ver,
+                source=key.source,
+            )
+        except Exception as e:
+            log.warning("[cache] covering lookup failed for %s: %s", self._key_summary(key), e)
+            return None
+        best = None
+        for row in rows:
+            try:
+                params = json.loads(row["params"] or "null")
+            except ValueError:
+                continue
+            if not isinstance(params, dict) or params.get(lo) is None or params.get(hi) is None:
+                continue
+            if {k: v for k, v in params.items() if k not in (lo, hi)} != rest or params == want:
+                continue
+            if params[lo] <= want[lo] and params[hi] >= want[hi]:
+                span = params[hi] - params[lo]
+                if best is None or span < best[0]:
+                    best = (span, params)
+        return replace(key, params=best[1]) if best else None
+
+    def record_hit(self, p: Path):
+        """Count a cache hit for p in the index (drives LRU/LFU eviction)."""
+        self.index.record_hit(p)
+
+    @staticmethod
+    def hold(p: Path, reader):
+        """Keep entry p from being evicted while reader (a lazy Raw/memmap of its files) lives."""
+        reader._eeg_cache_hold = _EntryHold(p)
+        return reader
+
+    def purge(self, dry_run: bool = False) -> dict:
+        """Remove entries of other pipeline versions, .bad files and stale temp dirs."""
+        report = self.index.purge(_entry_lock, keep_version=self.pipeline_ver, dry_run=dry_run)
+        log.info("[cache] PURGE %s%s", report, " (dry run)" if dry_run else "")
+        return report
+
+    def enforce_quota(self, quota_bytes: int | None = None) -> int:
+        """Evict entries until the cache fits quota_bytes (default EEG_CACHE_MAX_GB; 0 evicts all)."""
+        self.index.sync()
+        return self.index.evict(_entry_lock, target_bytes=quota_bytes)
+
+    def _quarantine(self, p: Path, artifact: str, err: Exception, sidecars: tuple[Path, ...] = ()):
+        """Rename a corrupt file (and its sidecars) with .bad suffix."""
+        try:
+            bad = p.with_name(p.name + ".bad")
+            p.rename(bad)
+            for side in sidecars:
+                if side.exists():
+                    try:
+                        side.rename(side.with_name(side.name + ".bad"))
+                    except Exception:
+                        side.unlink(missing_ok=True)
+            log.warning("[cache] Corrupt %s, quarantined as %s (err=%s)", artifact.upper(), bad.name, err)
+        except Exception:
+            log.warning("[cache] Corrupt %s read (and could not quarantine): %s", artifact.upper(), err)
+        self.index.forget(p)
+
     def load_raw_filtered(self, key: CacheKey) -> Raw:
         """Load filtered Raw if present else return None (quarantine corrupt)."""
         p = self._path_for(key, "eeg", "fif")
         self._log_get("rawfilt", p, key)
-        if p.exists():
+        with _entry_lock(p, shared=True):
+            if not p.exists():
+                self._log_miss("rawfilt", p, key)
+                return None
             self._log_hit("rawfilt", p, key)
+            self.record_hit(p)
             try:
-                return mne.io.read_raw_fif(p.as_posix(), preload=False, verbose="ERROR")
+                # MNE re-opens the file on every read of a lazy Raw
+                return self.hold(p, mne.io.read_raw_fif(p.as_posix(), preload=False, verbose="ERROR"))
             except Exception as e:
-                try:
-                    bad = p.with_name(p.name + ".bad")
-                    p.rename(bad)
-                    log.warning("[cache] Corrupt RAWFILT, quarantined as %s (err=%s)", bad.name, e)
-                except Exception:
-                    log.warning("[cache] Corrupt RAWFILT read (and could not quarantine): %s", e)
+                self._quarantine(p, "rawfilt", e, sidecars=(p.with_suffix(".events.json"),))
                 return None
-        self._log_miss("rawfilt", p, key)
-        return None
 
     def save_raw_filtered(self, raw, key: CacheKey):
-        """Persist filtered Raw to FIF; return path."""
+        """Persist filtered Raw to FIF atomically (+ annotation events sidecar); return path."""
         p = self._path_for(key, "eeg", "fif")
         self._log_save(
             "rawfilt",
@@ -142,47 +418,133 @@ class LocalCache:
             key,
             extra=f"sfreq={float(raw.info.get('sfreq', 0.0)):.3f}, ch={len(raw.ch_names)}, ver={key.pipeline_ver}",
         )
-        raw.save(p.as_posix(), overwrite=True)
-        return p
 
-    def load_epochs(self, key: CacheKey):
-        """Load epochs + optional labels list; return (epochs, labels) or (None, None)."""
-        p = self._path_for(key, "epo", "fif")
-        self._log_get("epochs", p, key)
-        if not p.exists():
-            self._log_miss("epochs", p, key)
-            return None, None
-        self._log_hit("epochs", p, key)
-        try:
-            epochs = mne.read_epochs(p.as_posix(), preload=True, verbose="ERROR")
-            labels_file = p.with_suffix(".labels.json")
-            labels = None
-            if labels_file.exists():
-                with open(labels_file, "r") as f:
-                    labels = json.load(f)
-            return epochs, labels
-        except Exception as e:
-            # Quarantine bad cache and treat as miss so upstream will rebuild
+        def _write(tmp: Path):
+            raw.save(tmp.as_posix(), overwrite=True)
+            # Events in this raw's own sample space, so epoching never needs the source .set
+            events, event_id = mne.events_from_annotations(raw, verbose="ERROR")
+            with open(tmp.with_suffix(".events.json"), "w") as f:
+                json.dump({"events": events.tolist(), "event_id": event_id}, f)
+
+        return self._commit(p, key, _write, meta={"sfreq": float(raw.info["sfreq"])})
+
+    def load_raw_events(self, key: CacheKey):
+        """Load (events, annotation id map) saved next to a filtered Raw, else None."""
+        p = self._path_for(key, "eeg", "fif")
+        events_file = p.with_suffix(".events.json")
+        with _entry_lock(p, shared=True):
+            if not events_file.exists():
+                return None
             try:
-                bad = p.with_name(p.name + ".bad")
-                p.rename(bad)
+                with open(events_file, "r") as f:
+                    payload = json.load(f)
+            except Exception as e:
+                log.warning("[cache] Unreadable events sidecar %s (err=%s)", events_file.name, e)
+                return None
+        events = np.array(payload["events"], dtype=int).reshape(-1, 3)
+        return events, payload["event_id"]
+
+    def has_epochs(self, key: CacheKey) -> bool:
+        """Return True if an epochs entry exists for key (in either format)."""
+        return self._path_for(key, "epo", "fif").exists() or self._path_for(key, "epo", "d").exists()
+
+    def load_drop_log(self, key: CacheKey) -> tuple | None:
+        """Return the drop log of a cached epochs entry without reading its data, else None.
+
+        Chunked entries written before the drop log was stored return None.
+        """
+        for p in (self._path_for(key, "epo", "d"), self._path_for(key, "epo", "fif")):
+            with _entry_lock(p, shared=True):
+                if not p.exists():
+                    continue
+                try:
+                    if p.suffix == ".d":
+                        drop_log = read_chunked_manifest(p).get("drop_log")
+                        return tuple(tuple(reasons) for reasons in drop_log) if drop_log is not None else None
+                    return mne.read_epochs(p.as_posix(), preload=False, verbose="ERROR").drop_log
+                except Exception as e:
+                    log.warning("[cache] drop log of %s unreadable: %s", p.name, e)
+                    return None
+        return None
+
+    def load_epochs(self, key: CacheKey, picks: list[str] | None = None, conditions: list[str] | None = None):
+        """Load epochs + optional labels list; return (epochs, labels) or (None, None).
+
+        `picks` (channel names) and `conditions` (event names) narrow the
+        result. The chunked format decodes only the needed blocks; FIF entries
+        are opened lazily, narrowed, and only then loaded, so unselected
+        epochs are never read. Narrowed reads bypass the memory tier.
+        """
+        partial = picks is not None or bool(conditions)
+        fif = self._path_for(key, "epo", "fif")
+        chunked = self._path_for(key, "epo", "d")
+        # Prefer the configured format, but still serve entries written in the other one
+        paths = [chunked, fif] if self.epochs_format == "chunked" else [fif, chunked]
+        token = self.token_for(key, "epo")
+        self._log_get("epochs", paths[0], key)
+        cached = memory_cache.get(token)
+        if cached is not None:
+            log.info("[cache] MEM-HIT epochs file=%s", paths[0].name)
+            self.record_hit(paths[0])
+            epochs, labels = cached
+            return select_epochs(epochs, picks, conditions), select_labels(labels, epochs.event_id, conditions)
+
+        for p in paths:
+            with _entry_lock(p, shared=True):
+                if not p.exists():
+                    continue
+                self._log_hit("epochs", p, key)
+                self.record_hit(p)
                 labels_file = p.with_suffix(".labels.json")
-                if labels_file.exists():
-                    try:
-                        labels_bad = labels_file.with_name(labels_file.name + ".bad")
-                        labels_file.rename(labels_bad)
-                    except Exception:
-                        labels_file.unlink(missing_ok=True)
-                log.warning("[cache] Corrupt EPOCHS, quarantined as %s (err=%s)", bad.name, e)
-                print("[cache] Corrupt EPOCHS, quarantined as %s (err=%s)", bad.name, e)
+                try:
+                    if p.suffix == ".d":
+                        epochs, labels = read_chunked_epochs(p, picks, conditions)
+                    else:
+                        epochs = mne.read_epochs(p.as_posix(), preload=not partial, verbose="ERROR")
+                        if partial:
+                            epochs = select_epochs(epochs, picks, conditions)
+                            if epochs is not None:
+                                epochs.load_data()
+                        labels = None
+                        if labels_file.exists():
+                            with open(labels_file, "r") as f:
+                                labels = json.load(f)
+                        if epochs is not None:
+                            labels = select_labels(labels, epochs.event_id, conditions)
+                except Exception as e:
+                    # Quarantine bad cache and treat as miss so upstream will rebuild
+                    self._quarantine(p, "epochs", e, sidecars=(labels_file,))
+                    return None, None
+            if not partial:
+                memory_cache.put(token, (epochs, labels))
+            return epochs, labels
+
+        self._log_miss("epochs", paths[0], key)
+        return None, None
+
+    @staticmethod
+    def _dump_labels(labels, labels_file: Path):
+        """Write labels (list/array/dict) as JSON."""
+        with open(labels_file, "w") as f:
+            try:
+                if isinstance(labels, np.ndarray):
+                    json.dump(labels.tolist(), f)
+                elif isinstance(labels, (list, tuple)):
+                    json.dump(list(labels), f)
+                else:
+                    json.dump(labels, f)
             except Exception:
-                log.warning("[cache] Corrupt EPOCHS read (and could not quarantine): %s", e)
-                print("[cache] Corrupt EPOCHS read (and could not quarantine): %s", e)
-            return None, None
+                json.dump(str(labels), f)
 
     def save_epochs(self, epochs, key: CacheKey, labels=None):
-        """Persist epochs FIF + labels JSON (if provided); return path."""
-        p = self._path_for(key, "epo", "fif")
+        """Persist epochs FIF + labels JSON (if provided) as one unit; return path.
+
+        With EEG_EPOCHS_FORMAT=chunked the entry is written in the chunked
+        float32 format instead (labels go into its manifest).
+        """
+        chunked = self.epochs_format == "chunked"
+        p = self._path_for(key, "epo", "d" if chunked else "fif")
+        labels_file = p.with_suffix(".labels.json")
         try:
             n = int(len(epochs))
         except Exception:
@@ -190,54 +552,188 @@ class LocalCache:
         n_str = str(n) if n >= 0 else "?"
         self._log_save("epochs", p, key, extra=f"n={n_str}, ver={key.pipeline_ver}")
 
+        meta = {"sfreq": float(epochs.info["sfreq"]), "n_epochs": n if n >= 0 else None}
+
+        def _write_chunked(tmp: Path):
+            meta["n_epochs"] = write_chunked_epochs(tmp, epochs, labels)
+
+        def _write(tmp: Path):
+            if labels is not None:
+                self._dump_labels(labels, tmp.with_suffix(".labels.json"))
+            epochs.save(tmp.as_posix(), overwrite=True)
+            if meta["n_epochs"] is None:
+                # Lazy epochs only know their length once bad epochs were dropped
+                try:
+                    meta["n_epochs"] = int(len(epochs))
+                except Exception:
+                    pass
+
         try:
-            epochs.save(p.as_posix(), overwrite=True)
+            if chunked:
+                self._commit(p, key, _write_chunked, meta=meta)
+            else:
+                self._commit(p, key, _write, stale=[labels_file] if labels is None else None, meta=meta)
         except Exception as e:
             # Gracefully handle cases like "No data in this range" when dropping bad.
-            msg = str(e)
-            log.error("[cache] SAVE epochs failed: %s", msg)
+            log.error("[cache] SAVE epochs failed: %s", e)
             # Do not raise; upstream can still proceed with in-memory epochs.
             return p
-
-        if labels is not None:
-            labels_file = p.with_suffix(".labels.json")
-            with open(labels_file, "w") as f:
-                try:
-                    from numpy import ndarray
-                    if isinstance(labels, ndarray):
-                        json.dump(labels.tolist(), f)
-                    elif isinstance(labels, (list, tuple)):
-                        json.dump(list(labels), f)
-                    elif isinstance(labels, dict):
-                        json.dump(labels, f)
-                    else:
-                        json.dump(labels, f)
-                except Exception:
-                    json.dump(str(labels), f)
+        if labels is not None and not chunked:
             log.info("[cache] SAVE epochs labels %s", labels_file)
+        memory_cache.put(self.token_for(key, "epo"), (epochs, labels))
         return p
 
     def load_evoked(self, key: CacheKey):
         """Load evoked response if available else None."""
         p = self._path_for(key, "ave", "fif")
+        token = self.token_for(key, "ave")
         self._log_get("evoked", p, key)
-        if not p.exists():
-            self._log_miss("evoked", p, key)
-            return None
-        try:
-            self._log_hit("evoked", p, key)
-            evk_list = mne.read_evokeds(p.as_posix(), condition=0, verbose="ERROR")
-            return evk_list
-        except Exception:
+        cached = memory_cache.get(token)
+        if cached is not None:
+            log.info("[cache] MEM-HIT evoked file=%s", p.name)
+            self.record_hit(p)
+            return cached
+        with _entry_lock(p, shared=True):
+            if not p.exists():
+                self._log_miss("evoked", p, key)
+                return None
             try:
-                evk_list = mne.read_evokeds(p.as_posix(), verbose="ERROR")
-                return evk_list[0] if evk_list else None
+                self._log_hit("evoked", p, key)
+                self.record_hit(p)
+                evk = mne.read_evokeds(p.as_posix(), condition=0, verbose="ERROR")
             except Exception:
-                return None
+                try:
+                    evk_list = mne.read_evokeds(p.as_posix(), verbose="ERROR")
+                    evk = evk_list[0] if evk_list else None
+                except Exception:
+                    return None
+        memory_cache.put(token, evk)
+        return evk
 
     def save_evoked(self, evoked, key: CacheKey):
-        """Persist evoked response FIF; return path."""
+        """Persist evoked response FIF atomically; return path."""
         p = self._path_for(key, "ave", "fif")
         self._log_save("evoked", p, key)
-        evoked.save(p.as_posix(), overwrite=True)
+        self._commit(
+            p, key, lambda tmp: evoked.save(tmp.as_posix(), overwrite=True),
+            meta={"sfreq": float(evoked.info["sfreq"]), "n_epochs": int(evoked.nave)},
+        )
+        memory_cache.put(self.token_for(key, "ave"), evoked)
         return p
+
+    def load_evokeds(self, key: CacheKey | CohortCacheKey):
+        """Load every Evoked of a multi-condition -ave.fif as a list, else None."""
+        p = self._path_for(key, "ave", "fif")
+        token = self.token_for(key, "ave")
+        self._log_get("evokeds", p, key)
+        cached = memory_cache.get(token)
+        if cached is not None:
+            log.info("[cache] MEM-HIT evokeds file=%s", p.name)
+            self.record_hit(p)
+            return list(cached)
+        with _entry_lock(p, shared=True):
+            if not p.exists():
+                self._log_miss("evokeds", p, key)
+                return None
+            self._log_hit("evokeds", p, key)
+            self.record_hit(p)
+            try:
+                evokeds = mne.read_evokeds(p.as_posix(), verbose="ERROR")
+            except Exception as e:
+                self._quarantine(p, "evokeds", e)
+                return None
+        memory_cache.put(token, tuple(evokeds))
+        return evokeds
+
+    def save_evokeds(self, evokeds: list, key: CacheKey | CohortCacheKey):
+        """Persist several Evoked responses into one -ave.fif atomically; return path."""
+        p = self._path_for(key, "ave", "fif")
+        self._log_save("evokeds", p, key, extra=f"conditions={len(evokeds)}, ver={key.pipeline_ver}")
+        self._commit(
+            p, key, lambda tmp: mne.write_evokeds(tmp.as_posix(), evokeds, overwrite=True, verbose="ERROR"),
+            meta={"sfreq": float(evokeds[0].info["sfreq"]), "n_epochs": int(sum(e.nave for e in evokeds))},
+        )
+        memory_cache.put(self.token_for(key, "ave"), tuple(evokeds))
+        return p
+
+    def load_spectrum(self, key: CacheKey):
+        """Load a cached per-epoch spectrum as EpochsSpectrumArray, else None."""
+        p = self._path_for(key, "psd", "npz")
+        info_file = p.with_suffix(".info.fif")
+        token = self.token_for(key, "psd")
+        self._log_get("spectrum", p, key)
+        cached = memory_cache.get(token)
+        if cached is not None:
+            log.info("[cache] MEM-HIT spectrum file=%s", p.name)
+            self.record_hit(p)
+            return cached
+        with _entry_lock(p, shared=True):
+            if not p.exists():
+                self._log_miss("spectrum", p, key)
+                return None
+            self._log_hit("spectrum", p, key)
+            self.record_hit(p)
+            try:
+                with np.load(p, allow_pickle=False) as npz:
+                    arrays = {name: npz[name] for name in npz.files}
+                info = mne.io.read_info(info_file, verbose="ERROR")
+                spectrum = EpochsSpectrumArray(
+                    arrays["data"],
+                    info,
+                    arrays["freqs"],
+                    events=arrays["events"],
+                    event_id=dict(zip(arrays["event_names"].tolist(), arrays["event_codes"].tolist())),
+                    verbose="ERROR",
+                )
+            except Exception as e:
+                self._quarantine(p, "spectrum", e, sidecars=(info_file,))
+                return None
+        memory_cache.put(token, spectrum)
+        return spectrum
+
+    def save_spectrum(self, spectrum, key: CacheKey):
+        """Persist an EpochsSpectrum (data, freqs, events, info) atomically; return path."""
+        p = self._path_for(key, "psd", "npz")
+        self._log_save("spectrum", p, key, extra=f"shape={spectrum.shape}, ver={key.pipeline_ver}")
+
+        def _write(tmp: Path):
+            np.savez(
+                tmp,
+                data=spectrum.get_data(exclude=()),
+                freqs=spectrum.freqs,
+                events=spectrum.events,
+                event_names=np.array(list(spectrum.event_id), dtype=str),
+                event_codes=np.array(list(spectrum.event_id.values()), dtype=int),
+            )
+            mne.io.write_info(tmp.with_suffix(".info.fif"), spectrum.info)
+
+        self._commit(p, key, _write, meta={"sfreq": float(spectrum.info["sfreq"]), "n_epochs": int(spectrum.shape[0])})
+        memory_cache.put(self.token_for(key, "psd"), spectrum)
+        return p
+
+    def dir_for(self, key: CacheKey | CohortCacheKey, type) -> Path:
+        """Return path of a directory-shaped artifact (not created)."""
+        return self._path_for(key, type, "d")
+
+    def load_arrays(self, key: CacheKey | CohortCacheKey, type):
+        """Load a dict of numpy arrays from NPZ if present else None (quarantine corrupt)."""
+        p = self._path_for(key, type, "npz")
+        self._log_get(type, p, key)
+        if not p.exists():
+            self._log_miss(type, p, key)
+            return None
+        self._log_hit(type, p, key)
+        self.record_hit(p)
+        with _entry_lock(p, shared=True):
+            try:
+                with np.load(p, allow_pickle=False) as npz:
+                    return {name: npz[name] for name in npz.files}
+            except Exception as e:
+                self._quarantine(p, type, e)
+                return None
+
+    def save_arrays(self, arrays: dict, key: CacheKey | CohortCacheKey, type):
+        """Persist a dict of numpy arrays as NPZ; return path."""
+        p = self._path_for(key, type, "npz")
+        self._log_save(type, p, key, extra=f"arrays={sorted(arrays)}, ver={key.pipeline_ver}")
+        return self._commit(p, key, lambda tmp: np.savez(tmp, **arrays))
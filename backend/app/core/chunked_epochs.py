@@ -0,0 +1,190 @@
+"""Chunked, compressed on-disk format for cached Epochs.
+
+An alternative to `-epo.fif` for LocalCache (EEG_EPOCHS_FORMAT=chunked).
+Each entry is a directory holding:
+
+    manifest.json      channels, times, events, event_id, labels, selection,
+                       drop_log, chunk grid
+    info.fif           the measurement info (written with mne.io.write_info)
+    e{i}_c{j}.npz      compressed float32 block for epoch chunk i, channel chunk j
+
+Reads decode only the blocks intersecting the requested channels and
+conditions, so a consumer that needs 8 of 128 channels or a single stimulus
+condition never touches the rest of the file.
+"""
+import json
+from pathlib import Path
+
+import mne
+import numpy as np
+
+from app.core.mne_copy import picked_copy
+
+MANIFEST_FILE = "manifest.json"
+INFO_FILE = "info.fif"
+EPOCHS_PER_CHUNK = 64
+CHANNELS_PER_CHUNK = 16
+
+
+def _chunk_name(ei: int, ci: int) -> str:
+    return f"e{ei}_c{ci}.npz"
+
+
+def match_conditions(event_id: dict, conditions: list[str]) -> set[int]:
+    """Return event codes selected by condition names (MNE '/'-tag semantics)."""
+    codes = set()
+    for cond in conditions:
+        tags = set(cond.split("/"))
+        codes.update(code for name, code in event_id.items() if name == cond or tags <= set(name.split("/")))
+    return codes
+
+
+def select_epochs(epochs, picks: list[str] | None = None, conditions: list[str] | None = None):
+    """Restrict epochs to channel names and/or conditions; None if nothing is left.
+
+    On lazy epochs the condition selection happens before any data is read;
+    channel picks then load just the selected epochs (MNE cannot drop
+    channels of unloaded epochs). The input is never modified: channels are
+    picked on a copy that duplicates only the kept channels' data.
+    """
+    if epochs is None:
+        return None
+    owned = False
+    if conditions:
+        codes = match_conditions(epochs.event_id, conditions)
+        if not codes:
+            return None
+        epochs = epochs[[name for name, code in epochs.event_id.items() if code in codes]]
+        owned = True
+    if picks is not None:
+        wanted = set(picks)
+        keep = [ch for ch in epochs.ch_names if ch in wanted]
+        if not keep:
+            return None
+        if not epochs.preload:
+            # Copies of lazy epochs share the underlying Raw, so this copies no data
+            epochs = epochs if owned else epochs.copy()
+            epochs.load_data()
+            owned = True
+        epochs = epochs.pick(keep) if owned else picked_copy(epochs, keep)
+    return epochs
+
+
+def select_labels(labels, event_id: dict, conditions: list[str] | None = None):
+    """Narrow labels to the conditions select_epochs keeps, or return them unchanged.
+
+    Labels are either one condition name per epoch or the list of condition
+    names present; both keep exactly the names of the selected event codes,
+    so per-epoch labels stay aligned with the selected epochs.
+    """
+    if not conditions or labels is None or isinstance(labels, (str, dict)):
+        return labels
+    codes = match_conditions(event_id, conditions)
+    names = {name for name, code in event_id.items() if code in codes}
+    if isinstance(labels, np.ndarray):
+        return labels[np.isin(labels, list(names))]
+    return [label for label in labels if label in names]
+
+
+def write_chunked_epochs(root: Path, epochs: mne.BaseEpochs, labels=None) -> int:
+    """Write epochs (+ labels) into directory root; return the number of epochs."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    data = epochs.get_data().astype(np.float32, copy=False)
+    n_epochs, n_channels, _ = data.shape
+
+    for ei, e0 in enumerate(range(0, n_epochs, EPOCHS_PER_CHUNK)):
+        for ci, c0 in enumerate(range(0, n_channels, CHANNELS_PER_CHUNK)):
+            block = np.ascontiguousarray(data[e0:e0 + EPOCHS_PER_CHUNK, c0:c0 + CHANNELS_PER_CHUNK])
+            np.savez_compressed(root / _chunk_name(ei, ci), data=block)
+
+    if isinstance(labels, np.ndarray):
+        labels = labels.tolist()
+    manifest = {
+        "ch_names": list(epochs.ch_names),
+        "tmin": float(epochs.tmin),
+        "n_times": int(data.shape[2]),
+        "n_epochs": int(n_epochs),
+        "baseline": list(epochs.baseline) if epochs.baseline is not None else None,
+        "event_id": dict(epochs.event_id),
+        "events": epochs.events.tolist(),
+        "labels": labels,
+        "selection": epochs.selection.tolist(),
+        "drop_log": [list(reasons) for reasons in epochs.drop_log],
+        "epochs_per_chunk": EPOCHS_PER_CHUNK,
+        "channels_per_chunk": CHANNELS_PER_CHUNK,
+    }
+    with open(root / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f)
+    mne.io.write_info(root / INFO_FILE, epochs.info, overwrite=True)
+    return int(n_epochs)
+
+
+def read_chunked_manifest(root: Path) -> dict:
+    """Return the manifest of the chunked entry in directory root."""
+    with open(Path(root) / MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def read_chunked_epochs(root: Path, picks: list[str] | None = None, conditions: list[str] | None = None):
+    """Read (epochs, labels) from directory root, decoding only the needed blocks.
+
+    `picks` keeps channels by name (unknown names are ignored) and
+    `conditions` keeps epochs whose event name matches any given condition;
+    labels are narrowed to match (see select_labels) and unselected epochs are
+    marked IGNORED in the drop log, as MNE does for `epochs[conditions]`.
+    Returns (None, labels) if the selection is empty.
+    """
+    root = Path(root)
+    manifest = read_chunked_manifest(root)
+    info = mne.io.read_info(root / INFO_FILE, verbose="ERROR")
+    ch_names = manifest["ch_names"]
+    events = np.array(manifest["events"], dtype=int).reshape(-1, 3)
+    event_id = manifest["event_id"]
+    labels = select_labels(manifest["labels"], event_id, conditions)
+    epc, cpc = manifest["epochs_per_chunk"], manifest["channels_per_chunk"]
+
+    ch_idx = np.arange(len(ch_names))
+    if picks is not None:
+        wanted = set(picks)
+        ch_idx = np.array([i for i, ch in enumerate(ch_names) if ch in wanted], dtype=int)
+    ep_idx = np.arange(len(events))
+    if conditions:
+        codes = match_conditions(event_id, conditions)
+        ep_idx = np.flatnonzero(np.isin(events[:, 2], list(codes)))
+        event_id = {k: v for k, v in event_id.items() if v in codes}
+    if len(ch_idx) == 0 or len(ep_idx) == 0:
+        return None, labels
+
+    data = np.empty((len(ep_idx), len(ch_idx), manifest["n_times"]), dtype=np.float64)
+    for ei in np.unique(ep_idx // epc):
+        rows = np.flatnonzero(ep_idx // epc == ei)
+        for ci in np.unique(ch_idx // cpc):
+            cols = np.flatnonzero(ch_idx // cpc == ci)
+            with np.load(root / _chunk_name(int(ei), int(ci))) as npz:
+                block = npz["data"]
+            data[np.ix_(rows, cols)] = block[np.ix_(ep_idx[rows] - ei * epc, ch_idx[cols] - ci * cpc)]
+
+    if len(ch_idx) != len(ch_names):
+        info = mne.pick_info(info, ch_idx.tolist())
+    baseline = tuple(manifest["baseline"]) if manifest["baseline"] is not None else None
+    # Entries written before selection/drop_log were stored get MNE's defaults
+    selection, drop_log = None, None
+    if manifest.get("selection") is not None:
+        selection = np.asarray(manifest["selection"], dtype=int)
+        drop_log = [tuple(reasons) for reasons in manifest["drop_log"]]
+        for i in np.setdiff1d(np.arange(len(events)), ep_idx):
+            drop_log[selection[i]] = ("IGNORED",)
+        selection, drop_log = selection[ep_idx], tuple(drop_log)
+    epochs = mne.EpochsArray(
+        data,
+        info,
+        events=events[ep_idx],
+        tmin=manifest["tmin"],
+        event_id=event_id,
+        baseline=baseline,
+        selection=selection,
+        drop_log=drop_log,
+        verbose="ERROR",
+    )
+    return epochs, labels
@@ -0,0 +1,147 @@
+"""In-process LRU memory tier for cached EEG artifacts.
+
+LocalCache consults this tier before reading FIF files from disk, so switching
+between views of the same subject (evoked, joint, topo, grid, ...) does not
+re-read and re-parse the same epochs/evoked files on every request.
+
+Entries are keyed by the cache key's path token, bounded by a byte budget
+(EEG_CACHE_MEM_MB, default 512, 0 disables the tier) and evicted least
+recently used first. Objects are copied on the way in and on the way out, so
+callers can never mutate a cached instance.
+
+The budget is per process. Cohort worker processes size their own tier from
+EEG_CACHE_WORKER_MEM_MB (default 0, i.e. disabled), since a worker runs one
+task after another and rarely reads an artifact twice.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def _nbytes(obj) -> int:
+    """Best-effort size of an MNE object (or tuple of them) in bytes."""
+    if obj is None:
+        return 0
+    if isinstance(obj, tuple):
+        return sum(_nbytes(o) for o in obj)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    data = getattr(obj, "_data", None)
+    if not isinstance(data, np.ndarray):
+        data = getattr(obj, "data", None)
+    return int(data.nbytes) if isinstance(data, np.ndarray) else 0
+
+
+def _resident(obj) -> bool:
+    """Return False for lazy objects whose data still lives on disk/in a Raw."""
+    if isinstance(obj, tuple):
+        return all(_resident(o) for o in obj)
+    return getattr(obj, "preload", True) is not False
+
+
+def _copy(obj):
+    """Return a defensive copy of a cached value."""
+    if obj is None:
+        return None
+    if isinstance(obj, tuple):
+        return tuple(_copy(o) for o in obj)
+    if isinstance(obj, (list, dict)):
+        return type(obj)(obj)
+    return obj.copy()
+
+
+class MemoryLRU:
+    """Thread-safe, byte-budgeted LRU of MNE objects with hit/miss counters."""
+
+    def __init__(self, max_bytes: int):
+        """Create an empty tier holding at most max_bytes of array data."""
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: OrderedDict[str, tuple[object, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+        """Return a copy of the cached value for token, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            value = entry[0]
+        return _copy(value)
+
+    def put(self, token: str, value) -> None:
+        """Store a copy of value, evicting least recently used entries as needed."""
+        size = _nbytes(value)
+        if value is None or size > self.max_bytes or not _resident(value):
+            self.discard(token)
+            return
+        value = _copy(value)
+        with self._lock:
+            old = self._entries.pop(token, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[token] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                evicted, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                log.info("[mem-cache] EVICT %s (%.1f MB)", evicted, evicted_size / 1e6)
+
+    def resize(self, max_bytes: int) -> None:
+        """Change the byte budget, evicting least recently used entries to fit."""
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def discard(self, token: str) -> None:
+        """Drop token from the tier if present."""
+        with self._lock:
+            old = self._entries.pop(token, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and current occupancy."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _env_bytes(name: str, default_mb: str) -> int:
+    return int(float(os.getenv(name, default_mb) or 0) * 1024 * 1024)
+
+
+def worker_budget_bytes() -> int:
+    """Return the memory tier budget for cohort worker processes (EEG_CACHE_WORKER_MEM_MB)."""
+    return _env_bytes("EEG_CACHE_WORKER_MEM_MB", "0")
+
+
+# global singleton shared by every LocalCache in the process
+memory_cache = MemoryLRU(_env_bytes("EEG_CACHE_MEM_MB", "512"))
@@ -0,0 +1,16 @@
+"""Copy helpers for MNE instances that avoid duplicating unneeded data."""
+from copy import deepcopy
+
+import numpy as np
+
+
+def picked_copy(inst, picks: list[int]):
+    """Return a copy of inst restricted to picks, copying only the picked channels' data.
+
+    The deepcopy shares the loaded array with inst; MNE's pick then
+    replaces it on the copy with a new array of just the picked rows.
+    """
+    data = getattr(inst, "_data", None) if getattr(inst, "preload", True) else None
+    if isinstance(data, np.ndarray):
+        return deepcopy(inst, {id(data): data}).pick(picks)
+    return inst.copy().pick(picks)
@@ -0,0 +1,33 @@
+"""Per-key request coalescing for cache-backed pipeline computations.
+
+When two threads ask for the same artifact (same cache key) at the same time,
+only the first one computes it; the others block until it finishes and then
+re-read the freshly written cache entry instead of repeating the work.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+_inflight: dict[str, list] = {}  # token -> [lock, number of holders/waiters]
+_inflight_guard = threading.Lock()
+
+
+@contextmanager
+def single_flight(token: str):
+    """Serialize callers sharing token; callers must re-check the cache inside."""
+    with _inflight_guard:
+        entry = _inflight.setdefault(token, [threading.Lock(), 0])
+        entry[1] += 1
+        waiting = entry[1] > 1
+    if waiting:
+        log.info("[single-flight] waiting for in-flight %s", token)
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _inflight_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _inflight.pop(token, None)
@@ -11,7 +11,7 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.endpoints import (
-    plot, participants, params_schema, progress_ws, show_data
+    plot, participants, params_schema, progress_ws, show_data, cache
 )
 
 from app.core.config import DATA_ROOT, FRONTEND_URL, BACKEND_URL
@@ -61,6 +61,7 @@ app.include_router(show_data.router)
 app.include_router(params_schema.router)
 app.include_router(participants.router)
 app.include_router(progress_ws.router)
+app.include_router(cache.router)
 
 # To run use -> "uvicorn app.main:app --reload" OR "fastapi dev"
 @app.get("/")
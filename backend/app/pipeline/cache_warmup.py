@@ -0,0 +1,96 @@
+"""Batch precompute (warm-up) of the EEG cache for a cohort.
+
+Fills LocalCache for every subject matching `session.subject_filter` with the
+prefilter, cleaned, epochs and evoked stages of `session`, using the cohort
+worker pool. Tasks that are already cached are skipped, so re-running after
+an interruption resumes where the previous run stopped. Optionally the
+cohort-level grand average (and, with COHORT_EPOCHS_CACHE, the epochs store)
+are built as well.
+
+Usage (from the backend directory, with DATA_ROOT set):
+
+    python -m app.pipeline.cache_warmup session.json [--workers 8] [--no-cohort]
+
+where session.json is a PipelineSession (e.g. copied from the UI request).
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from app.core.participants_loader import ParticipantManager
+from app.core.progress_logger import ProgressEmitter
+from app.pipeline.cohort_executor import cache_cohort_epochs
+from app.pipeline.task_resolver import get_cohort_subject_executor
+from app.schemas.session_schema import PipelineSession
+
+log = logging.getLogger(__name__)
+
+
+def warm_cache(
+        pm: ParticipantManager,
+        session: PipelineSession,
+        progress_emitter: ProgressEmitter | None = None,
+        *,
+        cohort_level: bool = True,
+        max_workers: int | None = None,
+    ) -> dict:
+    """Precompute per-task (and optionally cohort-level) cache entries; return a summary."""
+    t0 = time.perf_counter()
+    cohort = get_cohort_subject_executor(pm, session.subject_filter, progress_emitter)
+    if max_workers:
+        cohort.max_workers = max_workers
+
+    summary = cohort.warm_cache(session)
+    if cohort_level and not summary["errors"]:
+        if progress_emitter:
+            progress_emitter.sync_log("[Warm-up] Building cohort grand average and epochs store")
+        cohort.get_evoked(session)
+        if cache_cohort_epochs():
+            # A scratch store would be deleted right away, so only a cached one is worth building
+            cohort.get_epochs_store(session)
+        summary["cohort"] = True
+
+    summary["seconds"] = round(time.perf_counter() - t0, 1)
+    log.info("Warm-up finished: %s", summary)
+    if progress_emitter:
+        level = "error" if summary["errors"] else "info"
+        progress_emitter.sync_log(
+            f"Warm-up complete: {summary['ok']} computed, {summary['cached']} cached, "
+            f"{len(summary['errors'])} failed",
+            level=level,
+            progress=1.0,
+        )
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.pipeline.cache_warmup", description=__doc__.splitlines()[0])
+    parser.add_argument("session", type=Path, help="PipelineSession JSON file")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default COHORT_MAX_WORKERS)")
+    parser.add_argument("--no-cohort", action="store_true", help="skip cohort-level grand average / epochs store")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    data_root = os.getenv("DATA_ROOT")
+    if not data_root:
+        parser.error("DATA_ROOT is not set in .env")
+
+    session = PipelineSession.model_validate(json.loads(args.session.read_text()))
+    summary = warm_cache(
+        ParticipantManager(data_dir=data_root),
+        session,
+        cohort_level=not args.no_cohort,
+        max_workers=args.workers,
+    )
+    print(json.dumps(summary, indent=2))
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
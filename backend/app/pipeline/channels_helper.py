@@ -3,13 +3,91 @@
 This module provides ChannelsHelper used by visualization utilities to:
 - pick channels based on params.channels_list and showbad flag,
 - optionally filter channels by complete-trace microvolt (µV) ranges,
-- expose `picks` and `pick_names` for subsequent processing.
+- expose `picks` and `pick_names` for subsequent processing,
+- apply the same selection to cached per-epoch spectra (prepare_spectrum)
+  and to cohort epochs stores (prepare_store_channels).
 """
 import mne
 import numpy as np
+from mne.time_frequency import EpochsSpectrumArray
 
+from app.core.mne_copy import picked_copy
 from app.schemas.params.base_filter_schema import FilterParams
 
+# Samples per block when scanning the µV range of a Raw that is not loaded
+UV_BLOCK_SAMPLES = 100_000
+
+
+def uv_bounds(params: FilterParams) -> tuple[float | None, float | None]:
+    """Return (uv_min, uv_max) as floats or None (UI may provide empty strings)."""
+    def _to_float_or_none(x):
+        if x is None:
+            return None
+        try:
+            if isinstance(x, str) and x.strip() == "":
+                return None
+            return float(x)
+        except Exception:
+            return None
+
+    return (
+        _to_float_or_none(getattr(params, 'uv_min', None)),
+        _to_float_or_none(getattr(params, 'uv_max', None)),
+    )
+
+
+def has_uv_filter(params: FilterParams) -> bool:
+    """Return True if a µV-range channel filter is configured."""
+    return any(b is not None for b in uv_bounds(params))
+
+
+def _channel_extrema(inst, picks: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    """Return per-channel (min, max) in volts over the whole trace of picks.
+
+    inst is an MNE instance or a plain (n_channels, n_times) /
+    (n_epochs, n_channels, n_times) array such as a store's memmap. Loaded
+    data is reduced channel by channel on views of the array; lazy Raw/Epochs
+    are read in blocks. No full-size copy is made.
+    """
+    if isinstance(inst, np.ndarray):
+        data = inst
+    else:
+        data = getattr(inst, "_data", None) if getattr(inst, "preload", True) else None
+    if isinstance(data, np.ndarray):
+        views = [data[:, i] if data.ndim == 3 else data[i] for i in picks]
+        # float64 like MNE's get_data, so float32 stores compare the same in µV
+        return (
+            np.array([np.nanmin(v) for v in views], dtype=np.float64),
+            np.array([np.nanmax(v) for v in views], dtype=np.float64),
+        )
+
+    if hasattr(inst, "event_id"):
+        blocks = (inst.get_data(picks=picks, item=i)[0] for i in range(len(inst)))
+    else:
+        n_times = inst.n_times
+        blocks = (
+            inst.get_data(picks=picks, start=start, stop=min(start + UV_BLOCK_SAMPLES, n_times))
+            for start in range(0, n_times, UV_BLOCK_SAMPLES)
+        )
+    # NaN start + fmin/fmax keeps nanmin semantics (all-NaN channels stay NaN)
+    mins = np.full(len(picks), np.nan)
+    maxs = np.full(len(picks), np.nan)
+    for block in blocks:
+        mins = np.fmin(mins, np.nanmin(block, axis=-1))
+        maxs = np.fmax(maxs, np.nanmax(block, axis=-1))
+    return mins, maxs
+
+
+def _uv_keep_mask(ch_mins: np.ndarray, ch_maxs: np.ndarray, params: FilterParams) -> np.ndarray:
+    """Return which channels lie within the µV bounds, given their extrema in volts."""
+    uv_min, uv_max = uv_bounds(params)
+    keep_mask = np.ones(len(ch_mins), dtype=bool)
+    if uv_min is not None:
+        keep_mask &= ch_mins * 1e6 >= uv_min
+    if uv_max is not None:
+        keep_mask &= ch_maxs * 1e6 <= uv_max
+    return keep_mask
+
 
 class ChannelsHelper:
     """Utilities for channel selection and optional µV range filtering.
@@ -43,19 +121,7 @@ class ChannelsHelper:
 
     def filter_by_uv(self) -> None:
         """Optionally filter previously selected channels by µV min/max bounds."""
-        # Coerce uv_min/uv_max to floats or None (UI may provide empty strings)
-        def _to_float_or_none(x):
-            if x is None:
-                return None
-            try:
-                if isinstance(x, str) and x.strip() == "":
-                    return None
-                return float(x)
-            except Exception:
-                return None
-
-        uv_min = _to_float_or_none(getattr(self.params, 'uv_min', None))
-        uv_max = _to_float_or_none(getattr(self.params, 'uv_max', None))
+        uv_min, uv_max = uv_bounds(self.params)
 
         if self.picks is None:
             self.pick_channels()
@@ -72,35 +138,12 @@ class ChannelsHelper:
             self.pick_names = []
             return
 
-        # Determine data array in µV for the selected picks
-        inst = self.inst
-        data_uv = None
         try:
-            if hasattr(inst, 'data') and not hasattr(inst, 'get_data'):
-                data_uv = inst.data[picks, :] * 1e6
-            else:
-                arr = inst.get_data(picks=picks)
-                if arr.ndim == 2:
-                    data_uv = arr * 1e6  # (n_ch, n_times)
-                elif arr.ndim == 3:
-                    n_epochs, n_ch, n_times = arr.shape
-                    data_uv = arr.transpose(1, 0, 2).reshape(n_ch, -1) * 1e6
-                else:
-                    data_uv = None
+            ch_mins, ch_maxs = _channel_extrema(self.inst, picks)
         except Exception:
-            data_uv = None
-
-        if data_uv is None:
             # cannot determine, leave picks unchanged
             return
-
-        ch_mins = np.nanmin(data_uv, axis=-1)
-        ch_maxs = np.nanmax(data_uv, axis=-1)
-        keep_mask = np.ones(len(picks), dtype=bool)
-        if uv_min is not None:
-            keep_mask &= ch_mins >= uv_min
-        if uv_max is not None:
-            keep_mask &= ch_maxs <= uv_max
+        keep_mask = _uv_keep_mask(ch_mins, ch_maxs, self.params)
 
         kept = [idx for idx, keep in zip(picks, keep_mask) if keep]
         # If filter removes everything, fall back to original picks to avoid empty selection
@@ -112,28 +155,80 @@ class ChannelsHelper:
 def prepare_channels(inst, params: FilterParams):
     """End-to-end channel preparation as a simple module function.
 
-    - For Epochs-like objects, ensure data is loaded (copy.load_data()).
     - Select channels according to params (including showbad behavior).
     - Optionally filter channels by µV range across the full trace.
     - Optionally combine selected channels into a single 'combined' channel.
 
-    Returns a new instance (picked or channel-combined), leaving the input unmodified.
+    Only the picked channels' data is copied. Returns a new instance (picked
+    or channel-combined), leaving the input unmodified.
     """
-    # Ensure data is loaded for objects that support lazy loading (e.g., Epochs)
-    if hasattr(inst, "event_id") and hasattr(inst, "load_data"):
+    owned = False
+    if hasattr(inst, "event_id") and hasattr(inst, "load_data") and not inst.preload:
+        # MNE cannot drop channels of unloaded epochs: load once into a private copy
         inst = inst.copy().load_data()
+        owned = True
 
     helper = ChannelsHelper(params, inst)
     helper.pick_channels()
     helper.filter_by_uv()
     picks = helper.picks or []
-    pick_names = helper.pick_names or []
 
     if getattr(params, 'combine_channels', False):
-        if pick_names:
+        if picks:
             return mne.channels.combine_channels(
-                inst, groups={"combined": list(pick_names)}, method="mean"
+                inst, groups={"combined": list(picks)}, method="mean"
             )
-        return inst.copy()
+        return inst if owned else inst.copy()
     else:
-        return inst.copy().pick(picks)
+        return inst.pick(picks) if owned else picked_copy(inst, picks)
+
+
+def prepare_store_channels(store, params: FilterParams) -> tuple[np.ndarray, list[str]]:
+    """Channel selection for a CohortEpochsStore, mirroring prepare_channels.
+
+    Returns float32 (n_epochs, n_channels, n_times) data and its channel
+    names. The µV filter reduces views of the store's memmap and only the
+    kept channels are read, so no float64 or MNE copy of the cohort is made.
+    """
+    helper = ChannelsHelper(params, store)
+    helper.pick_channels()
+    names = helper.pick_names or []
+    if has_uv_filter(params) and names:
+        keep_mask = _uv_keep_mask(*_channel_extrema(store.data, helper.picks), params)
+        # Same fallback as filter_by_uv: never filter down to no channels
+        if keep_mask.any():
+            names = [ch for ch, keep in zip(names, keep_mask) if keep]
+    data = store.get_data(names)
+
+    if getattr(params, 'combine_channels', False) and names:
+        # Averaged in float64 like mne.channels.combine_channels
+        return data.mean(axis=1, keepdims=True, dtype=np.float64).astype(np.float32), ["combined"]
+    return data, names
+
+
+def prepare_spectrum(spectrum, params: FilterParams, fmin=None, fmax=None, epochs=None):
+    """Channel/frequency selection for a per-epoch spectrum, mirroring prepare_channels.
+
+    The µV-range filter needs the time series, so it is applied only when the
+    matching `epochs` are given. Channel combination cannot be derived from
+    per-channel spectra and is not handled here.
+
+    Returns a new EpochsSpectrumArray, leaving the input unmodified.
+    """
+    helper = ChannelsHelper(params, epochs if epochs is not None else spectrum)
+    helper.pick_channels()
+    if epochs is not None:
+        helper.filter_by_uv()
+    pick_names = helper.pick_names or []
+
+    data, freqs = spectrum.get_data(
+        picks=pick_names,
+        exclude=(),
+        fmin=0 if fmin is None else fmin,
+        fmax=np.inf if fmax is None else fmax,
+        return_freqs=True,
+    )
+    info = mne.pick_info(spectrum.info, [spectrum.ch_names.index(ch) for ch in pick_names])
+    return EpochsSpectrumArray(
+        data, info, freqs, events=spectrum.events, event_id=spectrum.event_id, verbose="ERROR"
+    )
@@ -0,0 +1,197 @@
+"""Out-of-core storage for cohort-wide epochs.
+
+CohortEpochsStore replaces `mne.concatenate_epochs` for cohorts: per-task
+epochs are appended to a flat float32 file on disk as they arrive, and a JSON
+sidecar records events, event_id, per-epoch labels and subject ids. Once
+finalized, the data is exposed as a read-only `np.memmap` of shape
+(n_epochs, n_channels, n_times), so consumers can slice channels or epochs
+without the whole cohort ever being resident in RAM.
+"""
+import json
+import shutil
+import tempfile
+import weakref
+from pathlib import Path
+
+import mne
+import numpy as np
+
+
+class CohortEpochsStore:
+    """Append-only memmap-backed epochs array with an events/labels sidecar."""
+
+    DATA_FILE = "data.f32"
+    META_FILE = "meta.json"
+    INFO_FILE = "info.fif"
+
+    def __init__(self, root: Path, temporary: bool = False):
+        """Bind store to a (new or finalized) directory; temporary stores are removed on GC."""
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.info: mne.Info | None = None
+        self.ch_names: list[str] = []
+        self.tmin = 0.0
+        self.n_times = 0
+        self.n_epochs = 0
+        self.baseline = None
+        self.event_id: dict[str, int] = {}
+        self.labels: list[str] = []
+        self._events: list[np.ndarray] = []
+        self._subject_ids: list[str] = []
+        self._events_offset = 0
+        self._shift = 0
+        self._data: np.memmap | None = None
+        self.events: np.ndarray | None = None
+        self.subject_ids: np.ndarray | None = None
+        if temporary:
+            weakref.finalize(self, shutil.rmtree, self.root, ignore_errors=True)
+
+    @classmethod
+    def create_temporary(cls, scratch_dir: str | None = None) -> "CohortEpochsStore":
+        """Create a store in a fresh scratch directory deleted with the object."""
+        root = tempfile.mkdtemp(prefix="cohort-epochs-", dir=scratch_dir)
+        return cls(Path(root), temporary=True)
+
+    @property
+    def data(self) -> np.memmap:
+        """Read-only (n_epochs, n_channels, n_times) float32 view of the store."""
+        if self._data is None:
+            raise RuntimeError("CohortEpochsStore is not finalized")
+        return self._data
+
+    @property
+    def epoch_labels(self) -> np.ndarray:
+        """Condition label of every epoch, derived from event codes."""
+        inv = {v: k for k, v in self.event_id.items()}
+        return np.array([inv.get(int(code), "?") for code in self.events[:, 2]], dtype=object)
+
+    @property
+    def present_event_id(self) -> dict[str, int]:
+        """event_id restricted to the codes that occur in the stored events."""
+        codes = set(self.events[:, 2].tolist())
+        return {k: v for k, v in self.event_id.items() if v in codes}
+
+    def append(self, epochs: mne.BaseEpochs, subject: str | None):
+        """Write one task's epochs to disk and record its events and subject.
+
+        The caller's epochs are not modified: bad epochs are dropped on a copy
+        when they are not loaded (loaded epochs already had them dropped).
+        """
+        if not epochs.preload:
+            # Copies of unloaded epochs share the Raw, so this costs no data
+            epochs = epochs.copy()
+        epochs.drop_bad()
+        if len(epochs) == 0:
+            return
+
+        if self.info is None:
+            self.info = epochs.info.copy()
+            self.ch_names = list(epochs.ch_names)
+            self.tmin = float(epochs.tmin)
+            self.n_times = len(epochs.times)
+            self.baseline = epochs.baseline
+            # Same event offset scheme as mne.concatenate_epochs: tmax + 10 s gap
+            self._shift = int((10 + epochs.tmax) * epochs.info["sfreq"])
+        elif list(epochs.ch_names) != self.ch_names or len(epochs.times) != self.n_times:
+            raise ValueError("Epochs must have the same channels and times to be stored together")
+
+        for name, code in epochs.event_id.items():
+            if self.event_id.get(name, code) != code:
+                raise ValueError(f"event_id '{name}' maps to {self.event_id[name]} and {code}")
+            self.event_id[name] = code
+
+        events = epochs.events.copy()
+        max_sample = int(np.max(events[:, 0]))
+        events[:, 0] += self._events_offset
+        self._events_offset += max_sample + self._shift
+        self._events.append(events)
+        self._subject_ids.extend([str(subject)] * len(events))
+
+        data = epochs.get_data().astype(np.float32, copy=False)
+        with open(self.root / self.DATA_FILE, "ab") as f:
+            f.write(np.ascontiguousarray(data).tobytes())
+        self.n_epochs += len(events)
+
+    def finalize(self, labels: list[str] | None = None):
+        """Flush sidecar files and open the memmap view."""
+        self.labels = list(labels) if labels is not None else sorted(self.event_id)
+        self.events = np.concatenate(self._events, axis=0) if self._events else np.empty((0, 3), dtype=int)
+        self.subject_ids = np.array(self._subject_ids, dtype=object)
+        self._events, self._subject_ids = [], []
+
+        meta = {
+            "ch_names": self.ch_names,
+            "tmin": self.tmin,
+            "n_times": self.n_times,
+            "n_epochs": self.n_epochs,
+            "baseline": list(self.baseline) if self.baseline is not None else None,
+            "event_id": self.event_id,
+            "labels": self.labels,
+            "events": self.events.tolist(),
+            "subject_ids": self.subject_ids.tolist(),
+        }
+        with open(self.root / self.META_FILE, "w") as f:
+            json.dump(meta, f)
+        if self.info is not None:
+            mne.io.write_info(self.root / self.INFO_FILE, self.info, overwrite=True)
+        self._open_data()
+        return self
+
+    @classmethod
+    def open(cls, root: Path) -> "CohortEpochsStore":
+        """Open a previously finalized store directory."""
+        store = cls(root)
+        with open(store.root / cls.META_FILE) as f:
+            meta = json.load(f)
+        store.ch_names = meta["ch_names"]
+        store.tmin = meta["tmin"]
+        store.n_times = meta["n_times"]
+        store.n_epochs = meta["n_epochs"]
+        store.baseline = tuple(meta["baseline"]) if meta["baseline"] is not None else None
+        store.event_id = meta["event_id"]
+        store.labels = meta["labels"]
+        store.events = np.array(meta["events"], dtype=int).reshape(-1, 3)
+        store.subject_ids = np.array(meta["subject_ids"], dtype=object)
+        store.info = mne.io.read_info(store.root / cls.INFO_FILE, verbose="ERROR")
+        store._open_data()
+        return store
+
+    def _open_data(self):
+        shape = (self.n_epochs, len(self.ch_names), self.n_times)
+        if self.n_epochs == 0:
+            self._data = np.empty(shape, dtype=np.float32)
+            return
+        self._data = np.memmap(self.root / self.DATA_FILE, dtype=np.float32, mode="r", shape=shape)
+
+    def get_data(self, picks: list[str] | None = None, epochs_idx=None) -> np.ndarray:
+        """Return float32 data, reading only the requested channels/epochs."""
+        data = self.data
+        if epochs_idx is not None:
+            data = data[epochs_idx]
+        if picks is not None:
+            data = data[:, [self.ch_names.index(ch) for ch in picks]]
+        return data
+
+    def to_epochs(self, picks: list[str] | None = None) -> mne.EpochsArray | None:
+        """Materialize an EpochsArray, optionally restricted to channel names.
+
+        This is a float64 copy of the picked channels, for the MNE plotting
+        paths; array consumers such as the trainer read get_data instead.
+        """
+        if self.n_epochs == 0:
+            return None
+        info = self.info
+        if picks is not None:
+            wanted = set(picks)
+            picks = [ch for ch in self.ch_names if ch in wanted]
+            info = mne.pick_info(self.info, [self.ch_names.index(ch) for ch in picks])
+        data = np.asarray(self.get_data(picks), dtype=np.float64)
+        return mne.EpochsArray(
+            data,
+            info,
+            events=self.events,
+            tmin=self.tmin,
+            event_id=self.present_event_id,
+            baseline=self.baseline,
+            verbose="ERROR",
+        )
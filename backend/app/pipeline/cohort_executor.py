@@ -1,32 +1,140 @@
 """Cohort-level executor aggregating multiple task executors."""
 
 import logging
+import multiprocessing
+import os
 import pandas as pd
+import shutil
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 
-from mne import concatenate_raws, concatenate_epochs, grand_average
+from mne import concatenate_raws
 from tqdm.auto import tqdm
 
+from app.core.cache_key_helper import (
+    get_cleaning_key,
+    get_epochs_key,
+    get_evoked_key,
+    get_evoked_by_condition_key,
+)
+from app.core.cache_manager import CohortCacheKey, LocalCache, PIPELINE_VERSION
+from app.core.chunked_epochs import match_conditions
+from app.core.memory_cache import memory_cache, worker_budget_bytes
 from app.core.progress_logger import ProgressEmitter
+from app.pipeline.cohort_epochs_store import CohortEpochsStore
+from app.pipeline.evoked_accumulator import EvokedAccumulator
 from app.pipeline.task_executor import EEGTaskExecutor
+from app.pipeline.task_processor import stimulus_of
 from app.schemas.session_schema import PipelineSession
 
 
+def default_max_workers() -> int:
+    """Return pool size from COHORT_MAX_WORKERS (defaults to half the CPUs)."""
+    env = os.getenv("COHORT_MAX_WORKERS")
+    if env:
+        return max(1, int(env))
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def cache_cohort_epochs() -> bool:
+    """Return True if cohort epochs stores persist in the cache (COHORT_EPOCHS_CACHE=1).
+
+    By default a store is built in a scratch directory (COHORT_SCRATCH_DIR or
+    the system temp dir) and removed with the executor.
+    """
+    return os.getenv("COHORT_EPOCHS_CACHE", "0").strip().lower() in ("1", "true", "yes")
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Return the shared worker pool, (re)creating it when the size changes.
+
+    Workers are spawned (not forked) because the server process is threaded,
+    and the pool is kept alive so the MNE import cost is paid once.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def _init_worker():
+    """Size the worker's own memory tier (disabled by default) instead of the server's budget."""
+    memory_cache.resize(worker_budget_bytes())
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next call spawns a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+# Executor stage -> (cache stage, key params fn) used to plan cached vs. to-compute tasks
+_PLANNED_STAGES = {
+    "get_filtered_raw": ("cleaned", get_cleaning_key),
+    "get_epochs": ("epochs", get_epochs_key),
+    "get_evoked": ("evoked", get_evoked_key),
+    "get_evokeds_by_condition": ("evoked", get_evoked_by_condition_key),
+}
+
+
+def _run_task_stage(task_executor: EEGTaskExecutor, stage: str, session: PipelineSession):
+    """Run one EEGTaskExecutor stage inside a worker process.
+
+    Lazy epochs still reference the in-memory Raw, so they are loaded here to
+    keep the pickled result small.
+    """
+    result = getattr(task_executor, stage)(session)
+    if stage == "get_epochs" and result[0] is not None and not result[0].preload:
+        result[0].load_data()
+    return result
+
+
+def _warm_task_stage(task_executor: EEGTaskExecutor, stage: str, session: PipelineSession):
+    """Run one stage for its cache side effect; return (status, error) instead of data."""
+    try:
+        result = getattr(task_executor, stage)(session)
+    except Exception as e:
+        return "error", f"{type(e).__name__}: {e}"
+    if isinstance(result, tuple):
+        result = result[0]
+    return ("ok" if result is not None else "empty"), None
+
+
 class EEGCohortExecutor:
     """Aggregate operations (filter, epochs, evoked) across a set of task models."""
     def __init__(
             self,
             task_executor_list: list[EEGTaskExecutor],
             subject_length: int,
-            ws_progress: ProgressEmitter | None
+            ws_progress: ProgressEmitter | None,
+            max_workers: int | None = None,
+            *,
+            cache: LocalCache | None = None,
         ):
         """Initialize cohort with filter DTO, task models and subject count."""
         self.task_executor_list = task_executor_list
         self.subject_length = subject_length
         self.ws_progress = ws_progress
+        self.max_workers = max_workers or default_max_workers()
+        self._cache = cache
         self.filtered_raw = None
-        self.epochs = None
-        self.labels = None
+        self.epochs_store = None
         self.evoked = None
         self._electrodes = None
         self._metadata = None
@@ -69,41 +177,200 @@ class EEGCohortExecutor:
             self._channels = self.task_executor_list[0].channels
         return self._channels
 
-    def get_filtered_raw(self, session: PipelineSession):
-        """Filter and concatenate Raw objects across all tasks (with cache)."""
-        if self.filtered_raw is not None:
-            return self.filtered_raw
-
-        filtered_list = []
-        t0 = time.perf_counter()
-
-        progress_bar = tqdm(
-            self.task_executor_list,
-            desc="Filtering raws",
-            total=len(self.task_executor_list),
-            leave=False
+    @property
+    def cache(self) -> LocalCache:
+        """Return the cache used for cohort-level artifacts (created lazily)."""
+        if self._cache is None:
+            self._cache = LocalCache(pipeline_ver=PIPELINE_VERSION)
+        return self._cache
+
+    def cohort_key(self, stage: str, params: dict) -> CohortCacheKey:
+        """Build a cache key from the sorted subject/task/run set, source fingerprints and params."""
+        rows = sorted(
+            (
+                ((te.task.subject, te.task.task, te.task.run), te.source_fingerprint("epochs"))
+                for te in self.task_executor_list
+            ),
+            key=lambda r: (r[0][0] or "", r[0][1] or "", r[0][2] or 0),
+        )
+        return CohortCacheKey(
+            tasks=tuple(t for t, _ in rows),
+            stage=stage,
+            params=params,
+            pipeline_ver=self.cache.pipeline_ver,
+            sources=tuple(source for _, source in rows),
         )
 
-        for i, task_executor in enumerate(progress_bar):
-            raw = task_executor.get_filtered_raw(session)
-            if raw is not None:
-                filtered_list.append(raw)
-
-            # ---- WS PROGRESS ----
+    def get_label_aggregates(self, session: PipelineSession, stage: str, params: dict, compute):
+        """Return cached per-label aggregate arrays, running compute() on a miss.
+
+        `params` must hold everything the aggregate depends on beyond the
+        cohort epochs themselves (PSD range, channel selection, ...).
+        """
+        ck = self.cohort_key(stage, {**get_evoked_key(session), **params})
+        arrays = self.cache.load_arrays(ck, stage)
+        if arrays is not None:
+            return arrays
+        arrays = compute()
+        if arrays:
+            self.cache.save_arrays(arrays, ck, stage)
+        return arrays
+
+    def plan(self, stage: str, session: PipelineSession) -> set[int]:
+        """Return indices of tasks whose result for an executor stage is already cached."""
+        planned = _PLANNED_STAGES.get(stage)
+        if planned is None:
+            return set()
+        cache_stage, key_fn = planned
+        tasks = [te.task for te in self.task_executor_list]
+        try:
+            sources = [te.source_fingerprint(cache_stage) for te in self.task_executor_list]
+            cached, _ = self.cache.plan(tasks, cache_stage, key_fn(session), sources)
+        except Exception as e:
+            self._log.warning("Cache plan failed for %s (err=%s)", stage, e)
+            return set()
+        cached_ids = {id(t) for t in cached}
+        return {i for i, t in enumerate(tasks) if id(t) in cached_ids}
+
+    def _iter_task_results(
+            self,
+            stage: str,
+            session: PipelineSession,
+            desc: str,
+            log_prefix: str,
+            progress_scale: float = 1.0,
+        ):
+        """Yield (task_executor, result) in task order for one executor stage.
+
+        With more than one worker the stage runs on a spawn-based process pool.
+        Tasks the cache index already holds are read in this process instead,
+        so cache hits skip the pool and the pickling round-trip. Progress is
+        reported as tasks complete, while results are released in the
+        original task order so downstream aggregation stays deterministic.
+        """
+        executors = self.task_executor_list
+        total = len(executors)
+        progress_bar = tqdm(total=total, desc=desc, leave=False)
+
+        def _report(done: int):
+            progress_bar.update(1)
             if self.ws_progress:
                 meter = tqdm.format_meter(
-                    n=i + 1,
-                    total=len(self.task_executor_list),
+                    n=done,
+                    total=total,
                     elapsed=progress_bar.format_dict.get("elapsed", 0),
                     rate=progress_bar.format_dict.get("rate", None),
                     unit="task"
                 )
+                self.ws_progress.sync_log(
+                    f"{log_prefix} {done}/{total} | {meter}",
+                    progress=done / total * progress_scale
+                )
 
+        try:
+            if self.max_workers <= 1 or total <= 1:
+                for i, task_executor in enumerate(executors):
+                    result = getattr(task_executor, stage)(session)
+                    _report(i + 1)
+                    yield task_executor, result
+                return
+
+            cached = self.plan(stage, session)
+            self._log.info(
+                "Running %s for %d tasks (%d cached) on %d workers", stage, total, len(cached), self.max_workers
+            )
+            pool = _get_pool(self.max_workers) if len(cached) < total else None
+            futures = {
+                pool.submit(_run_task_stage, task_executor, stage, session): i
+                for i, task_executor in enumerate(executors)
+                if i not in cached
+            }
+            try:
+                finished = {}
+                next_idx = 0
+                done = 0
+                for i in sorted(cached):
+                    finished[i] = getattr(executors[i], stage)(session)
+                    done += 1
+                    _report(done)
+                    while next_idx in finished:
+                        yield executors[next_idx], finished.pop(next_idx)
+                        next_idx += 1
+                for fut in as_completed(futures):
+                    finished[futures[fut]] = fut.result()
+                    done += 1
+                    _report(done)
+                    while next_idx in finished:
+                        yield executors[next_idx], finished.pop(next_idx)
+                        next_idx += 1
+            except BrokenProcessPool:
+                if pool is not None:
+                    _reset_pool(pool)
+                raise
+            finally:
+                # Early exit (error or consumer stopped): drop queued tasks
+                for fut in futures:
+                    fut.cancel()
+        finally:
+            progress_bar.close()
+
+    def warm_cache(self, session: PipelineSession, stage: str = "get_evoked") -> dict:
+        """Fill the per-task cache for one stage (and everything upstream of it).
+
+        Tasks already cached are skipped, so an interrupted run resumes where
+        it stopped. Failures are collected per task instead of aborting.
+        Nothing but a status string crosses the process boundary.
+        """
+        executors = self.task_executor_list
+        cached = self.plan(stage, session)
+        todo = [te for i, te in enumerate(executors) if i not in cached]
+        summary = {"total": len(executors), "cached": len(cached), "ok": 0, "empty": 0, "errors": {}}
+        total = len(todo)
+        self._log.info("Warming %s for %d tasks (%d already cached)", stage, total, len(cached))
+
+        def _record(task_executor, status, error, done):
+            if status == "error":
+                t = task_executor.task
+                summary["errors"][f"{t.subject}/{t.task}/run-{t.run}"] = error
+                self._log.warning("Warm-up failed for %s: %s", t, error)
+            else:
+                summary[status] += 1
+            if self.ws_progress:
                 self.ws_progress.sync_log(
-                    f"[Filter] {i+1}/{len(self.task_executor_list)} | {meter}",
-                    progress=(i + 1) / len(self.task_executor_list)
+                    f"[Warm-up] {done}/{total} | cached={len(cached)} errors={len(summary['errors'])}",
+                    progress=done / total,
                 )
 
+        if self.max_workers <= 1 or total <= 1:
+            for done, task_executor in enumerate(todo, start=1):
+                _record(task_executor, *_warm_task_stage(task_executor, stage, session), done)
+            return summary
+
+        pool = _get_pool(self.max_workers)
+        futures = {pool.submit(_warm_task_stage, te, stage, session): te for te in todo}
+        try:
+            for done, fut in enumerate(as_completed(futures), start=1):
+                _record(futures[fut], *fut.result(), done)
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            raise
+        finally:
+            for fut in futures:
+                fut.cancel()
+        return summary
+
+    def get_filtered_raw(self, session: PipelineSession):
+        """Filter and concatenate Raw objects across all tasks (with cache)."""
+        if self.filtered_raw is not None:
+            return self.filtered_raw
+
+        filtered_list = []
+        t0 = time.perf_counter()
+
+        for _, raw in self._iter_task_results("get_filtered_raw", session, "Filtering raws", "[Filter]"):
+            if raw is not None:
+                filtered_list.append(raw)
+
         t_loop = time.perf_counter() - t0
         if not filtered_list:
             self._log.info("No raws produced (loop took %.2fs)", t_loop)
@@ -125,142 +392,227 @@ class EEGCohortExecutor:
             filtered_list.clear()
         return self.filtered_raw
 
-    def get_epochs(self, session: PipelineSession):
-        """Build and concatenate Epochs across tasks; return (epochs, labels)."""
-        if self.epochs is not None:
-            return self.epochs, self.labels
+    def get_epochs_store(self, session: PipelineSession) -> CohortEpochsStore | None:
+        """Write every task's epochs into an on-disk store; return it (or None).
 
-        epochs_list = []
-        labels_union = set()
+        The store is a scratch directory removed with the executor unless
+        COHORT_EPOCHS_CACHE is set, in which case it is kept in the cache,
+        registered in the cache index and counted against the quota.
+        """
+        if self.epochs_store is not None:
+            return self.epochs_store
 
-        t0 = time.perf_counter()
+        if not cache_cohort_epochs():
+            store = CohortEpochsStore.create_temporary(os.getenv("COHORT_SCRATCH_DIR") or None)
+            labels = self._fill_epochs_store(store, session)
+            if labels is None:
+                return None
+            self.epochs_store = store.finalize(labels)
+            self._log.info("Stored %d epochs on disk", store.n_epochs)
+            return self.epochs_store
+
+        # Epochs are stimulus-filtered per task, so the key needs the stimulus too
+        ck = self.cohort_key("epochs", get_evoked_key(session))
+        store_dir = self.cache.dir_for(ck, "epo")
+        if store_dir.exists():
+            try:
+                self.epochs_store = self.cache.hold(store_dir, CohortEpochsStore.open(store_dir))
+                self.cache.record_hit(store_dir)
+                self._log.info("Loaded cohort epochs store %s", store_dir)
+                return self.epochs_store
+            except Exception as e:
+                self._log.warning("Corrupt cohort epochs store %s, rebuilding (err=%s)", store_dir, e)
+                shutil.rmtree(store_dir, ignore_errors=True)
+
+        tmp_dir = store_dir.with_name(f"{store_dir.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+        store = CohortEpochsStore(tmp_dir)
+        labels = self._fill_epochs_store(store, session)
+        if labels is None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return None
 
-        progress_bar = tqdm(
-            self.task_executor_list,
-            desc="Building epochs",
-            total=len(self.task_executor_list),
-            leave=False
+        store.finalize(labels)
+        del store
+        try:
+            tmp_dir.rename(store_dir)
+        except OSError:
+            # Another request stored the same cohort first; keep that one
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.epochs_store = self.cache.hold(store_dir, CohortEpochsStore.open(store_dir))
+        self.cache.register_dir(
+            ck, "epo", {"sfreq": float(self.epochs_store.info["sfreq"]), "n_epochs": self.epochs_store.n_epochs}
         )
+        self._log.info("Stored %d epochs in cohort cache", self.epochs_store.n_epochs)
+        return self.epochs_store
+
+    def get_condition_labels(self, session: PipelineSession) -> list[str] | None:
+        """Return the condition labels of the cohort epochs without building the epochs store.
+
+        A store already built (or kept in the cache) carries them in its
+        metadata. Otherwise they are the per-condition grand averages'
+        conditions that the session's stimulus selects, i.e. the event names
+        the store would hold.
+        """
+        store = self.epochs_store
+        if store is None and cache_cohort_epochs():
+            if self.cache.dir_for(self.cohort_key("epochs", get_evoked_key(session)), "epo").exists():
+                store = self.get_epochs_store(session)
+        if store is not None:
+            return list(store.labels)
+
+        evokeds = self.get_evokeds_by_condition(session)
+        if not evokeds:
+            return None
+        names = sorted(evokeds)
+        stim = stimulus_of(session.epochs)
+        if stim:
+            codes = match_conditions({name: i for i, name in enumerate(names)}, [stim])
+            names = [name for i, name in enumerate(names) if i in codes]
+        return names
+
+    def _fill_epochs_store(self, store: CohortEpochsStore, session: PipelineSession) -> list[str] | None:
+        """Append every task's epochs to store; return the sorted labels (None: no usable epochs)."""
+        labels_union = set()
+        t0 = time.perf_counter()
 
-        for i, task_executor in enumerate(progress_bar):
-            epochs, labels = task_executor.get_epochs(session)
+        for task_executor, (epochs, labels) in self._iter_task_results(
+                "get_epochs", session, "Building epochs", "[Epochs]"
+        ):
             if epochs is None:
                 continue
-            epochs_list.append(epochs)
             if isinstance(labels, str) and labels == "unavailable":
                 return None
+            store.append(epochs, task_executor.task.subject)
             if labels is not None:
                 labels_union.update(labels)
 
-            # ---- WS PROGRESS ----
-            if self.ws_progress:
-                meter = tqdm.format_meter(
-                    n=i + 1,
-                    total=len(self.task_executor_list),
-                    elapsed=progress_bar.format_dict.get("elapsed", 0),
-                    rate=progress_bar.format_dict.get("rate", None),
-                    unit="task"
-                )
-
-                self.ws_progress.sync_log(
-                    f"[Epochs] {i+1}/{len(self.task_executor_list)} | {meter}",
-                    progress=(i + 1) / len(self.task_executor_list)
-                )
-
         t_loop = time.perf_counter() - t0
-
-        if not epochs_list:
+        if store.n_epochs == 0:
             self._log.info("No epochs produced (loop took %.2fs)", t_loop)
             return None
-
-        self._log.info("Concatenating %d epochs (build loop %.2fs)", len(epochs_list), t_loop)
+        self._log.info("Appended %d epochs (build loop %.2fs)", store.n_epochs, t_loop)
+        return sorted(labels_union)
+
+    def get_epochs(self, session: PipelineSession, picks: list[str] | None = None):
+        """Build Epochs across tasks from the on-disk store; return (epochs, labels).
+
+        With `picks` only the named channels are read from the store. The
+        EpochsArray is a float64 copy, so it is rebuilt per call rather than
+        kept on the executor; the store itself is kept.
+        """
+        store = self.get_epochs_store(session)
+        if store is None:
+            return None, None
         t_cat0 = time.perf_counter()
-        self.epochs = concatenate_epochs(epochs_list)
-        t_cat = time.perf_counter() - t_cat0
-        self._log.info("Concatenated epochs in %.2fs", t_cat)
-        epochs_list.clear()
-        self.labels = sorted(labels_union)
-        return self.epochs, self.labels
+        epochs = store.to_epochs(picks=picks)
+        self._log.info("Materialized %d cohort epochs in %.2fs", store.n_epochs, time.perf_counter() - t_cat0)
+        return epochs, store.labels
+
+    def get_epochs_psd(self, session: PipelineSession, tmin: float | None, tmax: float | None, fft_sec: float):
+        """Return None: cohorts keep no per-epoch spectrum, so callers compute it from get_epochs."""
+        return None
 
     def get_evoked(self, session: PipelineSession):
-        """Compute per-subject averages then grand-average across subjects."""
+        """Compute per-subject averages then grand-average across subjects.
+
+        Each Evoked is folded into its subject's running average as soon as it
+        is produced; once all of a subject's tasks are in, the subject average
+        is folded into the cohort average and released.
+        """
         if self.evoked is not None:
             return self.evoked
 
-        # 1) Get evoked for each task_executor
-        evokeds_by_subject: dict[str, list] = {}
-        t0 = time.perf_counter()
+        ck = self.cohort_key("evoked", get_evoked_key(session))
+        cached = self.cache.load_evoked(ck)
+        if cached is not None:
+            self.evoked = cached
+            return self.evoked
 
-        progress_bar = tqdm(
-            self.task_executor_list,
-            desc="Computing evoked",
-            total=len(self.task_executor_list),
-            leave=False
+        t0 = time.perf_counter()
+        n_tasks = Counter(te.task.subject for te in self.task_executor_list)
+        n_tasks.pop(None, None)
+        remaining = n_tasks.copy()
+        open_subjects: dict[str, EvokedAccumulator] = {}
+        cohort_acc = EvokedAccumulator(len(n_tasks))
+
+        task_results = self._iter_task_results(
+            "get_evoked", session, "Computing evoked", "[Evoked] Collect", progress_scale=0.9
         )
-
-        for i, task_executor in enumerate(progress_bar):
-            evk = task_executor.get_evoked(session)
-            if evk is None:
-                continue
+        for task_executor, evk in task_results:
             subj = task_executor.task.subject
             if subj is None:
                 continue
-            evokeds_by_subject.setdefault(subj, []).append(evk)
+            if evk is not None:
+                open_subjects.setdefault(subj, EvokedAccumulator(n_tasks[subj])).add(evk)
 
-            if self.ws_progress:
-                self.ws_progress.sync_log(
-                    f"[Evoked] Collect {i+1}/{len(self.task_executor_list)}",
-
-            progress=(i + 1) / len(self.task_executor_list) * 0.6
-        )
+            # 1) Subject complete: average its runs, then fold into the cohort
+            remaining[subj] -= 1
+            if remaining[subj] == 0 and subj in open_subjects:
+                cohort_acc.add(open_subjects.pop(subj).result())
 
         t_evoked_loop = time.perf_counter() - t0
 
-        if not evokeds_by_subject:
+        if cohort_acc.count == 0:
             self._log.info("No evoked responses computed (loop took %.2fs)", t_evoked_loop)
             return None
 
-        # 2) For same subject: average runs first (nave-weighted)
-        per_subject_evoked = []
-        t_sub0 = time.perf_counter()
-
-        subjects = list(evokeds_by_subject.items())
-
-        for i, (subj, evk_list) in enumerate(subjects):
-            if not evk_list:
-                continue
-            if len(evk_list) == 1:
-                per_subject_evoked.append(evk_list[0])
-            else:
-                per_subject_evoked.append(grand_average(evk_list))
-
-            if self.ws_progress:
-                self.ws_progress.sync_log(
-                    f"[Evoked] Subject avg {i+1}/{len(subjects)}",
-                    progress=0.6 + (i + 1) / len(subjects) * 0.3
-                )
-
-        t_sub = time.perf_counter() - t_sub0
-        self._log.info("Per-subject averaging: %d subjects in %.2fs", len(evokeds_by_subject), t_sub)
-
-        if not per_subject_evoked:
-            return None
-
-        # 3) Grand-average across subjects (nave-weighted)
-        t_ga0 = time.perf_counter()
-        if len(per_subject_evoked) == 1:
-            self.evoked = per_subject_evoked[0]
-        else:
-            self.evoked = grand_average(per_subject_evoked)
-
+        # 2) Grand-average across subjects
         if self.ws_progress:
             self.ws_progress.sync_log(
                 "[Evoked] Grand averaging...",
                 progress=0.95
             )
 
-        t_ga = time.perf_counter() - t_ga0
-        self._log.info("Grand average across %d subjects in %.2fs (compute loop %.2fs)",
-                       len(per_subject_evoked), t_ga, t_evoked_loop)
+        self.evoked = cohort_acc.result()
+        self.cache.save_evoked(self.evoked, ck)
+        self._log.info("Grand average across %d subjects (compute loop %.2fs)",
+                       cohort_acc.count, t_evoked_loop)
 
         return self.evoked
+
+    def get_evokeds_by_condition(self, session: PipelineSession):
+        """Grand-average every condition across subjects; return {condition: Evoked}.
+
+        Same weighting as get_evoked (runs averaged per subject, subjects
+        equally weighted), but with one accumulator per condition fed from
+        each task's batched per-condition evokeds.
+        """
+        ck = self.cohort_key("evoked", get_evoked_by_condition_key(session))
+        cached = self.cache.load_evokeds(ck)
+        if cached is not None:
+            return {evk.comment: evk for evk in cached}
+
+        t0 = time.perf_counter()
+        n_tasks = Counter(te.task.subject for te in self.task_executor_list)
+        n_tasks.pop(None, None)
+        remaining = n_tasks.copy()
+        open_subjects: dict[str, dict[str, EvokedAccumulator]] = {}
+        cohort_accs: dict[str, EvokedAccumulator] = {}
+
+        task_results = self._iter_task_results(
+            "get_evokeds_by_condition", session, "Computing evoked", "[Evoked] Collect", progress_scale=0.9
+        )
+        for task_executor, evokeds in task_results:
+            subj = task_executor.task.subject
+            if subj is None:
+                continue
+            for condition, evk in (evokeds or {}).items():
+                open_subjects.setdefault(subj, {}).setdefault(condition, EvokedAccumulator(n_tasks[subj])).add(evk)
+
+            remaining[subj] -= 1
+            if remaining[subj] == 0 and subj in open_subjects:
+                for condition, acc in open_subjects.pop(subj).items():
+                    cohort_accs.setdefault(condition, EvokedAccumulator(len(n_tasks))).add(acc.result())
+
+        if not cohort_accs:
+            self._log.info("No evoked responses computed (loop took %.2fs)", time.perf_counter() - t0)
+            return None
+
+        result = {}
+        for condition, acc in cohort_accs.items():
+            evk = acc.result()
+            evk.comment = condition
+            result[condition] = evk
+        self.cache.save_evokeds(list(result.values()), ck)
+        self._log.info("Grand average of %d conditions (%.2fs)", len(result), time.perf_counter() - t0)
+        return result
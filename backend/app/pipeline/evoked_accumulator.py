@@ -0,0 +1,77 @@
+"""Incremental grand averaging of Evoked responses.
+
+EvokedAccumulator folds Evoked objects into a running sum one at a time, so a
+cohort average only ever holds one data array per open accumulator instead of
+every per-run Evoked. The result follows `mne.grand_average` semantics:
+bad channels are interpolated, channels bad or missing anywhere are dropped,
+all inputs get equal weight and `nave` is the number of averaged datasets.
+
+Given the expected number of inputs, each one is scaled by 1/n before it is
+added, in arrival order, which is exactly how `mne.combine_evoked` sums
+them: the result is then bit-identical to `grand_average` over the same list.
+If fewer inputs arrive (a task produced no Evoked), the sum is rescaled at
+the end and agrees with `grand_average` to floating-point rounding only.
+"""
+import numpy as np
+from mne import Evoked
+
+
+class EvokedAccumulator:
+    """Running equal-weight mean of Evoked objects (streaming grand_average)."""
+
+    def __init__(self, expected: int | None = None):
+        """Start an empty accumulator for `expected` inputs (None: unknown)."""
+        self.expected = expected
+        self._weight = 1.0 / expected if expected else 1.0
+        self.count = 0
+        self._input: Evoked | None = None
+        self._first: Evoked | None = None
+        self._ch_names: list[str] = []
+        self._sum: np.ndarray | None = None
+
+    def add(self, evoked: Evoked) -> None:
+        """Fold one Evoked into the running sum; the input is left untouched."""
+        if self._input is None:
+            self._input = evoked
+        if evoked.info["bads"]:
+            evoked = evoked.copy().interpolate_bads()
+        bads = set(evoked.info["bads"])
+
+        if self._first is None:
+            self._first = evoked
+            self._ch_names = [ch for ch in evoked.ch_names if ch not in bads]
+            self._sum = self._weight * evoked.data[[evoked.ch_names.index(ch) for ch in self._ch_names]]
+            self.count = 1
+            return
+
+        if evoked.data.shape[1] != self._sum.shape[1] or not (
+            np.max(np.abs(evoked.times - self._first.times)) < 1e-7
+        ):
+            raise ValueError(f"{self._first} and {evoked} do not contain the same time instants")
+
+        # Keep only channels that are good and present in every input so far
+        present = set(evoked.ch_names) - bads
+        keep = [i for i, ch in enumerate(self._ch_names) if ch in present]
+        if len(keep) != len(self._ch_names):
+            self._sum = self._sum[keep]
+            self._ch_names = [self._ch_names[i] for i in keep]
+
+        self._sum += self._weight * evoked.data[[evoked.ch_names.index(ch) for ch in self._ch_names]]
+        self.count += 1
+
+    def result(self) -> Evoked | None:
+        """Return the grand average (a single input is returned unchanged)."""
+        if self._first is None:
+            return None
+        if self.count == 1:
+            return self._input
+
+        evoked = self._first.copy().pick(self._ch_names)
+        evoked.info["bads"] = []
+        if self.expected == self.count:
+            evoked.data = self._sum
+        else:
+            evoked.data = self._sum * ((self.expected or 1) / self.count)
+        evoked.nave = self.count
+        evoked.comment = f"Grand average (n = {self.count})"
+        return evoked
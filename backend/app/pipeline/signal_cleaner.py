@@ -8,15 +8,31 @@ Class-based API `EEGCleaner` performs a complete preprocessing pipeline on MNE R
 - Mark bad time windows where a large fraction of channels are out of power range
 
 All operations are optional and controlled via FilterParamsDTO clean_* fields.
+The channel and window statistics are accumulated over time blocks of the Raw
+(see signal_stream), so marking never holds the whole recording in memory;
+ASR still fits on the full data. clean_mark feeds all steps from one shared
+stream and applies the collected bads/annotations once at the end.
 """
 import logging
 import time
+from copy import deepcopy
 
 import asrpy
 import mne
 import numpy as np
 from numpy.lib.stride_tricks import sliding_window_view as swv
 
+from app.pipeline.signal_stream import (
+    FlatRuns,
+    MedianRefCorr,
+    Rows,
+    WelchBandPower,
+    WindowOutliers,
+    WindowPower,
+    n_good_samples,
+    stream_stats,
+)
+
 log = logging.getLogger(__name__)
 
 
@@ -27,6 +43,120 @@ def _safe_zscore(x: np.ndarray, axis=None):
     return (x - mu) / sd
 
 
+class _CleanRun:
+    """State of one clean_mark call: shared statistics and the collected marks.
+
+    Statistics `add`ed before the first `result` call are computed by a
+    single block stream over all EEG channels; a step that finds its
+    statistics in the memo never triggers (or joins) a stream. Bad channels
+    and annotations are only collected here and applied once by `finish`.
+    """
+
+    def __init__(self, raw, memo=None):
+        self.raw = raw
+        self.memo_fn = memo
+        self.eeg = mne.pick_types(raw.info, eeg=True, exclude=[])
+        self.bads = list(raw.info['bads'])
+        self.annotations = []
+        self.exclude = []  # (start, stop) samples of the new bad annotations
+        self.cleaned = None  # copy of raw holding the ASR-reconstructed data
+        self.timings = {"stream": 0.0}
+        self._pending = {}
+        self._results = {}
+
+    def picks(self) -> np.ndarray:
+        """EEG picks excluding the bad channels marked so far."""
+        return mne.pick_types(self.raw.info, eeg=True, exclude=self.bads)
+
+    def rows(self, picks) -> np.ndarray:
+        """Positions of picks among all EEG channels (rows of shared statistics)."""
+        return np.searchsorted(self.eeg, picks)
+
+    def add(self, name: str, acc, picks=None):
+        """Register acc for the shared stream, fed only picks (default: all EEG)."""
+        if picks is not None:
+            acc = Rows(acc, self.rows(picks))
+        self._pending[name] = (acc, None if picks is None else np.asarray(picks).tolist())
+
+    def shared(self, name: str, picks=None) -> bool:
+        """Whether name is registered for exactly these picks (default: all EEG)."""
+        entry = self._pending.get(name) or self._results.get(name)
+        return entry is not None and entry[1] == (None if picks is None else np.asarray(picks).tolist())
+
+    def result(self, name: str):
+        """Return name's statistic, streaming every pending accumulator on first use."""
+        if name in self._pending:
+            t0 = time.perf_counter()
+            pending, self._pending = self._pending, {}
+            try:
+                stream_stats(self.raw, self.eeg, [acc for acc, _ in pending.values()])
+                for key, (acc, picks) in pending.items():
+                    try:
+                        self._results[key] = (acc.result(), picks)
+                    except Exception as e:
+                        self._results[key] = (e, picks)
+            except Exception as e:
+                self._results.update({key: (e, picks) for key, (_, picks) in pending.items()})
+            self.timings["stream"] += time.perf_counter() - t0
+        value = self._results.pop(name)[0]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def memo(self, name: str, key: dict, compute):
+        """EEGCleaner._memo, then drop name from the shared stream (a hit needs no data)."""
+        try:
+            return EEGCleaner._memo(self.memo_fn, name, key, compute)
+        finally:
+            self._pending.pop(name, None)
+            self._results.pop(name, None)
+
+    def timed(self, name: str, step, *args):
+        """Run step(self, *args), recording its time apart from shared streaming."""
+        t0, streamed = time.perf_counter(), self.timings["stream"]
+        step(self, *args)
+        self.timings[name] = time.perf_counter() - t0 - (self.timings["stream"] - streamed)
+
+    def mark_bads(self, names: list[str]):
+        self.bads = sorted(set(self.bads + names))
+
+    def annotate(self, starts: np.ndarray, win: int, description: str):
+        """Collect bad windows [start, start + win) given in samples."""
+        sfreq = float(self.raw.info['sfreq'])
+        onsets = starts.astype(float) / sfreq
+        durations = np.full_like(onsets, fill_value=win / sfreq, dtype=float)
+        self.annotations.append(mne.Annotations(
+            onset=onsets.tolist(), duration=durations.tolist(), description=[description] * len(onsets)
+        ))
+        self.exclude += [(int(b), int(b) + win) for b in starts]
+
+    def finish(self) -> mne.io.BaseRaw:
+        """Return raw with the collected marks.
+
+        Without ASR output the result is the input itself (nothing marked) or
+        a _copy_metadata copy sharing its data array; only ASR copies data.
+        """
+        if self.cleaned is None and not self.annotations and self.bads == list(self.raw.info['bads']):
+            return self.raw
+        out = self.cleaned if self.cleaned is not None else _copy_metadata(self.raw)
+        out.info['bads'] = self.bads
+        for ann in self.annotations:
+            out.set_annotations(out.annotations + ann)
+        return out
+
+
+def _copy_metadata(raw):
+    """Copy of raw that shares its loaded data array (only metadata is duplicated).
+
+    In-place changes to the data of either Raw show in both; info,
+    annotations and other metadata are independent.
+    """
+    data = getattr(raw, "_data", None) if raw.preload else None
+    if isinstance(data, np.ndarray):
+        return deepcopy(raw, {id(data): data})
+    return raw.copy()
+
+
 class EEGCleaner:
     """Stateless cleaning utilities as static methods.
 
@@ -36,53 +166,52 @@ class EEGCleaner:
     """
 
     @staticmethod
-    def _mark_bad_flatline_channels(raw, params):
-        t0 = time.perf_counter()
+    def _memo(memo, name: str, key: dict, compute):
+        """Return compute()'s arrays through the optional sub-stage cache."""
+        if memo is None:
+            return compute()
+        return memo(name, key, compute)
+
+    @staticmethod
+    def _flatline_samples(raw, params) -> int | None:
+        """Flatline length in samples, or None if the step is disabled."""
         flat_sec = getattr(params, 'clean_flatline_sec', None)
         if flat_sec is None or flat_sec <= 0:
             log.info("[flatline] disabled (clean_flatline_sec=%s)", flat_sec)
-            return raw
+            return None
         sfreq = float(raw.info.get('sfreq', 0.0)) or 0.0
         n_samples = int(round(flat_sec * sfreq))
         if n_samples <= 1:
             log.info("[flatline] window too small (n=%d) -> skip", n_samples)
-            return raw
-        picks = mne.pick_types(raw.info, eeg=True)
+            return None
+        return n_samples
+
+    @staticmethod
+    def _mark_bad_flatline_channels(run, params, n_samples: int):
+        raw = run.raw
+        picks = run.picks()
         if picks.size == 0:
             log.info("[flatline] no EEG picks -> skip")
-            return raw
-        data = raw.get_data(picks=picks, reject_by_annotation='omit')
-        bad_names = []
-        for idx, ch_idx in enumerate(picks):
-            x = data[idx]
-            if x.shape[-1] < n_samples:
-                continue
-            try:
-                v = swv(x, n_samples)
-                is_flat = np.any(np.nanmax(v, axis=-1) - np.nanmin(v, axis=-1) == 0)
-            except Exception:
-                is_flat = np.nanmax(x) - np.nanmin(x) == 0
-            if is_flat:
-                bad_names.append(raw.ch_names[ch_idx])
+            return
+        # Run lengths are per channel, so they are computed once for every EEG
+        # channel and any flat_sec is a pure threshold on them.
+        stats = run.memo("flatline", {}, lambda: {"runs": run.result("flatline")})
+        runs = dict(zip(run.eeg.tolist(), stats["runs"].tolist()))
+        bad_names = [raw.ch_names[ch_idx] for ch_idx in picks if runs[int(ch_idx)] >= n_samples]
         if bad_names:
-            log.info("[flatline] Marking %d channels as bad (>%ss): %s", len(bad_names), flat_sec, bad_names)
-            raw = raw.copy()
-            raw.info['bads'] = sorted(set((raw.info.get('bads') or []) + bad_names))
+            log.info("[flatline] Marking %d channels as bad (>%ss): %s",
+                     len(bad_names), params.clean_flatline_sec, bad_names)
+            run.mark_bads(bad_names)
         else:
-            log.info("[flatline] no channels flagged (%.3fs)", time.perf_counter() - t0)
-        return raw
+            log.info("[flatline] no channels flagged")
 
     @staticmethod
-    def _mark_bad_highfreq_noise_channels(raw, params):
-        t0 = time.perf_counter()
+    def _hf_band(raw, params) -> tuple[float, float] | None:
+        """High-frequency band (fmin, fmax) for the noise check, or None if disabled."""
         hf_sd_max = getattr(params, 'clean_hf_noise_sd_max', None)
         if hf_sd_max is None or hf_sd_max <= 0:
             log.info("[hf-noise] disabled (clean_hf_noise_sd_max=%s)", hf_sd_max)
-            return raw
-        picks = mne.pick_types(raw.info, eeg=True)
-        if picks.size == 0:
-            log.info("[hf-noise] no EEG picks -> skip")
-            return raw
+            return None
         f_low_default, f_high_default = 30.0, 100.0
         hp = float(raw.info.get('highpass') or 0.0)
         lp = raw.info.get('lowpass')
@@ -91,172 +220,234 @@ class EEGCleaner:
         fmax = min(f_high_default, lp)
         if not np.isfinite(fmax) or fmax <= fmin + 1.0:
             log.info("[hf-noise] insufficient passband (%.2f-%.2f Hz) -> skip", fmin, fmax)
-            return raw
+            return None
+        return fmin, fmax
+
+    @staticmethod
+    def _hf_bandpower(run) -> np.ndarray:
+        """Per-channel high-frequency band power (Welch) of all EEG channels, RMS fallback."""
         try:
-            spec = raw.compute_psd(method='welch', fmin=fmin, fmax=fmax, picks=picks,
-                                   n_overlap=0, reject_by_annotation=True, verbose='ERROR')
-            psd = spec.get_data()  # (n_ch, n_freqs)
-            freqs = spec.freqs
-            bandpower = np.trapz(psd, freqs, axis=-1)  # (n_ch,)
+            return run.result("hf_noise")  # (n_ch,)
         except Exception as e:
             log.info("[hf-noise] PSD failed (%s) -> fallback to RMS of current band", e)
-            data = raw.get_data(picks=picks, reject_by_annotation='omit')
-            bandpower = np.sqrt(np.nanmean(data ** 2, axis=-1))
+            data = run.raw.get_data(picks=run.eeg, reject_by_annotation='omit')
+            return np.sqrt(np.nanmean(data ** 2, axis=-1))
+
+    @staticmethod
+    def _mark_bad_highfreq_noise_channels(run, params):
+        hf_sd_max = params.clean_hf_noise_sd_max
+        picks = run.picks()
+        if picks.size == 0:
+            log.info("[hf-noise] no EEG picks -> skip")
+            return
+        # Band power is per channel: cache it for all EEG channels, z-score the current picks
+        stats = run.memo("hf_noise", {}, lambda: {"bandpower": EEGCleaner._hf_bandpower(run)})
+        bandpower = stats["bandpower"][run.rows(picks)]
         z = _safe_zscore(bandpower)
         bad_local_idx = np.where(z.flatten() > hf_sd_max)[0].tolist()
-        bad_names = [raw.ch_names[picks[i]] for i in bad_local_idx]
+        bad_names = [run.raw.ch_names[picks[i]] for i in bad_local_idx]
         if bad_names:
             log.info("[hf-noise] Marking %d channels bad (z>%.2f): %s", len(bad_names), hf_sd_max, bad_names)
-            raw = raw.copy()
-            raw.info['bads'] = sorted(set((raw.info.get('bads') or []) + bad_names))
+            run.mark_bads(bad_names)
         else:
-            log.info("[hf-noise] no channels flagged (%.3fs)", time.perf_counter() - t0)
-        return raw
+            log.info("[hf-noise] no channels flagged")
 
     @staticmethod
-    def _mark_bad_lowcorr_channels(raw, params):
-        t0 = time.perf_counter()
+    def _corr_window(raw, params) -> tuple[float, int | None] | None:
+        """(corr_min, window in samples or None) for the low-correlation check, or None if disabled."""
         corr_min = getattr(params, 'clean_corr_min', None)
         if corr_min is None or not (0 < float(corr_min) <= 1):
             log.info("[lowcorr] disabled (clean_corr_min=%s)", corr_min)
-            return raw
-        picks = mne.pick_types(raw.info, eeg=True)
+            return None
+        window_sec = getattr(params, 'clean_corr_window_sec', None)
+        win = int(round(window_sec * float(raw.info['sfreq']))) if window_sec and window_sec > 0 else None
+        return float(corr_min), win
+
+    @staticmethod
+    def _mark_bad_lowcorr_channels(run, params, corr_min: float, win: int | None):
+        picks = run.picks()
         if picks.size < 3:
             log.info("[lowcorr] <3 EEG channels -> skip")
-            return raw
-        data = raw.get_data(picks=picks, reject_by_annotation='omit')
-        ref = np.nanmedian(data, axis=0)
-        corrs = []
-        for i in range(data.shape[0]):
-            x = data[i]
-            mask = np.isfinite(x) & np.isfinite(ref)
-            if mask.sum() < 10:
-                corrs.append(1.0)
-                continue
-            cx = np.corrcoef(x[mask], ref[mask])[0, 1]
-            corrs.append(abs(float(cx)))
-        corrs = np.array(corrs)
+            return
+
+        def _compute():
+            # The shared stream correlated the picks known before flatline/hf-noise ran
+            if run.shared("lowcorr", picks):
+                return {"corrs": run.result("lowcorr")}
+            return {"corrs": stream_stats(run.raw, picks, [MedianRefCorr(len(picks), win)])[0].result()}
+
+        # The median reference depends on which channels are already bad
+        key = {"bads": sorted(run.bads)}
+        if win:
+            key["win"] = win
+        stats = run.memo("lowcorr", key, _compute)
+        corrs = stats["corrs"]
         bad_local_idx = np.where(corrs < corr_min)[0].tolist()
-        bad_names = [raw.ch_names[picks[i]] for i in bad_local_idx]
+        bad_names = [run.raw.ch_names[picks[i]] for i in bad_local_idx]
         if bad_names:
             log.info("[lowcorr] Marking %d channels bad (corr<%.2f): %s", len(bad_names), corr_min, bad_names)
-            raw = raw.copy()
-            raw.info['bads'] = sorted(set((raw.info.get('bads') or []) + bad_names))
+            run.mark_bads(bad_names)
         else:
-            log.info("[lowcorr] no channels flagged (%.3fs)", time.perf_counter() - t0)
-        return raw
+            log.info("[lowcorr] no channels flagged")
 
     @staticmethod
-    def _mark_bad_windows_by_power(raw, params):
-        t0 = time.perf_counter()
-        min_sd = getattr(params, 'clean_power_min_sd', float('-inf'))
-        max_sd = getattr(params, 'clean_power_max_sd', None)
-        max_out_pct = getattr(params, 'clean_max_outbound_pct', None)
+    def _power_window(raw, params) -> tuple[int, int] | None:
+        """(win, step) in samples for the bad-window check, or None if disabled."""
         window_sec = getattr(params, 'clean_window_sec', None)
         if window_sec is None or window_sec <= 0:
             log.info("[power-win] disabled (window_sec=%s)", window_sec)
-            return raw
-        sfreq = float(raw.info.get('sfreq', 0.0))
-        win = max(1, int(round(window_sec * sfreq)))
-        picks = mne.pick_types(raw.info, eeg=True)
+            return None
+        win = max(1, int(round(window_sec * float(raw.info.get('sfreq', 0.0)))))
+        # Windows start at every sample by default, or every win samples (no overlap)
+        step = win if getattr(params, 'clean_window_hop', False) else 1
+        return win, step
+
+    @staticmethod
+    def _mark_bad_windows_by_power(run, params, win: int, step: int, upstream: dict):
+        min_sd = getattr(params, 'clean_power_min_sd', float('-inf'))
+        max_sd = getattr(params, 'clean_power_max_sd', None)
+        max_out_pct = getattr(params, 'clean_max_outbound_pct', None)
+        sfreq = float(run.raw.info['sfreq'])
+        picks = run.picks()
         if picks.size == 0:
             log.info("[power-win] no EEG picks -> skip")
-            return raw
-        data = raw.get_data(picks=picks, reject_by_annotation='omit')
-        n_ch, n_t = data.shape
-        if n_t < win:
-            return raw
-        v = swv(data, win, axis=1)
-        power = np.nanmean(v ** 2, axis=-1)
-        z = _safe_zscore(power, axis=1)
+            return
+        # After ASR: stream its output, or skip the windows it annotated
+        source = run.cleaned if run.cleaned is not None else run.raw
+        n_samples = n_good_samples(source, run.exclude)
+
+        def _compute():
+            if run.shared("power_win"):
+                return run.result("power_win")
+            if n_samples < win:
+                return {}
+            return stream_stats(source, run.eeg, [WindowPower(len(run.eeg), win, step, n_samples)],
+                                exclude=run.exclude)[0].result()
+
+        # The window-power mean/sd are per channel and kept for all EEG
+        # channels. Without ASR they depend on the window only; ASR output
+        # also depends on the bads.
+        key = {**upstream, "bads": sorted(run.bads)} if upstream else {}
+        key["win"] = win
+        if step != 1:
+            key["step"] = step
+        stats = run.memo("power_win", key, _compute)
+        if "mean" not in stats:
+            return
         # Handle None -> infinite bounds
         lower_bound = -np.inf if min_sd is None else float(min_sd)
         upper_bound = np.inf if max_sd is None else float(max_sd)
-        lower_ok = z >= lower_bound
-        upper_ok = z <= upper_bound
-        ok = lower_ok & upper_ok
-        frac_bad = 100.0 * (1.0 - np.nanmean(ok, axis=0))
         thr_pct = 25.0 if max_out_pct is None else float(max_out_pct)
-        bad_windows = np.where(frac_bad > thr_pct)[0]
+
+        def _flag():
+            # Second pass: z-score the picked channels' windows block by block,
+            # keeping only the flagged window indices
+            rows = run.rows(picks)
+            acc = WindowOutliers(win, step, n_samples, {k: v[rows] for k, v in stats.items()},
+                                 lower_bound, upper_bound, thr_pct)
+            return {"bad": stream_stats(source, picks, [acc], exclude=run.exclude)[0].result()}
+
+        flag_key = {**key, "bads": sorted(run.bads), "min_sd": min_sd, "max_sd": max_sd, "max_out_pct": max_out_pct}
+        bad_windows = run.memo("power_bad", flag_key, _flag)["bad"]
         if bad_windows.size == 0:
-            log.info("[power-win] no windows flagged (%.3fs)", time.perf_counter() - t0)
-            return raw
-        onsets = bad_windows.astype(float) / sfreq
-        durations = np.full_like(onsets, fill_value=win / sfreq, dtype=float)
-        desc = ['bad_power'] * len(onsets)
-        ann = mne.Annotations(onset=onsets.tolist(), duration=durations.tolist(), description=desc)
-        raw = raw.copy()
-        raw.set_annotations(raw.annotations + ann)
-        log.info("[power-win] Annotated %d windows (min_sd=%s, max_sd=%s, max_out_pct=%s, win=%.3fs) in %.3fs",
-                 len(onsets), min_sd, max_sd, max_out_pct, win / sfreq, time.perf_counter() - t0)
-        return raw
+            log.info("[power-win] no windows flagged")
+            return
+        run.annotate(bad_windows * step, win, 'bad_power')
+        log.info("[power-win] Annotated %d windows (min_sd=%s, max_sd=%s, max_out_pct=%s, win=%.3fs, step=%d)",
+                 len(bad_windows), min_sd, max_sd, max_out_pct, win / sfreq, step)
 
     @staticmethod
-    def _apply_asr(raw, params):
-        t0 = time.perf_counter()
+    def _asr_key(params) -> dict:
+        """Parameters the ASR output depends on (empty when ASR is disabled)."""
+        max_std = getattr(params, 'clean_asr_max_std', None)
+        if max_std is None or max_std <= 0:
+            return {}
+        return {
+            "asr_max_std": max_std,
+            "asr_window_sec": getattr(params, 'clean_window_sec', None),
+            "asr_remove_only": bool(getattr(params, 'clean_asr_remove_only', False)),
+        }
+
+    @staticmethod
+    def _fit_asr(data_uv: np.ndarray, sfreq: float, max_std: float, window_sec) -> np.ndarray:
+        """Fit ASR on data (µV) and return the reconstructed data (µV)."""
+        # Initialize ASR model; forward window length when supported by API.
+        try:
+            model = asrpy.ASR(sfreq=sfreq, cutoff=max_std, window_length=window_sec)
+        except TypeError:
+            model = asrpy.ASR(sfreq=sfreq, cutoff=max_std)
+            # Best-effort: some versions expose attribute to set window length
+            if window_sec and hasattr(model, 'window_length'):
+                setattr(model, 'window_length', window_sec)
+        return model.fit_transform(data_uv)
+
+    @staticmethod
+    def _asr_residual_rms(data_uv: np.ndarray, cleaned_uv: np.ndarray, win: int) -> np.ndarray:
+        """Median-over-channels RMS of the ASR residual per sliding window."""
+        resid = data_uv - cleaned_uv  # microvolts
+        v = swv(resid, win, axis=1)  # (n_ch, n_win, win)
+        rms_ch_win = np.sqrt(np.nanmean(v ** 2, axis=-1))  # (n_ch, n_win)
+        return np.nanmedian(rms_ch_win, axis=0)  # (n_win,)
+
+    @staticmethod
+    def _apply_asr(run, params):
         window_sec = getattr(params, 'clean_window_sec', None)
         max_std = getattr(params, 'clean_asr_max_std', None)
         remove_only = getattr(params, 'clean_asr_remove_only', False)
         if max_std is None or max_std <= 0:
             log.info("[ASR] disabled (clean_asr_max_std=%s)", max_std)
-            return raw
+            return
         try:
+            raw = run.raw
             sfreq = float(raw.info.get('sfreq', 0.0))
-            picks = mne.pick_types(raw.info, eeg=True)
+            picks = run.picks()
             if picks.size == 0:
                 log.info("[ASR] no EEG picks -> skip")
-                return raw
-            data_uv = raw.get_data(picks=picks) * 1e6
+                return
+            win = max(1, int(round(float(window_sec or 0.5) * sfreq)))
+            key = {**EEGCleaner._asr_key(params), "bads": sorted(run.bads)}
 
-            # Initialize ASR model; forward window length when supported by API.
-            try:
-                model = asrpy.ASR(sfreq=sfreq, cutoff=max_std, window_length=window_sec)
-            except TypeError:
-                model = asrpy.ASR(sfreq=sfreq, cutoff=max_std)
-                # Best-effort: some versions expose attribute to set window length
-                if window_sec and hasattr(model, 'window_length'):
-                    setattr(model, 'window_length', window_sec)
+            def _compute():
+                # ASR fits on the whole recording, so this is the one full read
+                data_uv = raw.get_data(picks=picks) * 1e6
+                cleaned_uv = EEGCleaner._fit_asr(data_uv, sfreq, max_std, window_sec)
+                if not remove_only:
+                    # Kept in float64 so a memo hit reconstructs exactly what a fresh fit
+                    # does; this is a full copy of the picked channels per ASR parameter set
+                    return {"cleaned_uv": cleaned_uv}
+                if cleaned_uv.shape[1] < win:
+                    return {}
+                try:
+                    return {"rms_win": EEGCleaner._asr_residual_rms(data_uv, cleaned_uv, win)}
+                except Exception:
+                    return {}
 
-            cleaned_uv = model.fit_transform(data_uv)
+            # The fit is the expensive part: cache its output so that changing
+            # any later threshold never refits ASR.
+            stats = run.memo("asr", key, _compute)
 
             # If remove_only, annotate windows with large residuals instead of reconstructing
             if remove_only:
-                win = max(1, int(round(float(window_sec or 0.5) * sfreq)))
-                if cleaned_uv.shape[1] >= win:
-                    resid = data_uv - cleaned_uv  # microvolts
-                    try:
-                        v = swv(resid, win, axis=1)  # (n_ch, n_win, win)
-                        rms_ch_win = np.sqrt(np.nanmean(v ** 2, axis=-1))  # (n_ch, n_win)
-                        rms_win = np.nanmedian(rms_ch_win, axis=0)  # (n_win,)
-                        z = _safe_zscore(rms_win, axis=None).flatten()
-                        bad_windows = np.where(z > float(max_std))[0]
-                    except Exception:
-                        bad_windows = np.array([], dtype=int)
+                if "rms_win" in stats:
+                    z = _safe_zscore(stats["rms_win"], axis=None).flatten()
+                    bad_windows = np.where(z > float(max_std))[0]
                     if bad_windows.size > 0:
-                        onsets = bad_windows.astype(float) / sfreq
-                        durations = np.full_like(onsets, fill_value=win / sfreq, dtype=float)
-                        ann = mne.Annotations(
-                            onset=onsets.tolist(), duration=durations.tolist(),
-                            description=['bad_asr'] * len(onsets)
-                        )
-                        out = raw.copy()
-                        out.set_annotations(out.annotations + ann)
-                        log.info("[ASR] remove_only: annotated %d windows (win=%.3fs, cutoff=%.2f) in %.3fs",
-                                 len(onsets), win / sfreq, float(max_std), time.perf_counter() - t0)
-                        return out
-                # If we get here, we couldn't compute a mask; fall back to original raw
-                log.info("[ASR] remove_only: no windows flagged (%.3fs)", time.perf_counter() - t0)
-                return raw
-
-            # Default: replace data with ASR-cleaned output
-            out = raw.copy()
-            out._data[picks, :] = cleaned_uv / 1e6
-            log.info("[ASR] reconstructed data for %d channels (win=%.3fs, cutoff=%.2f) in %.3fs",
-                     len(picks), float(window_sec or 0.5), float(max_std), time.perf_counter() - t0)
-            return out
+                        run.annotate(bad_windows, win, 'bad_asr')
+                        log.info("[ASR] remove_only: annotated %d windows (win=%.3fs, cutoff=%.2f)",
+                                 len(bad_windows), win / sfreq, float(max_std))
+                        return
+                # If we get here, we couldn't compute a mask; keep the data as is
+                log.info("[ASR] remove_only: no windows flagged")
+                return
+
+            # Default: replace data with ASR-cleaned output on a full copy of the input
+            out = raw.copy().load_data()
+            out._data[picks, :] = stats["cleaned_uv"] / 1e6
+            run.cleaned = out
+            log.info("[ASR] reconstructed data for %d channels (win=%.3fs, cutoff=%.2f)",
+                     len(picks), float(window_sec or 0.5), float(max_std))
         except Exception as e:
             log.warning("[ASR] failed (%s); skipping.", e)
-            return raw
 
     # ---------- public API ----------
     @staticmethod
@@ -289,15 +480,57 @@ class EEGCleaner:
         return raw
 
     @staticmethod
-    def clean_mark(raw, params) -> mne.io.BaseRaw:
-        """Only apply marking steps (bad channels and bad windows) to self.raw, without prefilter."""
+    def clean_mark(raw, params, memo=None) -> mne.io.BaseRaw:
+        """Only apply marking steps (bad channels and bad windows) to self.raw, without prefilter.
+
+        `memo(name, key, compute)` optionally caches each step's intermediate
+        statistics: it must return compute()'s dict of arrays, or a cached copy
+        for the same step name and key. Keys hold only what the statistics
+        depend on beyond the prefiltered Raw (never the thresholds), so a
+        threshold change re-thresholds cached statistics instead of
+        recomputing them. The one exception are the flagged power windows,
+        which a threshold change recomputes in one stream from the cached
+        per-channel window-power mean/sd.
+
+        The statistics of all steps come from one shared block stream, plus
+        ASR's full read, a stream for the window powers after ASR, and a
+        second window-power stream that flags the bad windows. The input is
+        never modified: the marks go on a copy of its metadata. Without ASR
+        reconstruction, the returned Raw shares the input's loaded data array
+        (if any), so modifying one's data in place modifies the other's; call
+        .copy() first. ASR reads the picked channels once more (in µV), keeps
+        its float64 output, and returns a full copy of the input holding it.
+        """
         t0 = time.perf_counter()
         log.info("[clean_mark] start")
+        run = _CleanRun(raw, memo)
+        upstream = EEGCleaner._asr_key(params)
+
+        # Register every statistic that only needs the input data up front
+        n_flat = EEGCleaner._flatline_samples(raw, params)
+        if n_flat:
+            run.add("flatline", FlatRuns(len(run.eeg)))
+        band = EEGCleaner._hf_band(raw, params)
+        if band:
+            run.add("hf_noise", WelchBandPower(float(raw.info['sfreq']), *band))
+        corr = EEGCleaner._corr_window(raw, params)
+        if corr and run.picks().size >= 3:
+            # Speculative: valid as long as flatline/hf-noise mark no channel
+            run.add("lowcorr", MedianRefCorr(run.picks().size, corr[1]), picks=run.picks())
+        power = EEGCleaner._power_window(raw, params)
+        if power and not upstream and n_good_samples(raw) >= power[0]:
+            run.add("power_win", WindowPower(len(run.eeg), *power, n_good_samples(raw)))
 
-        raw = EEGCleaner._mark_bad_flatline_channels(raw, params)
-        raw = EEGCleaner._mark_bad_highfreq_noise_channels(raw, params)
-        raw = EEGCleaner._mark_bad_lowcorr_channels(raw, params)
-        raw = EEGCleaner._apply_asr(raw, params)
-        raw = EEGCleaner._mark_bad_windows_by_power(raw, params)
-        log.info("[clean_mark] done (t=%.3fs)", time.perf_counter() - t0)
-        return raw
\ No newline at end of file
+        if n_flat:
+            run.timed("flatline", EEGCleaner._mark_bad_flatline_channels, params, n_flat)
+        if band:
+            run.timed("hf_noise", EEGCleaner._mark_bad_highfreq_noise_channels, params)
+        if corr:
+            run.timed("lowcorr", EEGCleaner._mark_bad_lowcorr_channels, params, *corr)
+        run.timed("asr", EEGCleaner._apply_asr, params)
+        if power:
+            run.timed("power_win", EEGCleaner._mark_bad_windows_by_power, params, *power, upstream)
+        out = run.finish()
+        log.info("[clean_mark] done (t=%.3fs; %s)", time.perf_counter() - t0,
+                 ", ".join(f"{name}={sec:.3f}s" for name, sec in run.timings.items()))
+        return out
@@ -0,0 +1,366 @@
+"""Block-streaming statistics for EEGCleaner.
+
+`stream_stats` reads the EEG picks of a Raw in fixed-size time blocks and
+feeds every block to a set of accumulators, which keep running sums and the
+few edge samples a statistic needs across block boundaries. Spans covered by
+'bad*' annotations are skipped, so the blocks concatenate to
+`raw.get_data(picks, reject_by_annotation='omit')`. Peak memory is one block
+plus each accumulator's result instead of the whole recording, several times
+over.
+
+The block length comes from EEG_CLEAN_BLOCK_SEC (default 60 s; 0 reads each
+good span as a single block).
+"""
+import math
+import os
+
+import numpy as np
+from mne.annotations import _annotations_starts_stops
+from scipy.integrate import trapezoid
+from scipy.signal import welch
+
+DEFAULT_BLOCK_SEC = 60.0
+
+
+def default_block_sec() -> float:
+    """Return the streaming block length in seconds from EEG_CLEAN_BLOCK_SEC (0 = whole spans)."""
+    return max(0.0, float(os.getenv("EEG_CLEAN_BLOCK_SEC", DEFAULT_BLOCK_SEC) or 0))
+
+
+def good_spans(raw, exclude=()) -> list[tuple[int, int]]:
+    """Return the [start, stop) sample spans kept by get_data(reject_by_annotation='omit').
+
+    `exclude` holds further (start, stop) sample spans to treat as bad, e.g.
+    windows about to be annotated.
+    """
+    used = np.ones(raw.n_times, dtype=bool)
+    for onset, end in [*zip(*_annotations_starts_stops(raw, ["BAD"])), *exclude]:
+        used[onset:end] = False
+    edges = np.diff(np.concatenate([[False], used, [False]]).astype(np.int8))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def n_good_samples(raw, exclude=()) -> int:
+    """Return the number of samples kept by get_data(reject_by_annotation='omit')."""
+    return sum(stop - start for start, stop in good_spans(raw, exclude))
+
+
+def stream_stats(raw, picks, accumulators: list, block_sec: float | None = None, exclude=()) -> list:
+    """Feed every good-span block of raw[picks] to each accumulator; return the accumulators.
+
+    Blocks are a multiple of every accumulator's `align` samples, counted
+    from the start of each span. `exclude` is passed on to good_spans.
+    """
+    block_sec = default_block_sec() if block_sec is None else block_sec
+    align = math.lcm(*(acc.align for acc in accumulators)) if accumulators else 1
+    block = int(round(block_sec * float(raw.info['sfreq'])))
+    for start, stop in good_spans(raw, exclude):
+        step = stop - start if block <= 0 else max(align, block // align * align)
+        for b in range(start, stop, step):
+            data = raw.get_data(picks=picks, start=b, stop=min(b + step, stop))
+            for acc in accumulators:
+                acc.update(data, new_span=b == start)
+    return accumulators
+
+
+# ---------- kernels ----------
+
+def median_ref(data: np.ndarray) -> np.ndarray:
+    """Per-sample median across channels (NaNs ignored)."""
+    # nanmedian is several times slower than median, so use it only when needed
+    return np.nanmedian(data, axis=0) if np.isnan(data).any() else np.median(data, axis=0)
+
+
+def corr_moments(x: np.ndarray, ref: np.ndarray, shift_x=0.0, shift_r=0.0) -> np.ndarray:
+    """Return stacked (n, Σx, Σr, Σx², Σr², Σxr) along the last axis, over samples finite in both.
+
+    ref broadcasts against x (e.g. one reference for all channels). Shifting
+    by values close to the means keeps the one-pass formulas well conditioned
+    and does not change the correlation.
+    """
+    x = x - shift_x
+    ref = ref - shift_r
+    mask = np.isfinite(x) & np.isfinite(ref)
+    if not mask.all():
+        x = np.where(mask, x, 0.0)
+        ref = np.where(mask, ref, 0.0)
+    sums = (
+        mask.sum(axis=-1),
+        x.sum(axis=-1),
+        ref.sum(axis=-1),
+        np.einsum('...t,...t->...', x, x),
+        np.einsum('...t,...t->...', ref, ref),
+        np.einsum('...t,...t->...', x, ref),
+    )
+    return np.stack(np.broadcast_arrays(*sums)).astype(np.float64)
+
+
+def abs_corr_from_moments(m: np.ndarray, min_samples: int = 10) -> np.ndarray:
+    """|Pearson r| from corr_moments sums; fewer than min_samples shared samples give 1.0."""
+    n, sx, sr, sxx, srr, sxr = m
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxr - sx * sr / n
+        var = (sxx - sx ** 2 / n) * (srr - sr ** 2 / n)
+        corr = np.abs(cov) / np.sqrt(var)
+    return np.where(n < min_samples, 1.0, corr)
+
+
+def abs_corr(x: np.ndarray, ref: np.ndarray, min_samples: int = 10) -> np.ndarray:
+    """|Pearson r| of x with ref along the last axis, over samples finite in both."""
+    shift_x = np.nanmean(x, axis=-1, keepdims=True)
+    shift_r = np.nanmean(ref, axis=-1, keepdims=True)
+    return abs_corr_from_moments(corr_moments(x, ref, shift_x, shift_r), min_samples)
+
+
+def window_power(data: np.ndarray, win: int, step: int = 1, start: int = 0) -> np.ndarray:
+    """Per-channel mean power (NaNs ignored) of windows starting at start, start+step, ...
+
+    Window sums come from one cumulative sum of the squared samples, so the
+    cost is O(n_ch x n_times) for any win and step.
+    """
+    finite = np.isfinite(data)
+    all_finite = bool(finite.all())
+    csum = np.zeros((data.shape[0], data.shape[1] + 1))
+    np.square(data if all_finite else np.where(finite, data, 0.0), out=csum[:, 1:])
+    np.cumsum(csum[:, 1:], axis=1, out=csum[:, 1:])
+    starts = np.arange(start, data.shape[1] - win + 1, step)
+    power = csum[:, starts + win]
+    power -= csum[:, starts]
+    if all_finite:
+        power /= win
+        return power
+    ccount = np.zeros(csum.shape, dtype=np.int32)
+    np.cumsum(finite, axis=1, out=ccount[:, 1:])
+    count = ccount[:, starts + win] - ccount[:, starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return power / np.where(count > 0, count, np.nan)
+
+
+# ---------- accumulators ----------
+
+class Rows:
+    """Feed an accumulator only the given rows (channels) of each block."""
+
+    def __init__(self, acc, rows):
+        self.acc = acc
+        self.rows = np.asarray(rows, dtype=int)
+        self.align = acc.align
+
+    def update(self, data: np.ndarray, new_span: bool = False):
+        self.acc.update(data[self.rows], new_span)
+
+    def result(self):
+        return self.acc.result()
+
+
+class FlatRuns:
+    """Longest run of identical consecutive samples per channel.
+
+    Runs continue across blocks and spans, matching the concatenated 'omit'
+    data. Only equal neighbour pairs (rare in real EEG) are materialized.
+    """
+
+    align = 1
+
+    def __init__(self, n_ch: int):
+        self.best = np.zeros(n_ch, dtype=np.int64)
+        self.cur = np.zeros(n_ch, dtype=np.int64)  # equal pairs ending at the last sample
+        self.last = None
+
+    def update(self, data: np.ndarray, new_span: bool = False):
+        if data.shape[1] == 0:
+            return
+        eq = data[:, 1:] == data[:, :-1]
+        if self.last is not None:
+            eq = np.concatenate([(data[:, 0] == self.last)[:, None], eq], axis=1)
+        self.last = data[:, -1].copy()
+        np.maximum(self.best, 1, out=self.best)
+        rows, cols = np.nonzero(eq)
+        cur = np.zeros_like(self.cur)
+        if rows.size:
+            # A stretch of equal neighbours ends at a new channel or a column gap
+            starts = np.flatnonzero(np.r_[True, (np.diff(rows) != 0) | (np.diff(cols) != 1)])
+            lengths = np.diff(np.r_[starts, rows.size])
+            at_end = cols[starts] + lengths == eq.shape[1]
+            # Stretches at the block start continue the carried one
+            lengths = lengths + np.where(cols[starts] == 0, self.cur[rows[starts]], 0)
+            np.maximum.at(self.best, rows[starts], lengths + 1)
+            cur[rows[starts][at_end]] = lengths[at_end]
+        self.cur = cur
+
+    def result(self) -> np.ndarray:
+        return self.best
+
+
+class MedianRefCorr:
+    """|corr| of each channel with the per-sample channel median.
+
+    Over the whole recording by default; with `win`, per non-overlapping
+    window of win samples (as Clean Rawdata does), summarized by the median
+    over windows. Falls back to the whole recording if no window fits.
+    """
+
+    align = 1
+
+    def __init__(self, n_ch: int, win: int | None = None):
+        self.n_ch = n_ch
+        self.win = win
+        self.moments = None
+        self.shift = None
+        self.windows = []
+        self.pending = None
+
+    def update(self, data: np.ndarray, new_span: bool = False):
+        ref = median_ref(data)
+        if self.shift is None:
+            with np.errstate(invalid='ignore'):
+                self.shift = (
+                    np.nan_to_num(np.nanmean(data, axis=-1, keepdims=True)),
+                    float(np.nan_to_num(np.nanmean(ref))),
+                )
+        m = corr_moments(data, ref, *self.shift)
+        self.moments = m if self.moments is None else self.moments + m
+        if not self.win:
+            return
+        if self.pending is not None:
+            data = np.concatenate([self.pending[0], data], axis=1)
+            ref = np.concatenate([self.pending[1], ref])
+        n_win = data.shape[1] // self.win
+        n = n_win * self.win
+        if n_win:
+            self.windows.append(abs_corr(
+                data[:, :n].reshape(self.n_ch, n_win, self.win), ref[:n].reshape(n_win, self.win)
+            ))
+        self.pending = (data[:, n:].copy(), ref[n:].copy())
+
+    def result(self) -> np.ndarray:
+        if self.windows:
+            return np.nanmedian(np.concatenate(self.windows, axis=1), axis=1)
+        return abs_corr_from_moments(self.moments)
+
+
+class WindowPower:
+    """Per-channel mean and std (NaNs ignored) of the mean power of win-sample windows every `step` samples.
+
+    Windows run over the concatenated spans; the last win-1 samples of a
+    block are carried into the next. Only per-channel moments are kept,
+    merged block by block (Chan et al.), so memory is O(n_ch x block) for
+    any recording length. n_samples, the number of good samples, caps the
+    window count.
+    """
+
+    align = 1
+
+    def __init__(self, n_ch: int, win: int, step: int, n_samples: int):
+        self.win = win
+        self.step = step
+        self.n_windows = max(0, (n_samples - win) // step + 1)
+        self.done = 0
+        self.tail = None
+        self.offset = 0  # position of tail[:, 0] in the concatenated samples
+        self.count = np.zeros(n_ch)
+        self.mean = np.zeros(n_ch)
+        self.m2 = np.zeros(n_ch)
+
+    def _windows(self, data: np.ndarray) -> np.ndarray:
+        """Power of the windows completed by data; they follow the previous block's."""
+        x = data if self.tail is None else np.concatenate([self.tail, data], axis=1)
+        power = window_power(x, self.win, self.step, start=self.done * self.step - self.offset)
+        power = power[:, :self.n_windows - self.done]
+        self.done += power.shape[1]
+        keep_from = min(self.done * self.step - self.offset, x.shape[1])
+        self.tail = x[:, keep_from:].copy()
+        self.offset += keep_from
+        return power
+
+    def update(self, data: np.ndarray, new_span: bool = False):
+        power = self._windows(data)
+        finite = np.isfinite(power)
+        n = finite.sum(axis=1)
+        if not n.any():
+            return
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(finite, power, 0.0).sum(axis=1) / n
+            m2 = np.where(finite, power - mean[:, None], 0.0)
+            m2 = np.einsum('ct,ct->c', m2, m2)
+            total = self.count + n
+            delta = mean - self.mean
+            w = np.where(n > 0, n / total, 0.0)
+        self.mean += np.where(n > 0, delta * w, 0.0)
+        self.m2 += np.where(n > 0, m2 + delta * delta * self.count * w, 0.0)
+        self.count = total
+
+    def result(self) -> dict:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(self.count > 0, self.mean, np.nan)
+            sd = np.sqrt(self.m2 / self.count)
+        return {"mean": mean, "sd": np.where(sd == 0, np.nan, sd)}
+
+
+class WindowOutliers(WindowPower):
+    """Windows where more than max_out_pct % of channels have z-scored power outside [lower, upper].
+
+    Second pass after WindowPower: its per-channel mean/sd z-score each
+    block's windows as they are produced, and only the indices of the
+    flagged windows are kept.
+    """
+
+    def __init__(self, win: int, step: int, n_samples: int, stats: dict,
+                 lower: float, upper: float, max_out_pct: float):
+        super().__init__(len(stats["mean"]), win, step, n_samples)
+        self.mu = stats["mean"][:, None]
+        self.sd = stats["sd"][:, None]
+        self.lower = lower
+        self.upper = upper
+        self.max_out_pct = max_out_pct
+        self.bad = []
+
+    def update(self, data: np.ndarray, new_span: bool = False):
+        first = self.done
+        z = self._windows(data)
+        z -= self.mu
+        z /= self.sd
+        ok = (z >= self.lower) & (z <= self.upper)
+        frac_bad = 100.0 * (1.0 - ok.mean(axis=0))
+        self.bad.append(first + np.flatnonzero(frac_bad > self.max_out_pct))
+
+    def result(self) -> np.ndarray:
+        return np.concatenate(self.bad) if self.bad else np.empty(0, dtype=int)
+
+
+class WelchBandPower:
+    """Per-channel Welch band power (trapezoid over [fmin, fmax]).
+
+    Matches Raw.compute_psd(method='welch', n_overlap=0) on the good spans:
+    blocks are aligned to n_fft within each span, so the segments are the
+    same, and block averages are weighted by their segment counts.
+    """
+
+    def __init__(self, sfreq: float, fmin: float, fmax: float, n_fft: int = 256):
+        self.sfreq = sfreq
+        self.fmin = fmin
+        self.fmax = fmax
+        self.align = n_fft
+        self.psd_sum = None
+        self.freqs = None
+        self.n_segments = 0
+
+    def update(self, data: np.ndarray, new_span: bool = False):
+        n_seg = data.shape[1] // self.align
+        if n_seg == 0:
+            return
+        # One vectorized scipy call per block (MNE's psd_array_welch loops over channels)
+        freqs, psd = welch(
+            data[:, :n_seg * self.align], fs=self.sfreq, window='hamming', nperseg=self.align,
+            noverlap=0, detrend='constant', axis=-1,
+        )
+        keep = (freqs >= self.fmin) & (freqs <= self.fmax)
+        self.freqs = freqs[keep]
+        psd = psd[:, keep] * n_seg
+        self.psd_sum = psd if self.psd_sum is None else self.psd_sum + psd
+        self.n_segments += n_seg
+
+    def result(self) -> np.ndarray:
+        if not self.n_segments:
+            raise ValueError(f"no span holds a full {self.align}-sample Welch segment")
+        return trapezoid(self.psd_sum / self.n_segments, self.freqs, axis=-1)
@@ -9,6 +9,13 @@ from app.pipeline.task_processor import EEGTaskProcessor
 from app.schemas.task_schema import SingleSubjectTask
 from app.schemas.session_schema import PipelineSession
 
+# Source files each cache stage is derived from; their fingerprint is part of the stage's key
+SOURCE_FILES = {
+    "raw": ("eeg.set", "eeg.fdt"),
+    "events": ("eeg.set", "eeg.fdt", "events.tsv"),
+}
+EVENT_STAGES = ("epochs", "evoked", "psd")
+
 
 class EEGTaskExecutor:
     """
@@ -56,8 +63,21 @@ class EEGTaskExecutor:
                 self.loader.load_events,
                 self.task,
                 self.cache,
+                source_fn=self.source_fingerprint,
             )
 
+    def source_fingerprint(self, stage: str) -> str | None:
+        """Return the fingerprint of the source files a cache stage is derived from.
+
+        Stages up to the cleaned Raw depend on the .set/.fdt only; epochs,
+        evoked and spectra also depend on events.tsv. Recomputed (stat only) on every call,
+        so a re-exported recording is picked up without restarting.
+        """
+        if self.loader is None:
+            self.loader = self._loader_cls(self.task, self._data_dir)
+        kind = "events" if stage in EVENT_STAGES else "raw"
+        return self.loader.fingerprint(SOURCE_FILES[kind])
+
     def get_raw(self) -> Raw:
         """Return (and cache) raw MNE object for this task."""
         self._ensure()
@@ -101,12 +121,22 @@ class EEGTaskExecutor:
         self._raw = None
         return raw
 
-    def get_epochs(self, session: PipelineSession) -> Epochs:
-        """Return (epochs, labels) from processor for given params."""
+    def get_epochs(self, session: PipelineSession, picks: list[str] | None = None) -> Epochs:
+        """Return (epochs, labels) from processor for given params, optionally only `picks` channels."""
         self._ensure()
-        return self.processor.get_epochs(session)
+        return self.processor.get_epochs(session, picks=picks)
 
     def get_evoked(self, session: PipelineSession) -> Evoked:
         """Return evoked response from processor for given params."""
         self._ensure()
         return self.processor.get_evoked(session)
+
+    def get_evokeds_by_condition(self, session: PipelineSession) -> dict[str, Evoked] | None:
+        """Return {condition: Evoked} from processor, all conditions in one pass."""
+        self._ensure()
+        return self.processor.get_evokeds_by_condition(session)
+
+    def get_epochs_psd(self, session: PipelineSession, tmin: float | None, tmax: float | None, fft_sec: float):
+        """Return the cached full-band per-epoch Welch spectrum from processor."""
+        self._ensure()
+        return self.processor.get_epochs_psd(session, tmin, tmax, fft_sec)
@@ -1,5 +1,6 @@
 """Low-level file loading helpers for raw EEG, metadata, events and channel tables."""
 
+import hashlib
 import json
 import warnings
 from pathlib import Path
@@ -47,6 +48,24 @@ class EEGTaskLoader:
         """Load electrodes TSV as DataFrame (or None)."""
         return self._load_tsv("electrodes.tsv")
 
+    def fingerprint(self, exts) -> str | None:
+        """Return a cheap content identity (name, size, mtime) of the given files.
+
+        Only stat() is used, so this never reads the recording itself. Returns
+        None if none of the files exist.
+        """
+        parts = []
+        for ext in exts:
+            path = self.get_file(ext)
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            parts.append(f"{path.name}:{st.st_size}:{st.st_mtime_ns}")
+        if not parts:
+            return None
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+
     def get_file(self, ext):
         """Return path for file with given extension under subject/eeg folder."""
         base = f"{self.task_dto.subject}_task-{self.task_dto.task}"
@@ -4,13 +4,22 @@ Signal processing pipeline: filtering, epoching and evoked computation with cach
 
 import logging
 import numpy as np
-from mne import Epochs, Evoked, set_log_level, events_from_annotations
-from mne.io import Raw, read_raw_fif
+from mne import Epochs, Evoked, EvokedArray, set_log_level, events_from_annotations
+from mne.io import Raw
 
 from .constants import EVENT_ID, RESTING_STATE_EVENT_ID, CCD_EVENT_ID
 
-from app.core.cache_key_helper import get_filter_key, get_cleaning_key, get_epochs_key, get_evoked_key
+from app.core.cache_key_helper import (
+    get_filter_key,
+    get_cleaning_key,
+    get_epochs_key,
+    get_evoked_key,
+    get_evoked_by_condition_key,
+    get_psd_key,
+)
 from app.core.cache_manager import CacheKey
+from app.core.chunked_epochs import match_conditions, select_epochs, select_labels
+from app.core.single_flight import single_flight
 from app.pipeline.signal_cleaner import EEGCleaner
 from app.schemas.task_schema import SingleSubjectTask
 from app.schemas.session_schema import PipelineSession
@@ -20,6 +29,59 @@ from app.schemas.params.epoch_filter_schema import EpochParams
 set_log_level("WARNING")
 log = logging.getLogger(__name__)
 
+def _crop_to_window(inst, tmin: float, tmax: float):
+    """Crop Epochs/Evoked to [tmin, tmax] and redo the (None, 0) baseline on the new window.
+
+    Baseline correction is a per-channel offset, so re-applying it after the
+    crop gives the same data as epoching with the narrower window directly.
+    """
+    inst = inst.crop(tmin, tmax)
+    if inst.baseline is not None and tmin <= 0:
+        inst.apply_baseline((None, 0))
+    return inst
+
+
+def _average_by_condition(epochs: Epochs) -> list[Evoked]:
+    """Average every condition of epochs in one pass; each Evoked's comment is its condition.
+
+    Equivalent to `epochs[name].average()` per event_id name, but the data is
+    read once and all means come from a single (conditions x epochs) product.
+    """
+    names = list(epochs.event_id)
+    if not names or len(epochs) == 0:
+        return []
+    codes = epochs.events[:, 2]
+    weights = np.array(
+        [np.isin(codes, list(match_conditions(epochs.event_id, [name]))) for name in names], dtype=float
+    )
+    counts = weights.sum(axis=1)
+    keep = np.flatnonzero(counts)
+    means = np.tensordot(weights[keep] / counts[keep, None], epochs.get_data(), axes=(1, 0))
+
+    evokeds = []
+    for i, data in zip(keep, means):
+        evk = EvokedArray(
+            data, epochs.info, tmin=epochs.times[0], comment=names[i], nave=int(counts[i]), baseline=None,
+            verbose="ERROR",
+        )
+        evk.baseline = epochs.baseline
+        evokeds.append(evk.pick("data", exclude=()))
+    return evokeds
+
+
+def stimulus_of(params: EpochParams) -> str | None:
+    """Return the single stimulus selected by the epoch params, or None for all conditions."""
+    stim = params.stimulus
+    if isinstance(stim, (list, tuple)):
+        stim = stim[0] if len(stim) > 0 else None
+    return stim or None
+
+
+def _all_conditions(session: PipelineSession) -> PipelineSession:
+    """Return session with the stimulus filter cleared (same epochs cache key)."""
+    return session.model_copy(update={"epochs": session.epochs.model_copy(update={"stimulus": None})})
+
+
 def preprocess_surround_supp(processor: "EEGTaskProcessor", session: PipelineSession):
     filtered = processor.get_filtered(session)
     events = processor.get_events()
@@ -47,9 +109,8 @@ def preprocess_surround_supp(processor: "EEGTaskProcessor", session: PipelineSes
     ok = (
         (stim["sample"] + tmin_samp >= 0)
         & (stim["sample"] + tmax_samp < n_times)
-    )
-    stim = stim.loc[ok]
-    if stim.empty:
+    ).values
+    if not ok.any():
         return None, None
 
     events_arr = np.column_stack(
@@ -70,6 +131,13 @@ def preprocess_surround_supp(processor: "EEGTaskProcessor", session: PipelineSes
         proj=True,
         preload=False,
     )
+    # Windows running past the recording edges are dropped, not filtered out
+    # beforehand, so the drop log shows which events this window lost
+    epochs.drop(np.flatnonzero(~ok), reason="NO_DATA", verbose="ERROR")
+    # Conditions left without epochs are not offered, so selecting one still
+    # falls back in _apply_stimulus_filter
+    kept_codes = set(epochs.events[:, 2].tolist())
+    epochs.event_id = {k: v for k, v in event_id.items() if v in kept_codes}
 
     labels = stim["label"].values[epochs.selection]
     return epochs, labels
@@ -119,7 +187,7 @@ def preprocess_resting_state(processor: "EEGTaskProcessor", session: PipelineSes
 
 def preprocess_ccd(processor: "EEGTaskProcessor", session: PipelineSession):
     filtered = processor.get_filtered(session)
-    events, ann_id = events_from_annotations(processor.get_raw())
+    events, ann_id = processor.get_annotation_events(session, filtered)
 
     if "contrastTrial_start" not in ann_id:
         return None, None
@@ -157,117 +225,293 @@ TASK_PREPROCESSORS = {
 
 class EEGTaskProcessor:
     """Apply preprocessing recipe per task and manage cached intermediate artifacts."""
-    def __init__(self, get_raw_fn, get_events_fn, task_dto: SingleSubjectTask, cache):
+    def __init__(self, get_raw_fn, get_events_fn, task_dto: SingleSubjectTask, cache, source_fn=None):
+        """`source_fn(stage)` returns the fingerprint of the source files a stage derives from."""
         self.get_raw = get_raw_fn
         self.get_events = get_events_fn
         self.task_dto = task_dto
         self.cache = cache
+        self.source_fn = source_fn
 
         self._log = logging.getLogger(__name__)
 
-    def _apply_stimulus_filter(self, epochs: Epochs, params: EpochParams):
-        stim = params.stimulus
-        if isinstance(stim, (list, tuple)):
-            stim = stim[0] if len(stim) > 0 else None
-        if stim:
-            if stim in epochs.event_id:
-                return epochs[stim]
-            self._log.warning("stim '%s' not in available event IDs %s", stim, list(epochs.event_id.keys()))
-            return None
-        return epochs.apply_baseline(baseline=(None, 0.0))
+    def _apply_stimulus_filter(self, epochs: Epochs, params: EpochParams, picks: list[str] | None = None):
+        """Select the session's stimulus (or re-baseline all epochs), then the named channels.
 
-    def get_filtered(self, session: PipelineSession) -> Raw:
-        """Return cleaned Raw using cached prefilter/clean stages when available."""
-        # 1) Find cleaned cache
-        clean_ck = CacheKey(
+        Selection is done on lazy epochs as well, so only the kept epochs and
+        channels are read when their data is loaded. The input epochs are not
+        modified; they may be the instance just stored in the cache.
+        """
+        stim = stimulus_of(params)
+        if stim:
+            if stim not in epochs.event_id:
+                self._log.warning("stim '%s' not in available event IDs %s", stim, list(epochs.event_id.keys()))
+                return None
+            return select_epochs(epochs[stim], picks)
+        selected = select_epochs(epochs, picks)
+        if selected is epochs:
+            selected = epochs.copy()
+        # Baseline correction is per channel, so it commutes with the pick above
+        return selected.apply_baseline(baseline=(None, 0.0)) if selected is not None else None
+
+    def cache_key(self, stage: str, params: dict) -> CacheKey:
+        """Build the CacheKey of a stage, stamped with its source-file fingerprint.
+
+        Each stage's params already contain the upstream stage's params, so
+        together with the fingerprint a key identifies its whole lineage and
+        editing the recording invalidates every derived entry.
+        """
+        return CacheKey(
             single_subject_task=self.task_dto,
-            stage="cleaned",
-            params=get_cleaning_key(session),
+            stage=stage,
+            params=params,
             pipeline_ver=self.cache.pipeline_ver,
+            source=self.source_fn(stage) if self.source_fn else None,
         )
-        cleaned_cached = self.cache.load_raw_filtered(clean_ck)
-        if cleaned_cached is not None:
-            return cleaned_cached
 
-        # 2) If cleaned cache not found, Build prefilter cache (Bandpass/resample/notch)
-        pre_ck = CacheKey(
-            single_subject_task=self.task_dto,
-            stage="prefilter",
-            params=get_filter_key(session),
-            pipeline_ver=self.cache.pipeline_ver,
+    def _clean_memo(self, session: PipelineSession):
+        """Return a clean_mark memo caching each step's statistics as arrays.
+
+        Sub-stage keys are the prefilter key plus only what the step itself
+        depends on, so a cleaning-threshold sweep reuses everything upstream.
+        """
+        filter_key = get_filter_key(session)
+
+        def memo(name: str, key: dict, compute):
+            ck = self.cache_key(f"clean-{name}", {**filter_key, **key})
+            arrays = self.cache.load_arrays(ck, "stats")
+            if arrays is None:
+                arrays = compute()
+                self.cache.save_arrays(arrays, ck, "stats")
+            return arrays
+
+        return memo
+
+    def _find_covering(self, ck: CacheKey, session: PipelineSession) -> CacheKey | None:
+        """Return the key of a cached wider time window that kept every event, else None.
+
+        A wider window loses the events near the recording edges and those
+        whose window overlaps a bad annotation, which the narrower window may
+        keep. Only an entry whose epochs dropped nothing is cropped, so the
+        crop holds exactly the epochs the narrower window would.
+        """
+        wide = self.cache.find_covering(ck)
+        if wide is None:
+            return None
+        window = {"tmin": wide.params["tmin"], "tmax": wide.params["tmax"]}
+        drop_log = self.cache.load_drop_log(self.cache_key("epochs", {**get_epochs_key(session), **window}))
+        if drop_log is None or any(reasons and reasons != ("IGNORED",) for reasons in drop_log):
+            self._log.info("Cached window [%s, %s] dropped events; not cropping it", window["tmin"], window["tmax"])
+            return None
+        return wide
+
+    def _crop_cached_epochs(self, ck: CacheKey, session: PipelineSession, picks: list[str] | None = None):
+        """Return (epochs, labels) cropped from a cached wider time window, else (None, None)."""
+        wide = self._find_covering(ck, session)
+        if wide is None:
+            return None, None
+        epochs, labels = self.cache.load_epochs(wide, picks=picks)
+        if epochs is None:
+            return None, None
+        self._log.info(
+            "Cropping cached epochs [%s, %s] -> [%s, %s]",
+            wide.params["tmin"], wide.params["tmax"], session.epochs.tmin, session.epochs.tmax,
+        )
+        return _crop_to_window(epochs, session.epochs.tmin, session.epochs.tmax), labels
+
+    def _crop_cached_evoked(self, ck: CacheKey, session: PipelineSession, many: bool = False):
+        """Return evoked (a list if many) cropped from a cached wider time window, else None."""
+        wide = self._find_covering(ck, session)
+        if wide is None:
+            return None
+        evk = self.cache.load_evokeds(wide) if many else self.cache.load_evoked(wide)
+        if evk is None:
+            return None
+        self._log.info(
+            "Cropping cached evoked [%s, %s] -> [%s, %s]",
+            wide.params["tmin"], wide.params["tmax"], session.epochs.tmin, session.epochs.tmax,
         )
-        cached = self.cache.load_raw_filtered(pre_ck)
-        if cached is None:
-            raw_pref = EEGCleaner.pre_filter(self.get_raw(), session.filter)
-            p = self.cache.save_raw_filtered(raw_pref, pre_ck)
-            del raw_pref
-            raw_pref = read_raw_fif(p.as_posix(), preload=False, verbose="ERROR")
-        else:
-            raw_pref = cached
-
-        # 3) Mark bad channels/time windows and save cleaned cache
-        raw_clean = EEGCleaner.clean_mark(raw_pref, session.filter)
-        self.cache.save_raw_filtered(raw_clean, clean_ck)
-        return raw_clean
-
-    def get_epochs(self, session: PipelineSession) -> Epochs:
-        """Return (epochs, labels) via registered task preprocessor with stimulus filter."""
+        if many:
+            return [_crop_to_window(e, session.epochs.tmin, session.epochs.tmax) for e in evk]
+        return _crop_to_window(evk, session.epochs.tmin, session.epochs.tmax)
+
+    def get_filtered(self, session: PipelineSession) -> Raw:
+        """Return cleaned Raw using cached prefilter/clean stages when available."""
+        # 1) Find cleaned cache
+        clean_ck = self.cache_key("cleaned", get_cleaning_key(session))
+        with single_flight(self.cache.token_for(clean_ck, "eeg")):
+            cleaned_cached = self.cache.load_raw_filtered(clean_ck)
+            if cleaned_cached is not None:
+                return cleaned_cached
+
+            # 2) If cleaned cache not found, Build prefilter cache (Bandpass/resample/notch)
+            pre_ck = self.cache_key("prefilter", get_filter_key(session))
+            with single_flight(self.cache.token_for(pre_ck, "eeg")):
+                cached = self.cache.load_raw_filtered(pre_ck)
+                if cached is None:
+                    raw_pref = EEGCleaner.pre_filter(self.get_raw(), session.filter)
+                    self.cache.save_raw_filtered(raw_pref, pre_ck)
+                    del raw_pref
+                    # Re-open lazily through the cache, which keeps the file from eviction while in use
+                    raw_pref = self.cache.load_raw_filtered(pre_ck)
+                else:
+                    raw_pref = cached
+
+            # 3) Mark bad channels/time windows and save cleaned cache
+            raw_clean = EEGCleaner.clean_mark(raw_pref, session.filter, memo=self._clean_memo(session))
+            self.cache.save_raw_filtered(raw_clean, clean_ck)
+            return raw_clean
+
+    def get_annotation_events(self, session: PipelineSession, filtered: Raw | None = None):
+        """Return (events, annotation id map) in the cleaned Raw's sample space.
+
+        Read from the sidecar stored with the cleaned cache entry, so a cache
+        hit never opens the source .set/.fdt; otherwise derived from the
+        annotations of the cleaned Raw itself.
+        """
+        clean_ck = self.cache_key("cleaned", get_cleaning_key(session))
+        cached = self.cache.load_raw_events(clean_ck)
+        if cached is not None:
+            return cached
+        if filtered is None:
+            filtered = self.get_filtered(session)
+        return events_from_annotations(filtered, verbose="ERROR")
+
+    def get_epochs(self, session: PipelineSession, picks: list[str] | None = None) -> Epochs:
+        """Return (epochs, labels) via registered task preprocessor with stimulus filter.
+
+        `picks` (channel names) and the stimulus are pushed down into the
+        cache read, so a hit only decodes the selected channels/conditions.
+        The full epochs are still cached on a miss.
+        """
         preprocess_fn = TASK_PREPROCESSORS.get(self.task_dto.task)
 
         if preprocess_fn is None:
             log.warning("Unsupported task: %s", self.task_dto.task)
             return None, "unavailable"
 
-        ck = CacheKey(
-            single_subject_task=self.task_dto,
-            stage="epochs",
-            params=get_epochs_key(session),
-            pipeline_ver=self.cache.pipeline_ver,
-        )
+        ck = self.cache_key("epochs", get_epochs_key(session))
+        stim = stimulus_of(session.epochs)
 
-        epochs, labels = self.cache.load_epochs(ck)
-        if epochs is not None:
-            epochs_sel = self._apply_stimulus_filter(epochs, session.epochs)
-            if epochs_sel is None:
+        with single_flight(self.cache.token_for(ck, "epo")):
+            epochs, labels = self.cache.load_epochs(ck, picks=picks, conditions=[stim] if stim else None)
+            if epochs is None and self.cache.has_epochs(ck):
+                # The entry exists, so an empty result means the selection matched nothing
+                self._log.warning("stim '%s' or channels %s not in cached epochs", stim, picks)
+                return None, "unavailable"
+            if epochs is not None:
+                if not stim:
+                    # load_epochs hands out its own copy (memory hits included), never the cached instance
+                    epochs = epochs.apply_baseline(baseline=(None, 0.0))
+                return epochs, labels
+
+            epochs, labels = self._crop_cached_epochs(ck, session, picks=picks)
+            if epochs is not None:
+                epochs_sel = self._apply_stimulus_filter(epochs, session.epochs)
+                if epochs_sel is None:
+                    return None, "unavailable"
+                return epochs_sel, select_labels(labels, epochs.event_id, [stim] if stim else None)
+
+            epochs, labels = preprocess_fn(self, session)
+            if epochs is None:
                 return None, "unavailable"
-            return epochs_sel, labels
-
-        epochs, labels = preprocess_fn(self, session)
-        if epochs is None:
-            return None, "unavailable"
 
-        if epochs.info.get('bads'):
-            epochs = epochs.interpolate_bads(reset_bads=True)
+            if epochs.info.get('bads'):
+                epochs = epochs.interpolate_bads(reset_bads=True)
 
-        if self.cache and ck:
-            self.cache.save_epochs(epochs, ck, labels=labels)
+            if self.cache and ck:
+                self.cache.save_epochs(epochs, ck, labels=labels)
 
-        epochs_sel = self._apply_stimulus_filter(epochs, session.epochs)
-        if epochs_sel is None:
-            return None, "unavailable"
+            epochs_sel = self._apply_stimulus_filter(epochs, session.epochs, picks)
+            if epochs_sel is None:
+                return None, "unavailable"
 
-        return epochs_sel, labels
+            return epochs_sel, select_labels(labels, epochs.event_id, [stim] if stim else None)
 
     def get_evoked(self, session: PipelineSession) -> Evoked:
         """Return evoked average from epochs, caching on disk when possible."""
-        ck = CacheKey(
-            single_subject_task=self.task_dto,
-            stage="evoked",
-            params=get_evoked_key(session),
-            pipeline_ver=self.cache.pipeline_ver,
-        )
+        ck = self.cache_key("evoked", get_evoked_key(session))
 
-        evk = self.cache.load_evoked(ck)
-        if evk is not None:
-            return evk
+        with single_flight(self.cache.token_for(ck, "ave")):
+            evk = self.cache.load_evoked(ck)
+            if evk is None:
+                evk = self._crop_cached_evoked(ck, session)
+            if evk is not None:
+                return evk
 
-        epochs, _ = self.get_epochs(session)
-        if epochs is None:
-            return None
+            epochs, _ = self.get_epochs(session)
+            if epochs is None:
+                return None
 
-        if epochs.info["bads"]:
-            epochs = epochs.interpolate_bads(reset_bads=True)
+            if epochs.info["bads"]:
+                epochs = epochs.interpolate_bads(reset_bads=True)
 
-        evk = epochs.average()
-        self.cache.save_evoked(evk, ck)
-        return evk
+            evk = epochs.average()
+            self.cache.save_evoked(evk, ck)
+            return evk
+
+    def get_evokeds_by_condition(self, session: PipelineSession) -> dict[str, Evoked] | None:
+        """Return {condition: Evoked} for every condition, from a single epochs load.
+
+        All conditions are cached together in one multi-condition -ave.fif,
+        independent of session.epochs.stimulus.
+        """
+        ck = self.cache_key("evoked", get_evoked_by_condition_key(session))
+
+        with single_flight(self.cache.token_for(ck, "ave")):
+            evokeds = self.cache.load_evokeds(ck)
+            if evokeds is None:
+                evokeds = self._crop_cached_evoked(ck, session, many=True)
+            if evokeds is None:
+                epochs, _ = self.get_epochs(_all_conditions(session))
+                if epochs is None:
+                    return None
+
+                if epochs.info["bads"]:
+                    epochs = epochs.interpolate_bads(reset_bads=True)
+
+                evokeds = _average_by_condition(epochs)
+                if not evokeds:
+                    return None
+                self.cache.save_evokeds(evokeds, ck)
+            return {evk.comment: evk for evk in evokeds}
+
+    def get_epochs_psd(self, session: PipelineSession, tmin: float | None, tmax: float | None, fft_sec: float):
+        """Return the full-band Welch spectrum of every epoch, cached as its own stage.
+
+        Covers all channels and conditions (n_fft = fft_sec seconds of
+        samples, Hann window, no overlap) so PSD views only slice channels
+        and frequencies; session.epochs.stimulus is applied on the way out.
+        """
+        ck = self.cache_key("psd", get_psd_key(session, tmin, tmax, fft_sec))
+
+        with single_flight(self.cache.token_for(ck, "psd")):
+            spectrum = self.cache.load_spectrum(ck)
+            if spectrum is None:
+                epochs, _ = self.get_epochs(_all_conditions(session))
+                if epochs is None:
+                    return None
+
+                sfreq = float(epochs.info["sfreq"])
+                spectrum = epochs.compute_psd(
+                    method="welch",
+                    tmin=tmin,
+                    tmax=tmax,
+                    n_fft=int(max(8, sfreq * fft_sec)),
+                    n_overlap=0,
+                    n_per_seg=None,
+                    window="hann",
+                    average="mean",
+                    verbose=False,
+                )
+                self.cache.save_spectrum(spectrum, ck)
+
+        stim = session.epochs.stimulus
+        if isinstance(stim, (list, tuple)):
+            stim = stim[0] if len(stim) > 0 else None
+        if stim:
+            if stim in spectrum.event_id:
+                return spectrum[stim]
+            self._log.warning("stim '%s' not in available event IDs %s", stim, list(spectrum.event_id.keys()))
+            return None
+        return spectrum
@@ -1,8 +1,9 @@
 """Responsible only for building ML datasets from epochs."""
+from itertools import groupby
 from typing import Any, Callable, Dict, Optional, Tuple, List
 import numpy as np
 
-from app.pipeline.channels_helper import prepare_channels
+from app.pipeline.channels_helper import prepare_channels, prepare_store_channels
 from app.pipeline.cohort_executor import EEGCohortExecutor
 from app.pipeline.task_executor import EEGTaskExecutor
 from app.schemas.session_schema import PipelineSession
@@ -10,7 +11,22 @@ from app.schemas.session_schema import PipelineSession
 
 def dataset_from_events(executor: EEGTaskExecutor, session: PipelineSession):
     """Build dataset using event labels."""
-    epochs, labels = executor.get_epochs(session)
+    if isinstance(executor, EEGCohortExecutor):
+        store = executor.get_epochs_store(session)
+        if store is None:
+            return None, None, {"reason": "epochs_unavailable"}
+        # float32 picks straight from the memmap-backed store; labels come from event codes
+        X, ch_names = prepare_store_channels(store, session.filter)
+        meta = {
+            "sfreq": float(store.info.get("sfreq", 0.0)),
+            "ch_names": ch_names,
+            "event_id": store.present_event_id,
+            "shape": tuple(X.shape),
+        }
+        return X, store.epoch_labels, meta
+
+    # Only the picked channels are loaded
+    epochs, labels = executor.get_epochs(session, picks=session.filter.channels_list)
     if epochs is None:
         return None, None, {"reason": "epochs_unavailable"}
     epochs.load_data()
@@ -59,22 +75,15 @@ def dataset_from_participants(
     params = session.epochs
 
     if isinstance(executor, EEGCohortExecutor):
-        task_models = executor.task_model_list
-        if not task_models:
-            return None, None, {"reason": "no_task_models"}
-        X_parts: List[np.ndarray] = []
+        store = executor.get_epochs_store(session)
+        if store is None:
+            return None, None, {"reason": "empty_cohort_epochs"}
+        # Only the selected channels are read from the memmap-backed store, as float32
+        X, ch_names = prepare_store_channels(store, session.filter)
+        subj_ids: List[str] = [str(s) for s in store.subject_ids]
         y_parts: List[Any] = []
-        subj_ids: List[str] = []
-        for tm in task_models:
-            epochs, _labels = tm.get_epochs(session)
-            if epochs is None:
-                continue
-            epochs.load_data()
-            epochs = prepare_channels(epochs, session.filter)
-            subj = getattr(tm.task_dto, "subject", None)
-            if subj is None:
-                continue
-            X_parts.append(epochs.get_data())
+        for subj, group in groupby(subj_ids):
+            n_ep = sum(1 for _ in group)
             values = []
             if get_subjects_metadata is not None:
                 try:
@@ -84,7 +93,6 @@ def dataset_from_participants(
                 except Exception:  # pragma: no cover
                     values = []
             # Convert to floats when possible (NaN if not convertible)
-            n_ep = len(epochs)
             if values:
                 vec = [_to_float(v) for v in values]
                 # Numeric regression mode if at least one finite value exists
@@ -100,10 +108,6 @@ def dataset_from_participants(
                     y_parts.extend([val] * n_ep)
             else:
                 y_parts.extend([None] * n_ep)
-            subj_ids.extend([str(subj)] * n_ep)
-        if not X_parts:
-            return None, None, {"reason": "empty_cohort_epochs"}
-        X = np.concatenate(X_parts, axis=0)
         # If first element is list -> regression multi-output
         if y_parts and isinstance(y_parts[0], list):
             y = np.array(y_parts, dtype=np.float32)
@@ -113,22 +117,15 @@ def dataset_from_participants(
             if dropped > 0:
                 X = X[mask]
                 y = y[mask]
+                subj_ids = [s for s, keep in zip(subj_ids, mask) if keep]
         else:
             y = np.array(y_parts, dtype=object)
-        ref_epochs = None
-        for tm in task_models:
-            e, _ = tm.get_epochs(session)
-            if e is not None:
-                ref_epochs = e
-                ref_epochs = prepare_channels(ref_epochs, session.filter)
-                break
-        sfreq = float(ref_epochs.info.get("sfreq", 0.0)) if ref_epochs is not None else 0.0
-        ch_names = list(ref_epochs.ch_names) if ref_epochs is not None else []
+        sfreq = float(store.info.get("sfreq", 0.0))
         meta = {"sfreq": sfreq, "ch_names": ch_names, "event_id": {}, "shape": tuple(X.shape), "target_cols": cols, "subject_ids": subj_ids}
-        return X.astype(np.float32), y, meta
+        return X, y, meta
 
     # Single-subject fallback
-    epochs, _ = executor.get_epochs(session)
+    epochs, _ = executor.get_epochs(session, picks=session.filter.channels_list)
     if epochs is None:
         return None, None, {"reason": "epochs_unavailable"}
     epochs.load_data()
@@ -2,6 +2,7 @@
 import numpy as np
 
 from app.pipeline.channels_helper import prepare_channels
+from app.pipeline.cohort_executor import EEGCohortExecutor
 from app.pipeline.task_executor import EEGTaskExecutor
 from app.plots.figure_header import FigureHeader, format_caption_label
 from app.plots.grid_plot_helpers import draw_evoked_response, render_label_grid
@@ -11,17 +12,29 @@ from app.schemas.session_schema import PipelineSession
 
 
 def prepare_evoked_grid_data(executor: EEGTaskExecutor, session: PipelineSession):
-    evoked_dto = session.evoked
-    epochs, available_labels = executor.get_epochs(session)
-    evoked = executor.get_evoked(session)
-    if (epochs or evoked) is None:
+    if isinstance(executor, EEGCohortExecutor):
+        # The grid only needs the labels; epoching the whole cohort into a store
+        # for them would cost more than the grand averages themselves
+        epochs = None
+        available_labels = executor.get_condition_labels(session)
+        if available_labels is None:
+            return None
+    else:
+        epochs, available_labels = executor.get_epochs(session)
+        if epochs is None:
+            return None
+
+    evokeds = executor.get_evokeds_by_condition(session)
+    if not evokeds:
         return None
 
     evoked_cache = {}
 
     for label in available_labels:
+        evoked = evokeds.get(label)
+        if evoked is None or label in evoked_cache:
+            continue
         try:
-            p = evoked_dto.model_copy(update={"stimulus": label})
             evoked = prepare_channels(evoked, session.filter)
 
             data_uv = evoked.data * 1e6
@@ -1,63 +1,55 @@
 """Grid of PSD curves per condition/label."""
 import numpy as np
 
-from app.pipeline.channels_helper import prepare_channels
+from app.pipeline.cohort_executor import EEGCohortExecutor
 from app.pipeline.task_executor import EEGTaskExecutor
 from app.plots.figure_header import FigureHeader, format_caption_label
-from app.plots.grid_plot_helpers import render_label_grid
+from app.plots.grid_plot_helpers import (
+    compute_label_spectra,
+    grid_cache_params,
+    grid_fft_sec,
+    grid_nfft,
+    label_cache_from_arrays,
+    label_cache_to_arrays,
+    render_label_grid,
+)
 from app.plots.plot_merger import merge_figures_vertical
 from app.schemas.session_schema import PipelineSession
 
 
+def _psd_db(psd: np.ndarray) -> np.ndarray:
+    return 10 * np.log10(psd, where=psd > 0, out=np.full_like(psd, np.nan))
+
+
+def _compute_psd_cache(epochs, available_labels, session: PipelineSession, nfft: int, spectrum=None) -> dict:
+    return compute_label_spectra(epochs, available_labels, session, nfft, _psd_db, spectrum=spectrum)
+
+
 def prepare_psd_grid_data(executor: EEGTaskExecutor, session: PipelineSession):
-    epochs_psd_dto = session.epochs_psd
-    epochs, available_labels = executor.get_epochs(session)
+    if isinstance(executor, EEGCohortExecutor):
+        store = executor.get_epochs_store(session)
+        if store is None:
+            return None
+        nfft = grid_nfft(float(store.info["sfreq"]), session.epochs_psd)
+
+        def _compute():
+            # Only the selected channels are read from the on-disk cohort store
+            epochs = store.to_epochs(picks=session.filter.channels_list)
+            return label_cache_to_arrays(_compute_psd_cache(epochs, store.labels, session, nfft))
+
+        arrays = executor.get_label_aggregates(session, "psd_grid", grid_cache_params(session, nfft), _compute)
+        return store, store.labels, label_cache_from_arrays(arrays)
+
+    epochs, available_labels = executor.get_epochs(session, picks=session.filter.channels_list)
     if epochs is None:
         return None
 
-    sfreq = float(epochs.info.get("sfreq", 0.0))
-    duration = (
-        (epochs_psd_dto.tmax - epochs_psd_dto.tmin)
-        if (epochs_psd_dto.tmax is not None and epochs_psd_dto.tmin is not None)
-        else 1.0
-    )
-    nfft = int(max(8, sfreq * max(0.5, duration)))
-
-    # ---- precompute once per label ----
-    psd_cache = {}
-
-    for label in available_labels:
-        try:
-            ce = prepare_channels(epochs[label], session.filter)
-            if len(ce) == 0:
-                continue
-
-            spectrum = ce.compute_psd(
-                method="welch",
-                n_fft=nfft,
-                n_overlap=0,
-                n_per_seg=None,
-                tmin=epochs_psd_dto.tmin,
-                tmax=epochs_psd_dto.tmax,
-                fmin=epochs_psd_dto.fmin,
-                fmax=epochs_psd_dto.fmax,
-                window="hann",
-                average="mean",
-                verbose=False,
-            )
-
-            psd, freqs = spectrum.get_data(return_freqs=True)
-
-            psd_db = 10 * np.log10(psd, where=psd > 0, out=np.full_like(psd, np.nan))
-            mean = np.nanmean(psd_db, axis=(0, 1))
-            std = np.nanstd(psd_db, axis=(0, 1))
-
-            psd_cache[label] = (freqs, mean, std, len(ce))
-
-        except Exception:
-            continue
-
-    return epochs, available_labels, psd_cache
+    nfft = grid_nfft(float(epochs.info.get("sfreq", 0.0)), session.epochs_psd)
+    spectrum = None
+    if not session.filter.combine_channels:
+        dto = session.epochs_psd
+        spectrum = executor.get_epochs_psd(session, dto.tmin, dto.tmax, grid_fft_sec(dto))
+    return epochs, available_labels, _compute_psd_cache(epochs, available_labels, session, nfft, spectrum)
 
 
 def plot_psd_grid(epochs, available_labels, psd_cache, session: PipelineSession):
@@ -7,21 +7,28 @@ Provides helpers for:
 - Axes reshaping
 - Evoked trace rendering (per-channel, average, GFP)
 - Generic label-tokenized grid rendering
+- Single-pass per-label spectra and their packing for the cohort cache
 """
+import logging
 from typing import Tuple, Callable, Optional, Dict
 
 import matplotlib.pyplot as plt
+import mne
 import numpy as np
 
 from matplotlib.axes import Axes
 from mne import Evoked
 from tqdm.auto import tqdm
 
+from app.core.chunked_epochs import match_conditions
+from app.pipeline.channels_helper import ChannelsHelper, uv_bounds
 from app.plots.figure_header import FigureHeader, format_subject_label
 from app.plots.plot_finalizer import finalize_figure
 from app.schemas.params.evoked_filter_schema import EvokedParams
 from app.schemas.session_schema import PipelineSession
 
+log = logging.getLogger(__name__)
+
 
 # ---- token & axis helpers ----
 def split_tokens(label: str) -> list[str]:
@@ -67,6 +74,189 @@ def reshape_axes_array(axes, num_rows: int, num_cols: int):
         return np.array([[axis] for axis in axes])
     return axes
 
+# ---- per-label spectra packing ----
+
+def _label_channel_masks(epochs, picks: list[int], masks: dict, params) -> dict:
+    """Return {label: bool mask over picks} after the per-label µV-range filter.
+
+    Matches prepare_channels on epochs[label]: a channel is kept if its
+    extrema over the label's epochs lie within [uv_min, uv_max], and all
+    picks are kept when the filter would remove everything.
+    """
+    uv_min, uv_max = uv_bounds(params)
+    if uv_min is None and uv_max is None:
+        return {label: np.ones(len(picks), dtype=bool) for label in masks}
+
+    data = epochs.get_data(picks=picks)
+    ch_min = np.nanmin(data, axis=-1) * 1e6  # (n_epochs, n_channels)
+    ch_max = np.nanmax(data, axis=-1) * 1e6
+    keep = {}
+    for label, mask in masks.items():
+        k = np.ones(len(picks), dtype=bool)
+        if uv_min is not None:
+            k &= np.nanmin(ch_min[mask], axis=0) >= uv_min
+        if uv_max is not None:
+            k &= np.nanmax(ch_max[mask], axis=0) <= uv_max
+        keep[label] = k if k.any() else np.ones(len(picks), dtype=bool)
+    return keep
+
+
+def compute_label_spectra(
+        epochs,
+        available_labels,
+        session: PipelineSession,
+        nfft: int,
+        transform: Callable[[np.ndarray], np.ndarray],
+        spectrum=None,
+    ) -> dict:
+    """Return {label: (freqs, mean, std, n)} from a single Welch PSD over all epochs.
+
+    Channels are picked once and the PSD of every picked epoch is computed in
+    one call, or sliced from `spectrum` (the cached full-band spectrum of the
+    same epochs) when given; each label then reduces its own epoch/channel
+    slice. `transform` maps the (epochs, channels, freqs) PSD to the values
+    averaged per label (dB, SNR, ...). With combine_channels the combined
+    trace depends on the label's channel set, so one PSD is computed per
+    distinct set.
+    """
+    dto = session.epochs_psd
+    if spectrum is not None and not np.array_equal(spectrum.events, epochs.events):
+        # Not the same epochs (e.g. a different stimulus selection or drops)
+        spectrum = None
+    codes = epochs.events[:, 2]
+    masks = {}
+    for label in dict.fromkeys(available_labels if available_labels is not None else []):
+        mask = np.isin(codes, list(match_conditions(epochs.event_id, [label])))
+        if mask.any():
+            masks[label] = mask
+
+    helper = ChannelsHelper(session.filter, epochs)
+    helper.pick_channels()
+    picks = helper.picks or []
+    if not masks or not picks:
+        return {}
+    combine = getattr(session.filter, "combine_channels", False)
+    if spectrum is None or combine:
+        spectrum = None
+        if not epochs.preload:
+            epochs = epochs.copy().load_data()
+
+    def _spectra(inst, ch_picks):
+        spectrum = inst.compute_psd(
+            method="welch",
+            picks=ch_picks,
+            n_fft=nfft,
+            n_overlap=0,
+            n_per_seg=None,
+            tmin=dto.tmin,
+            tmax=dto.tmax,
+            fmin=dto.fmin,
+            fmax=dto.fmax,
+            window="hann",
+            average="mean",
+            verbose=False,
+        )
+        psd, freqs = spectrum.get_data(return_freqs=True)
+        return freqs, psd
+
+    keep = _label_channel_masks(epochs, picks, masks, session.filter)
+    groups: dict[tuple, list] = {}
+    if combine:
+        for label in masks:
+            groups.setdefault(tuple(np.flatnonzero(keep[label])), []).append(label)
+
+    # Only the MNE PSD calls are guarded; any other error propagates
+    try:
+        if combine:
+            spectra = {}
+            for ch_idx in groups:
+                group_picks = [picks[i] for i in ch_idx]
+                combined = mne.channels.combine_channels(epochs, groups={"combined": group_picks}, method="mean")
+                spectra[ch_idx] = _spectra(combined, "all")
+        elif spectrum is not None:
+            psd, freqs = spectrum.get_data(
+                picks=[epochs.ch_names[i] for i in picks],
+                exclude=(),
+                fmin=0 if dto.fmin is None else dto.fmin,
+                fmax=np.inf if dto.fmax is None else dto.fmax,
+                return_freqs=True,
+            )
+        else:
+            freqs, psd = _spectra(epochs, picks)
+    except ValueError as e:
+        # MNE rejects the PSD parameters for these epochs, e.g. an n_fft longer
+        # than the [tmin, tmax] window or a band with no frequency bins
+        log.warning("[grid] no label spectra: %s", e)
+        return {}
+
+    if combine:
+        values = {}
+        for ch_idx, group in groups.items():
+            freqs, psd = spectra[ch_idx]
+            vals = transform(psd)
+            values.update({label: vals[masks[label]] for label in group})
+    else:
+        vals = transform(psd)
+        values = {label: vals[masks[label]][:, keep[label]] for label in masks}
+
+    return {
+        label: (freqs, np.nanmean(v, axis=(0, 1)), np.nanstd(v, axis=(0, 1)), int(len(v)))
+        for label, v in values.items()
+    }
+
+
+def label_cache_to_arrays(label_cache: dict) -> dict[str, np.ndarray]:
+    """Pack {label: (freqs, mean, std, n)} into flat arrays for NPZ caching."""
+    labels = list(label_cache)
+    if not labels:
+        return {}
+    return {
+        "labels": np.array(labels),
+        "freqs": label_cache[labels[0]][0],
+        "mean": np.stack([label_cache[label][1] for label in labels]),
+        "std": np.stack([label_cache[label][2] for label in labels]),
+        "n": np.array([label_cache[label][3] for label in labels]),
+    }
+
+
+def label_cache_from_arrays(arrays: dict[str, np.ndarray]) -> dict:
+    """Inverse of label_cache_to_arrays."""
+    if not arrays:
+        return {}
+    return {
+        str(label): (arrays["freqs"], arrays["mean"][i], arrays["std"][i], int(arrays["n"][i]))
+        for i, label in enumerate(arrays["labels"])
+    }
+
+
+def grid_fft_sec(epochs_psd_dto) -> float:
+    """Return the Welch segment length in seconds used by the PSD/SNR grids."""
+    duration = (
+        (epochs_psd_dto.tmax - epochs_psd_dto.tmin)
+        if (epochs_psd_dto.tmax is not None and epochs_psd_dto.tmin is not None)
+        else 1.0
+    )
+    return max(0.5, duration)
+
+
+def grid_nfft(sfreq: float, epochs_psd_dto) -> int:
+    """Return the Welch n_fft used by the PSD/SNR grids."""
+    return int(max(8, sfreq * grid_fft_sec(epochs_psd_dto)))
+
+
+def grid_cache_params(session: PipelineSession, nfft: int) -> dict:
+    """Return the session fields a per-label spectra grid depends on."""
+    return {
+        "fmin": session.epochs_psd.fmin,
+        "fmax": session.epochs_psd.fmax,
+        "nfft": nfft,
+        "channels": session.filter.channels,
+        "combine_channels": session.filter.combine_channels,
+        "show_bad": session.filter.show_bad,
+        "uv_min": session.filter.uv_min,
+        "uv_max": session.filter.uv_max,
+    }
+
 # ---- drawing helpers ----
 
 def draw_evoked_response(axis, evoked: Evoked, params: EvokedParams):
@@ -106,7 +296,13 @@ def render_label_grid(
         scale_mode: str,
         per_cell_draw: Callable[[Axes, str], Optional[Tuple[float, float]]],
 ):
-    """Render label-tokenized grids."""
+    """Render label-tokenized grids.
+
+    `epochs` only needs an `event_id` mapping, so a CohortEpochsStore can be
+    passed when the per-cell data comes from the cohort cache. With None,
+    every available label gets a cell and per_cell_draw skips labels it
+    has no data for.
+    """
     tokens_by_label = {label: split_tokens(label) for label in available_labels}
     max_token_count = max((len(tokens) for tokens in tokens_by_label.values()), default=1)
     grid_mode = min(max_token_count, 3)
@@ -130,7 +326,7 @@ def render_label_grid(
                     ax.cla()
 
                     label = cell_to_label_map.get((page_token, col_token, row_token))
-                    if label is not None and label in epochs.event_id:
+                    if label is not None and (epochs is None or label in epochs.event_id):
                         y_bounds = per_cell_draw(ax, label)
                         if y_bounds is not None:
                             dmin, dmax = y_bounds
@@ -7,7 +7,7 @@ from app.schemas.session_schema import PipelineSession
 
 def prepare_epochs_plot_data(executor: EEGTaskExecutor, session: PipelineSession):
     epochs_dto = session.epochs
-    epochs, _ = executor.get_epochs(session)
+    epochs, _ = executor.get_epochs(session, picks=session.filter.channels_list)
 
     if epochs is None:
         return None
@@ -14,18 +14,15 @@ def prepare_evoked_per_condition_plot_data(
     executor: EEGTaskExecutor,
     session: PipelineSession
 ) -> list[tuple[Evoked, str]] | None:
-    epochs, _ = executor.get_epochs(session)
-    if epochs is None:
+    evokeds = executor.get_evokeds_by_condition(session)
+    if not evokeds:
         return None
 
+    stim = session.epochs.stimulus
     prepared = []
 
-    for condition in epochs.event_id.keys():
-        epochs_params = session.epochs.model_copy(update={"stimulus": [condition]})
-        session_updated = session.model_copy(update={"epochs": epochs_params})
-
-        evoked = executor.get_evoked(session_updated)
-        if evoked is None:
+    for condition, evoked in evokeds.items():
+        if stim and condition != stim:
             continue
 
         prepared_evoked = prepare_channels(evoked, session.filter)
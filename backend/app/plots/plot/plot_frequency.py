@@ -1,4 +1,4 @@
-from app.pipeline.channels_helper import prepare_channels
+from app.pipeline.channels_helper import has_uv_filter, prepare_channels, prepare_spectrum
 from app.pipeline.task_executor import EEGTaskExecutor
 from app.plots.figure_header import FigureHeader, format_caption_label, format_subject_label
 from app.plots.plot_finalizer import finalize_figure
@@ -7,8 +7,17 @@ from app.schemas.session_schema import PipelineSession
 
 def prepare_frequency_plot_data(executor: EEGTaskExecutor, session: PipelineSession):
     epochs_psd_dto = session.epochs_psd
+    fft_sec = max(0.5, (epochs_psd_dto.tmax - epochs_psd_dto.tmin))
 
-    epochs, _ = executor.get_epochs(session)
+    # Slice the cached full-band spectrum instead of re-running Welch, where the executor keeps one
+    spectrum = None
+    if not session.filter.combine_channels:
+        spectrum = executor.get_epochs_psd(session, epochs_psd_dto.tmin, epochs_psd_dto.tmax, fft_sec)
+    if spectrum is not None:
+        epochs = executor.get_epochs(session, picks=session.filter.channels_list)[0] if has_uv_filter(session.filter) else None
+        return prepare_spectrum(spectrum, session.filter, epochs_psd_dto.fmin, epochs_psd_dto.fmax, epochs=epochs)
+
+    epochs, _ = executor.get_epochs(session, picks=session.filter.channels_list)
 
     if epochs is None:
         return None
@@ -16,7 +25,7 @@ def prepare_frequency_plot_data(executor: EEGTaskExecutor, session: PipelineSess
     epochs = prepare_channels(epochs, session.filter)
 
     sfreq = epochs.info["sfreq"]
-    nfft = int(max(8, sfreq * max(0.5, (epochs_psd_dto.tmax - epochs_psd_dto.tmin))))
+    nfft = int(max(8, sfreq * fft_sec))
     psd = epochs.compute_psd(
         method="welch",
         fmin=epochs_psd_dto.fmin,
@@ -2,7 +2,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 
-from app.pipeline.channels_helper import prepare_channels
+from app.pipeline.channels_helper import has_uv_filter, prepare_channels, prepare_spectrum
 from app.pipeline.signal_spatial import compute_snr_spectrum
 from app.pipeline.task_executor import EEGTaskExecutor
 from app.plots.figure_header import FigureHeader, format_caption_label, format_subject_label
@@ -14,7 +14,17 @@ def prepare_snr_plot_data(executor: EEGTaskExecutor, session: PipelineSession):
     epochs_dto = session.epochs
     psd_dto = session.psd
 
-    epochs, _ = executor.get_epochs(session)
+    # Slice the cached full-band spectrum instead of re-running Welch, where the executor keeps one
+    spectrum = None
+    if not session.filter.combine_channels:
+        spectrum = executor.get_epochs_psd(session, epochs_dto.tmin, epochs_dto.tmax, epochs_dto.tmax - epochs_dto.tmin)
+    if spectrum is not None:
+        epochs = executor.get_epochs(session, picks=session.filter.channels_list)[0] if has_uv_filter(session.filter) else None
+        spectrum = prepare_spectrum(spectrum, session.filter, psd_dto.fmin, psd_dto.fmax, epochs=epochs)
+        psds, freqs = spectrum.get_data(return_freqs=True)
+        return psds, freqs, compute_snr_spectrum(psds)
+
+    epochs, _ = executor.get_epochs(session, picks=session.filter.channels_list)
 
     if epochs is None:
         return None
@@ -44,6 +44,9 @@ class FilterParams(BaseModel):
     clean_corr_min: Optional[float] = Field(
         None, json_schema_extra={"ui": "number", "group": "cleaning", "placeholder": "0.8"}
     )
+    clean_corr_window_sec: Optional[float] = Field(
+        None, json_schema_extra={"ui": "number", "unit": "sec", "group": "cleaning", "placeholder": "5.0"}
+    )
     clean_asr_max_std: Optional[float] = Field(
         None, json_schema_extra={"ui": "number", "group": "cleaning", "placeholder": "20.0"}
     )
@@ -61,6 +64,10 @@ class FilterParams(BaseModel):
         None, json_schema_extra={"ui": "number", "unit": "sec", "group": "cleaning", "placeholder": "0.5"}
     )
 
+    clean_window_hop: Optional[bool] = Field(
+        False, json_schema_extra={"ui": "checkbox", "group": "cleaning"}
+    )
+
     clean_asr_remove_only: Optional[bool] = Field(
         False, json_schema_extra={"ui": "checkbox", "group": "cleaning"}
     )
@@ -0,0 +1,74 @@
+import gc
+import pickle
+import sqlite3
+
+import mne
+import numpy as np
+import pytest
+
+from app.core.cache_manager import CacheKey, LocalCache
+from app.schemas.task_schema import SingleSubjectTask
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LocalCache(base_dir=tmp_path, pipeline_ver="v3")
+
+
+def _raw():
+    rng = np.random.default_rng(0)
+    return mne.io.RawArray(rng.normal(size=(4, 2500)), mne.create_info(4, 250.0, "eeg"), verbose="ERROR")
+
+
+def _key(run: int) -> CacheKey:
+    return CacheKey(SingleSubjectTask(subject="s", task="t", run=run), "prefilter", {"run": run}, "v3")
+
+
+def test_index_is_shared_and_not_wal(cache, tmp_path):
+    assert LocalCache(base_dir=tmp_path, pipeline_ver="v3").index is cache.index
+    assert pickle.loads(pickle.dumps(cache.index)) is cache.index
+    mode = sqlite3.connect(tmp_path / "index.sqlite3").execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "delete"
+
+
+def test_eviction_skips_entries_held_by_lazy_readers(cache):
+    keys = [_key(run) for run in range(3)]
+    for key in keys:
+        cache.save_raw_filtered(_raw(), key)
+    held = cache._path_for(keys[0], "eeg", "fif")
+
+    lazy = cache.load_raw_filtered(keys[0])
+    copy = lazy.copy()
+    del lazy
+    gc.collect()
+    cache.enforce_quota(1)
+    assert held.exists()
+    assert copy.get_data().shape == (4, 2500)
+
+    del copy
+    gc.collect()
+    cache.enforce_quota(1)
+    assert not held.exists()
+    assert not list(cache.base.rglob("*.lock"))
+    assert cache.index.total_size() == 0
+
+
+def test_explicit_zero_target_evicts_everything(cache, monkeypatch):
+    for run in range(2):
+        cache.save_raw_filtered(_raw(), _key(run))
+    # A zero quota is "unlimited"...
+    monkeypatch.setattr(cache.index, "quota_bytes", 0)
+    assert cache.enforce_quota() == 0 and cache.index.total_size() > 0
+    # ...but an explicit zero (or sub-byte) target empties the cache
+    assert cache.enforce_quota(int(0.4)) > 0
+    assert cache.index.total_size() == 0
+
+
+def test_hits_are_batched(cache):
+    key = _key(1)
+    cache.save_raw_filtered(_raw(), key)
+    for _ in range(3):
+        cache.load_raw_filtered(key)
+    assert cache.index.entries(stage="prefilter")[0]["hits"] == 0
+    cache.index.flush_hits()
+    assert cache.index.entries(stage="prefilter")[0]["hits"] == 3
@@ -0,0 +1,98 @@
+import tracemalloc
+
+import mne
+import numpy as np
+import pytest
+
+from app.core.mne_copy import picked_copy
+from app.pipeline.channels_helper import prepare_channels
+from app.schemas.params.base_filter_schema import FilterParams
+
+EVENT_ID = {"a": 1, "b": 2}
+
+
+def _raw(n_ch: int = 8, n_times: int = 3000, sfreq: float = 100.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n_ch, n_times)) * 20e-6
+    data[1, 500] = 300e-6
+    data[3, 900] = -300e-6
+    info = mne.create_info([f"E{i}" for i in range(1, n_ch + 1)], sfreq, "eeg")
+    return mne.io.RawArray(data, info, verbose="ERROR")
+
+
+def _epochs(preload: bool):
+    events = np.array([[200 + 300 * i, 0, 1 + i % 2] for i in range(8)])
+    return mne.Epochs(
+        _raw(), events, EVENT_ID, tmin=0.0, tmax=1.0, baseline=None, preload=preload, verbose="ERROR"
+    )
+
+
+def _old_prepare_channels(inst, params):
+    """prepare_channels before block-wise extrema: full µV copy of the trace, then copy().pick()."""
+    if hasattr(inst, "event_id") and not inst.preload:
+        inst = inst.copy().load_data()
+    exclude = [] if params.show_bad else list(inst.info["bads"])
+    picks = list(mne.pick_channels(inst.ch_names, include=params.channels_list, exclude=exclude))
+    if params.uv_min is not None or params.uv_max is not None:
+        data = inst.get_data(picks=picks) * 1e6
+        if data.ndim == 3:
+            data = data.transpose(1, 0, 2).reshape(len(picks), -1)
+        keep = np.ones(len(picks), dtype=bool)
+        if params.uv_min is not None:
+            keep &= np.nanmin(data, axis=1) >= params.uv_min
+        if params.uv_max is not None:
+            keep &= np.nanmax(data, axis=1) <= params.uv_max
+        picks = [p for p, k in zip(picks, keep) if k] or picks
+    if params.combine_channels:
+        return mne.channels.combine_channels(inst, groups={"combined": picks}, method="mean")
+    return inst.copy().pick(picks)
+
+
+@pytest.mark.parametrize("make", [_raw, lambda: _epochs(True), lambda: _epochs(False)],
+                         ids=["raw", "epochs", "lazy-epochs"])
+@pytest.mark.parametrize("bounds", [
+    {}, {"uv_min": -200.0, "uv_max": 200.0}, {"uv_max": 1.0}, {"uv_min": -250.0},
+])
+@pytest.mark.parametrize("combine", [False, True])
+def test_prepare_channels_matches_old_path(make, bounds, combine):
+    params = FilterParams(channels="1-6", combine_channels=combine, **bounds)
+    inst = make()
+    before = inst.get_data()
+    expected = _old_prepare_channels(make(), params)
+    result = prepare_channels(inst, params)
+    assert result.ch_names == expected.ch_names
+    np.testing.assert_array_equal(result.get_data(), expected.get_data())
+    # The input is left untouched
+    assert len(inst.ch_names) == 8
+    np.testing.assert_array_equal(inst.get_data(), before)
+
+
+def test_prepare_channels_copies_only_picked_data():
+    raw = _raw(n_ch=64, n_times=60 * 250, sfreq=250.0)
+    params = FilterParams(channels="1-8", uv_min=-500.0, uv_max=500.0)
+    tracemalloc.start()
+    try:
+        out = prepare_channels(raw, params)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert out.ch_names == [f"E{i}" for i in range(1, 9)]
+    # The old path copied the whole recording (and again the picks in µV);
+    # now the peak is about the 8 picked rows
+    assert peak < 0.25 * raw._data.nbytes
+
+
+@pytest.mark.parametrize("make", [_raw, lambda: _epochs(True)], ids=["raw", "epochs"])
+def test_picked_copy_copies_only_the_picks(make):
+    inst = make()
+    data = inst._data
+    names = list(inst.ch_names)
+    out = picked_copy(inst, [1, 4])
+
+    assert out.ch_names == ["E2", "E5"] and inst.ch_names == names
+    np.testing.assert_array_equal(out.get_data(), make().copy().pick([1, 4]).get_data())
+    # The memo shares the array only during the copy: pick gives the copy its own
+    assert inst._data is data and data.shape[-2] == 8
+    assert not np.shares_memory(out._data, data)
+    out._data[...] = 0.0
+    assert np.abs(inst._data).max() > 0
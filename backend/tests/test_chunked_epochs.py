@@ -0,0 +1,79 @@
+import mne
+import numpy as np
+import pytest
+
+from app.core.cache_manager import CacheKey, LocalCache
+from app.core.chunked_epochs import read_chunked_epochs, select_epochs, select_labels, write_chunked_epochs
+from app.core.memory_cache import memory_cache
+from app.schemas.task_schema import SingleSubjectTask
+
+EVENT_ID = {"left": 1, "right": 2}
+
+
+def _epochs():
+    """Six epochs of two conditions, the third one dropped as bad."""
+    rng = np.random.default_rng(0)
+    info = mne.create_info(4, 100.0, "eeg")
+    raw = mne.io.RawArray(rng.normal(size=(4, 1000)), info, verbose="ERROR")
+    codes = [1, 2, 1, 2, 2, 1]
+    events = np.array([[100 + 120 * i, 0, c] for i, c in enumerate(codes)])
+    epochs = mne.Epochs(raw, events, EVENT_ID, tmin=0.0, tmax=0.5, baseline=None, preload=True, verbose="ERROR")
+    epochs.drop([2], reason="BAD_test", verbose="ERROR")
+    labels = [{1: "left", 2: "right"}[c] for c in epochs.events[:, 2]]
+    return epochs, labels
+
+
+def test_select_labels_per_epoch_and_names():
+    assert select_labels(["left", "right", "right", "left"], EVENT_ID, ["right"]) == ["right", "right"]
+    assert list(select_labels(np.array(["left", "right"]), EVENT_ID, ["left"])) == ["left"]
+    assert select_labels(["left", "right"], EVENT_ID, None) == ["left", "right"]
+
+
+def test_chunked_roundtrip_keeps_selection_drop_log_and_filters_labels(tmp_path):
+    epochs, labels = _epochs()
+    write_chunked_epochs(tmp_path / "e.d", epochs, labels)
+
+    full, full_labels = read_chunked_epochs(tmp_path / "e.d")
+    np.testing.assert_array_equal(full.selection, epochs.selection)
+    assert full.drop_log == epochs.drop_log
+    assert full_labels == labels
+
+    sel, sel_labels = read_chunked_epochs(tmp_path / "e.d", conditions=["right"])
+    expected = epochs["right"]
+    np.testing.assert_array_equal(sel.selection, expected.selection)
+    assert sel.drop_log == expected.drop_log
+    assert sel_labels == ["right"] * len(sel)
+
+
+@pytest.mark.parametrize("fmt", ["fif", "chunked"])
+def test_load_epochs_filters_labels_with_conditions(tmp_path, monkeypatch, fmt):
+    monkeypatch.setenv("EEG_EPOCHS_FORMAT", fmt)
+    cache = LocalCache(base_dir=tmp_path, pipeline_ver="v3")
+    key = CacheKey(SingleSubjectTask(subject="s", task="t", run=1), "epochs", {"fmt": fmt}, "v3")
+    epochs, labels = _epochs()
+    cache.save_epochs(epochs, key, labels=labels)
+
+    for clear in (False, True):
+        if clear:
+            memory_cache.clear()
+        sel, sel_labels = cache.load_epochs(key, conditions=["left"])
+        assert len(sel_labels) == len(sel) == len(epochs["left"])
+        assert set(sel_labels) == {"left"}
+
+
+@pytest.mark.parametrize("preload", [True, False])
+def test_select_epochs_leaves_input_untouched(preload):
+    epochs, _ = _epochs()
+    if not preload:
+        epochs = mne.Epochs(
+            mne.io.RawArray(epochs.get_data()[0], epochs.info, verbose="ERROR"),
+            np.array([[0, 0, 1], [10, 0, 2]]), EVENT_ID, tmin=0.0, tmax=0.3, baseline=None,
+            preload=False, verbose="ERROR",
+        )
+    before = epochs.ch_names
+
+    for conditions in (None, ["left"]):
+        sel = select_epochs(epochs, picks=["1", "3"], conditions=conditions)
+        assert sel.ch_names == ["1", "3"]
+        assert epochs.ch_names == before
+        assert epochs.preload is preload
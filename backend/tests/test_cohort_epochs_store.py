@@ -0,0 +1,68 @@
+import mne
+import numpy as np
+import pytest
+
+from app.pipeline.channels_helper import prepare_channels, prepare_store_channels
+from app.pipeline.cohort_epochs_store import CohortEpochsStore
+from app.pipeline.cohort_executor import EEGCohortExecutor
+from app.pipeline.trainer_data_builder import dataset_from_events
+from app.schemas.session_schema import PipelineSession
+
+EVENT_ID = {"a": 1, "b": 2}
+
+
+def _epochs(seed: int, preload: bool = False):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(6, 3000)) * 20e-6
+    data[2, 550] = 300e-6
+    info = mne.create_info([f"E{i}" for i in range(1, 7)], 100.0, "eeg")
+    raw = mne.io.RawArray(data, info, verbose="ERROR")
+    raw.set_annotations(mne.Annotations([11.5], [0.2], ["BAD_seg"]))
+    events = np.array([[200 + 300 * i, 0, 1 + i % 2] for i in range(8)])
+    return mne.Epochs(raw, events, EVENT_ID, tmin=0.0, tmax=1.0, baseline=None, preload=preload, verbose="ERROR")
+
+
+def _store(tmp_path):
+    store = CohortEpochsStore(tmp_path / "store")
+    store.append(_epochs(0), "s1")
+    store.append(_epochs(1, preload=True), "s2")
+    return store.finalize()
+
+
+def test_append_leaves_the_callers_epochs_untouched(tmp_path):
+    epochs = _epochs(0)
+    selection = epochs.selection.copy()
+    store = CohortEpochsStore(tmp_path / "store")
+    store.append(epochs, "s1")
+    # The epoch under the BAD annotation is dropped in the store only
+    assert store.n_epochs == 7 and len(epochs.selection) == 8
+    np.testing.assert_array_equal(epochs.selection, selection)
+
+
+@pytest.mark.parametrize("filter_params", [
+    {"channels": "1-4"},
+    {"channels": "1-4", "uv_min": -200.0, "uv_max": 200.0},
+    {"channels": "1-4", "uv_max": 1.0},
+    {"channels": "1-4", "uv_max": 200.0, "combine_channels": True},
+])
+def test_store_channels_match_prepare_channels_on_epochs(tmp_path, filter_params):
+    store = _store(tmp_path)
+    session = PipelineSession(filter=filter_params)
+    expected = prepare_channels(store.to_epochs(picks=session.filter.channels_list), session.filter)
+
+    data, names = prepare_store_channels(store, session.filter)
+    assert data.dtype == np.float32 and names == expected.ch_names
+    np.testing.assert_array_equal(data, expected.get_data().astype(np.float32))
+
+
+def test_cohort_event_dataset_reads_the_store(tmp_path):
+    store = _store(tmp_path)
+    executor = EEGCohortExecutor([], 2, None)
+    executor.epochs_store = store
+    session = PipelineSession(filter={"channels": "1-4", "uv_max": 200.0})
+
+    X, y, meta = dataset_from_events(executor, session)
+    assert X.dtype == np.float32 and meta["ch_names"] == ["E1", "E2", "E4"]
+    np.testing.assert_array_equal(X, store.get_data(["E1", "E2", "E4"]))
+    assert list(y) == list(store.epoch_labels) and meta["event_id"] == EVENT_ID
+    assert not hasattr(executor, "epochs")
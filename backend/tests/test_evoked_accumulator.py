@@ -0,0 +1,68 @@
+import mne
+import numpy as np
+import pytest
+
+from app.pipeline.evoked_accumulator import EvokedAccumulator
+
+CH_NAMES = [f"E{i}" for i in range(1, 129, 11)]
+
+
+def _evoked(seed: int, bads=(), drop=()) -> mne.Evoked:
+    rng = np.random.default_rng(seed)
+    info = mne.create_info(CH_NAMES, 250.0, "eeg")
+    evk = mne.EvokedArray(rng.normal(0, 1e-6, (len(CH_NAMES), 100)), info, tmin=-0.1, nave=int(rng.integers(5, 40)))
+    evk.set_montage(mne.channels.make_standard_montage("GSN-HydroCel-128"), on_missing="ignore")
+    evk.info["bads"] = list(bads)
+    return evk.drop_channels(list(drop)) if drop else evk
+
+
+def _accumulate(evokeds, expected):
+    acc = EvokedAccumulator(expected)
+    for evk in evokeds:
+        acc.add(evk)
+    return acc.result()
+
+
+@pytest.mark.parametrize("bads, drop", [
+    ({}, {}),
+    ({1: ["E45"]}, {}),
+    ({0: ["E1"], 2: ["E100", "E122"]}, {3: ["E111"]}),
+])
+def test_matches_grand_average_exactly(bads, drop):
+    evokeds = [_evoked(i, bads.get(i, ()), drop.get(i, ())) for i in range(5)]
+    expected = mne.grand_average(evokeds)
+    result = _accumulate(evokeds, len(evokeds))
+
+    assert result.ch_names == expected.ch_names
+    assert result.nave == expected.nave == len(evokeds)
+    assert result.info["bads"] == []
+    np.testing.assert_array_equal(result.data, expected.data)
+
+
+def test_missing_inputs_match_to_rounding():
+    evokeds = [_evoked(i) for i in range(4)]
+    result = _accumulate(evokeds, expected=6)
+    np.testing.assert_allclose(result.data, mne.grand_average(evokeds).data, rtol=1e-12, atol=0)
+    assert result.nave == 4
+
+
+def test_single_input_is_returned_unchanged():
+    evk = _evoked(0, bads=["E45"])
+    assert _accumulate([evk], expected=3) is evk
+    assert EvokedAccumulator().result() is None
+
+
+def test_inputs_are_not_modified():
+    evokeds = [_evoked(i, bads=["E23"] if i == 1 else ()) for i in range(3)]
+    before = [evk.data.copy() for evk in evokeds]
+    _accumulate(evokeds, len(evokeds))
+    assert evokeds[1].info["bads"] == ["E23"]
+    for evk, data in zip(evokeds, before):
+        np.testing.assert_array_equal(evk.data, data)
+
+
+def test_mismatched_times_raise():
+    acc = EvokedAccumulator(2)
+    acc.add(_evoked(0))
+    with pytest.raises(ValueError, match="same time instants"):
+        acc.add(_evoked(1).crop(0.0, None))
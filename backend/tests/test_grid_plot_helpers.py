@@ -0,0 +1,58 @@
+import mne
+import numpy as np
+import pytest
+
+from app.plots.grid_plot_helpers import compute_label_spectra
+from app.schemas.session_schema import PipelineSession
+
+EVENT_ID = {"bg0_a": 1, "bg1_a": 2}
+
+
+def _epochs(codes, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    info = mne.create_info([f"E{i}" for i in range(1, 5)], 100.0, "eeg")
+    raw = mne.io.RawArray(rng.normal(size=(4, 3000)) * 1e-6, info, verbose="ERROR")
+    events = np.array([[100 + 200 * i, 0, c] for i, c in enumerate(codes)])
+    return mne.Epochs(raw, events, EVENT_ID, tmin=0.0, tmax=1.0, baseline=None, preload=True, verbose="ERROR")
+
+
+def _psd(values):
+    return values
+
+
+def test_spectrum_of_other_epochs_is_not_reused():
+    session = PipelineSession(
+        filter={"channels": "1-4"}, epochs={"tmin": 0.0, "tmax": 1.0}, psd={"fmin": 1.0, "fmax": 40.0}
+    )
+    epochs = _epochs([1, 2, 1, 2])
+    # Same number of epochs, but a different selection of the recording
+    other = _epochs([2, 2, 1, 1], seed=1)
+    spectrum = other.compute_psd(method="welch", n_fft=100, n_overlap=0, window="hann", verbose=False)
+
+    expected = compute_label_spectra(epochs, list(EVENT_ID), session, 100, _psd)
+    result = compute_label_spectra(epochs, list(EVENT_ID), session, 100, _psd, spectrum=spectrum)
+    assert set(result) == set(EVENT_ID)
+    for label in EVENT_ID:
+        np.testing.assert_allclose(result[label][1], expected[label][1])
+
+
+def test_invalid_psd_parameters_give_no_spectra(caplog):
+    session = PipelineSession(
+        filter={"channels": "1-4"}, epochs={"tmin": 0.0, "tmax": 1.0}, psd={"fmin": 1.0, "fmax": 40.0}
+    )
+    # n_fft longer than the epochs' one-second window
+    assert compute_label_spectra(_epochs([1, 2]), list(EVENT_ID), session, 1000, _psd) == {}
+    assert "no label spectra" in caplog.text
+
+
+def test_unexpected_errors_propagate():
+    session = PipelineSession(
+        filter={"channels": "1-4"}, epochs={"tmin": 0.0, "tmax": 1.0}, psd={"fmin": 1.0, "fmax": 40.0}
+    )
+
+    def _broken(psd):
+        # A shape bug: the per-label epoch masks no longer fit
+        return psd.ravel()
+
+    with pytest.raises(IndexError):
+        compute_label_spectra(_epochs([1, 2]), list(EVENT_ID), session, 100, _broken)
@@ -0,0 +1,175 @@
+import io
+
+import mne
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view as swv
+from scipy.integrate import trapezoid
+
+from app.pipeline.signal_cleaner import EEGCleaner, _safe_zscore
+from app.schemas.params.base_filter_schema import FilterParams
+
+
+def _raw(n_ch: int = 8, n_times: int = 6000, sfreq: float = 100.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n_ch, n_times)) * 1e-5
+    data[:, 2000:2150] *= 8
+    return mne.io.RawArray(data, mne.create_info(n_ch, sfreq, "eeg"), verbose="ERROR")
+
+
+def _fake_asr(data_uv, sfreq, max_std, window_sec):
+    """Deterministic stand-in for asrpy: clip each channel to max_std of its std."""
+    bound = max_std * data_uv.std(axis=1, keepdims=True)
+    return np.clip(data_uv, -bound, bound) * 0.999
+
+
+class _DiskMemo:
+    """Memo that round-trips arrays through NPZ like LocalCache.save_arrays/load_arrays."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def __call__(self, name, key, compute):
+        token = (name, repr(sorted(key.items())))
+        if token not in self.entries:
+            buf = io.BytesIO()
+            np.savez(buf, **compute())
+            self.entries[token] = buf.getvalue()
+        with np.load(io.BytesIO(self.entries[token])) as npz:
+            return {k: npz[k] for k in npz.files}
+
+
+@pytest.mark.parametrize("remove_only", [False, True])
+def test_memo_hits_give_the_same_result_as_a_fresh_run(monkeypatch, remove_only):
+    monkeypatch.setattr(EEGCleaner, "_fit_asr", staticmethod(_fake_asr))
+    params = FilterParams(
+        clean_asr_max_std=2.0,
+        clean_asr_remove_only=remove_only,
+        clean_window_sec=0.5,
+        clean_power_max_sd=2.0,
+        clean_max_outbound_pct=20.0,
+    )
+    raw = _raw()
+    fresh = EEGCleaner.clean_mark(raw, params)
+    memo = _DiskMemo()
+    EEGCleaner.clean_mark(raw, params, memo=memo)
+    cached = EEGCleaner.clean_mark(raw, params, memo=memo)
+
+    assert ("asr" in {name for name, _ in memo.entries}) and len(fresh.annotations) > 0
+    np.testing.assert_array_equal(cached.get_data(), fresh.get_data())
+    if not remove_only:
+        # The reconstruction is ASR's float64 output, not a float32 round trip of it
+        expected = _fake_asr(raw.get_data() * 1e6, 100.0, 2.0, 0.5) / 1e6
+        np.testing.assert_array_equal(fresh.get_data(), expected)
+    np.testing.assert_array_equal(cached.annotations.onset, fresh.annotations.onset)
+    assert list(cached.annotations.description) == list(fresh.annotations.description)
+
+
+def test_marks_go_on_a_metadata_copy_that_shares_the_data():
+    raw = _raw()
+    params = FilterParams(clean_window_sec=0.5, clean_power_max_sd=2.0, clean_max_outbound_pct=20.0)
+    out = EEGCleaner.clean_mark(raw, params)
+    assert len(out.annotations) > 0 and len(raw.annotations) == 0
+    assert out is not raw and np.shares_memory(out._data, raw._data)
+
+
+def _reference_clean_mark(raw, params):
+    """clean_mark before the streaming series (baseline steps, condensed): each step reads all 'omit' data.
+
+    Returns (bads, annotations). The baseline's np.trapz no longer exists, so
+    its HF step always fell back to RMS; the series deliberately scores
+    Welch band power (n_fft=256, integrated with scipy's trapezoid), and so
+    does this reference.
+    """
+    sfreq = raw.info["sfreq"]
+    bads = list(raw.info["bads"])
+
+    def picks():
+        return mne.pick_types(raw.info, eeg=True, exclude=bads)
+
+    def mark(names):
+        bads[:] = sorted(set(bads + names))
+
+    # flatline
+    n = int(round(params.clean_flatline_sec * sfreq))
+    p = picks()
+    data = raw.get_data(picks=p, reject_by_annotation="omit")
+    mark([raw.ch_names[c] for c, x in zip(p, data)
+          if np.any(np.nanmax(swv(x, n), axis=-1) - np.nanmin(swv(x, n), axis=-1) == 0)])
+    # high-frequency noise
+    p = picks()
+    spec = raw.compute_psd(method="welch", fmin=30.0, fmax=50.0, picks=p, n_fft=256, n_overlap=0,
+                           reject_by_annotation=True, verbose="ERROR")
+    z = _safe_zscore(trapezoid(spec.get_data(), spec.freqs, axis=-1))
+    mark([raw.ch_names[p[i]] for i in np.flatnonzero(z > params.clean_hf_noise_sd_max)])
+    # low correlation with the median reference
+    p = picks()
+    data = raw.get_data(picks=p, reject_by_annotation="omit")
+    ref = np.nanmedian(data, axis=0)
+    corrs = np.array([abs(np.corrcoef(x, ref)[0, 1]) for x in data])
+    mark([raw.ch_names[p[i]] for i in np.flatnonzero(corrs < params.clean_corr_min)])
+
+    out = raw.copy()
+    out.info["bads"] = list(bads)
+    # ASR
+    win = int(round(params.clean_window_sec * sfreq))
+    if params.clean_asr_max_std:
+        p = picks()
+        data_uv = raw.get_data(picks=p) * 1e6
+        cleaned_uv = _fake_asr(data_uv, sfreq, params.clean_asr_max_std, params.clean_window_sec)
+        if params.clean_asr_remove_only:
+            rms = np.nanmedian(np.sqrt(np.nanmean(swv(data_uv - cleaned_uv, win, axis=1) ** 2, axis=-1)), axis=0)
+            starts = np.flatnonzero(_safe_zscore(rms).flatten() > params.clean_asr_max_std)
+            out.set_annotations(out.annotations + mne.Annotations(
+                starts / sfreq, [win / sfreq] * len(starts), ["bad_asr"] * len(starts)))
+        else:
+            out._data[p, :] = cleaned_uv / 1e6
+    # bad power windows
+    data = out.get_data(picks=picks(), reject_by_annotation="omit")
+    z = _safe_zscore(np.nanmean(swv(data, win, axis=1) ** 2, axis=-1), axis=1)
+    ok = (z >= params.clean_power_min_sd) & (z <= params.clean_power_max_sd)
+    starts = np.flatnonzero(100.0 * (1.0 - np.nanmean(ok, axis=0)) > params.clean_max_outbound_pct)
+    out.set_annotations(out.annotations + mne.Annotations(
+        starts / sfreq, [win / sfreq] * len(starts), ["bad_power"] * len(starts)))
+    return out.info["bads"], out.annotations
+
+
+def _noisy_raw():
+    """Channels sharing a common signal, with a flat, a high-frequency, an uncorrelated channel and bursts."""
+    rng = np.random.default_rng(3)
+    n_ch, n_times, sfreq = 10, 6000, 100.0
+    common = rng.normal(size=n_times)
+    data = common + 0.3 * rng.normal(size=(n_ch, n_times))
+    data[1, 1000:1200] = data[1, 1000]  # flat for 2 s
+    data[4] += 2.0 * np.sin(2 * np.pi * 40.0 * np.arange(n_times) / sfreq)
+    data[7] = rng.normal(size=n_times)
+    data[:, 3000:3100] *= 8
+    data[:, 4510:4540] *= 6
+    raw = mne.io.RawArray(data * 1e-5, mne.create_info(n_ch, sfreq, "eeg"), verbose="ERROR")
+    raw.set_annotations(mne.Annotations([20.0, 45.0], [2.0, 1.5], ["BAD_a", "bad_b"]))
+    return raw
+
+
+@pytest.mark.parametrize("asr", [None, "reconstruct", "remove_only"])
+def test_clean_mark_matches_the_pre_streaming_implementation(monkeypatch, asr):
+    monkeypatch.setattr(EEGCleaner, "_fit_asr", staticmethod(_fake_asr))
+    params = FilterParams(
+        clean_flatline_sec=1.0,
+        clean_hf_noise_sd_max=2.0,
+        clean_corr_min=0.4,
+        clean_asr_max_std=2.5 if asr else None,
+        clean_asr_remove_only=asr == "remove_only",
+        clean_window_sec=0.5,
+        clean_power_min_sd=-5.0,
+        clean_power_max_sd=3.0,
+        clean_max_outbound_pct=20.0,
+    )
+    raw = _noisy_raw()
+    bads, annotations = _reference_clean_mark(raw, params)
+    assert bads == ["1", "4", "7"] and set(annotations.description) >= {"bad_power"}
+
+    out = EEGCleaner.clean_mark(raw, params)
+    assert out.info["bads"] == bads
+    np.testing.assert_allclose(out.annotations.onset, annotations.onset)
+    np.testing.assert_allclose(out.annotations.duration, annotations.duration)
+    assert list(out.annotations.description) == list(annotations.description)
@@ -0,0 +1,166 @@
+import mne
+import numpy as np
+import pytest
+from scipy.integrate import trapezoid
+
+from app.pipeline.signal_stream import (
+    FlatRuns,
+    MedianRefCorr,
+    WelchBandPower,
+    WindowOutliers,
+    WindowPower,
+    abs_corr,
+    n_good_samples,
+    stream_stats,
+    window_power,
+)
+
+
+def _raw(n_ch: int = 6, n_times: int = 5000, sfreq: float = 100.0, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=(n_ch, n_times))
+    data[:, 1200:1400] *= 6
+    data[2, 3000:3300] *= 15
+    return mne.io.RawArray(data * 1e-6, mne.create_info(n_ch, sfreq, "eeg"), verbose="ERROR")
+
+
+@pytest.mark.parametrize("step", [1, 50])
+@pytest.mark.parametrize("block_sec", [0.0, 7.3])
+def test_window_power_matches_whole_recording_zscore(step, block_sec):
+    raw = _raw()
+    raw.set_annotations(mne.Annotations([20.0], [3.0], ["BAD_seg"]))
+    picks = np.arange(6)
+    win = 100
+    data = raw.get_data(reject_by_annotation="omit")
+    power = window_power(data, win, step)
+    mean, sd = power.mean(axis=1), power.std(axis=1)
+    z = (power - mean[:, None]) / sd[:, None]
+    expected = np.flatnonzero(100.0 * (1.0 - ((z >= -2) & (z <= 2)).mean(axis=0)) > 30.0)
+
+    n = data.shape[1]
+    stats = stream_stats(raw, picks, [WindowPower(6, win, step, n)], block_sec=block_sec)[0].result()
+    np.testing.assert_allclose(stats["mean"], mean, rtol=1e-12)
+    np.testing.assert_allclose(stats["sd"], sd, rtol=1e-9)
+
+    acc = WindowOutliers(win, step, n, stats, -2.0, 2.0, 30.0)
+    flagged = stream_stats(raw, picks, [acc], block_sec=block_sec)[0].result()
+    assert expected.size > 0
+    np.testing.assert_array_equal(flagged, expected)
+
+
+def test_window_power_constant_channel_has_no_sd():
+    raw = _raw()
+    raw._data[1] = 0.0
+    stats = stream_stats(raw, np.arange(6), [WindowPower(6, 100, 1, raw.n_times)], block_sec=10.0)[0].result()
+    assert np.isnan(stats["sd"][1]) and np.isfinite(stats["sd"][[0, 2]]).all()
+
+
+def _flat_runs_reference(data):
+    best = np.zeros(data.shape[0], dtype=int)
+    for ch, row in enumerate(data):
+        run = 1
+        best[ch] = 1
+        for a, b in zip(row[:-1], row[1:]):
+            run = run + 1 if a == b else 1
+            best[ch] = max(best[ch], run)
+    return best
+
+
+@pytest.mark.parametrize("block_sec", [0.0, 0.37, 2.0])
+def test_flat_runs_match_per_channel_loop(block_sec):
+    raw = _raw(n_times=1000)
+    raw._data[0, 200:240] = 5e-6
+    raw._data[1, 30:70] = 0.0  # crosses the 0.37 s block edges
+    raw._data[1, 300:340] = 0.0
+    raw._data[3, 500:520] = np.nan  # NaN never equals NaN
+    raw._data[4, 950:] = 1e-6  # run up to the last sample
+    raw.set_annotations(mne.Annotations([1.2], [0.3], ["BAD_seg"]))
+    raw._data[2, 110:120] = raw._data[2, 150:165] = 2e-6  # joined across the omitted span
+    expected = _flat_runs_reference(raw.get_data(reject_by_annotation="omit"))
+    result = stream_stats(raw, np.arange(6), [FlatRuns(6)], block_sec=block_sec)[0].result()
+    np.testing.assert_array_equal(result, expected)
+    assert list(expected[:5]) == [40, 40, 25, 1, 50]
+
+
+@pytest.mark.parametrize("win,step,start", [(50, 1, 0), (64, 7, 3), (1, 1, 0)])
+def test_window_power_matches_sliding_window_mean(win, step, start):
+    data = np.random.default_rng(1).normal(size=(4, 700))
+    data[1, 100:180] = np.nan  # fully NaN windows give NaN
+    data[2, ::13] = np.nan
+    windows = np.lib.stride_tricks.sliding_window_view(data, win, axis=1)[:, start::step]
+    with np.errstate(invalid="ignore"), pytest.warns(RuntimeWarning, match="Mean of empty slice"):
+        expected = np.nanmean(windows ** 2, axis=-1)
+    np.testing.assert_allclose(window_power(data, win, step, start), expected, rtol=1e-9, atol=1e-12)
+
+
+def _corr_reference(data, ref, min_samples=10):
+    out = np.empty(data.shape[0])
+    for ch, x in enumerate(data):
+        mask = np.isfinite(x) & np.isfinite(ref)
+        out[ch] = 1.0 if mask.sum() < min_samples else abs(np.corrcoef(x[mask], ref[mask])[0, 1])
+    return out
+
+
+def test_abs_corr_matches_corrcoef_with_pairwise_nans():
+    rng = np.random.default_rng(2)
+    ref = rng.normal(size=500) + 1e3  # a large offset must not cost precision
+    data = 0.5 * ref + rng.normal(size=(5, 500))
+    data[1, ::3] = np.nan
+    ref[::7] = np.nan
+    data[4, 5:] = np.nan  # too few shared samples
+    np.testing.assert_allclose(abs_corr(data, ref), _corr_reference(data, ref), rtol=1e-9)
+    assert abs_corr(data, ref)[4] == 1.0
+
+
+@pytest.mark.filterwarnings("ignore:Mean of empty slice")  # a window of channel 3 is all NaN
+@pytest.mark.parametrize("win", [None, 150])
+@pytest.mark.parametrize("block_sec", [0.0, 4.1])
+def test_median_ref_corr_matches_whole_recording(win, block_sec):
+    raw = _raw(n_times=2000)
+    raw._data[3, 700:900] = np.nan
+    raw.set_annotations(mne.Annotations([11.0], [2.0], ["BAD_seg"]))
+    data = raw.get_data(reject_by_annotation="omit")
+    ref = np.nanmedian(data, axis=0)
+    if win is None:
+        expected = _corr_reference(data, ref)
+    else:
+        n_win = data.shape[1] // win
+        expected = np.nanmedian(np.stack([
+            _corr_reference(data[:, i * win:(i + 1) * win], ref[i * win:(i + 1) * win])
+            for i in range(n_win)
+        ], axis=1), axis=1)
+    result = stream_stats(raw, np.arange(6), [MedianRefCorr(6, win)], block_sec=block_sec)[0].result()
+    np.testing.assert_allclose(result, expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize("block_sec", [0.0, 3.3, 60.0])
+def test_stream_blocks_concatenate_to_omitted_data(block_sec):
+    raw = _raw()
+    raw.set_annotations(mne.Annotations([0.0, 12.0, 30.5], [1.5, 4.0, 2.0], ["BAD_a", "BAD_b", "edge"]))
+
+    class Collect:
+        align = 1
+
+        def __init__(self):
+            self.blocks = []
+
+        def update(self, data, new_span=False):
+            self.blocks.append(data)
+
+    acc = stream_stats(raw, [0, 2, 5], [Collect()], block_sec=block_sec)[0]
+    expected = raw.get_data(picks=[0, 2, 5], reject_by_annotation="omit")
+    np.testing.assert_array_equal(np.concatenate(acc.blocks, axis=1), expected)
+    assert n_good_samples(raw) == expected.shape[1]
+
+
+@pytest.mark.parametrize("block_sec", [0.0, 3.3])
+def test_welch_band_power_matches_compute_psd(block_sec):
+    raw = _raw()
+    raw.set_annotations(mne.Annotations([12.0], [4.0], ["BAD_seg"]))
+    spectrum = raw.compute_psd(
+        method="welch", fmin=20.0, fmax=45.0, n_fft=256, n_overlap=0, verbose="ERROR"
+    )
+    expected = trapezoid(spectrum.get_data(), spectrum.freqs, axis=-1)
+    acc = WelchBandPower(100.0, 20.0, 45.0, n_fft=256)
+    result = stream_stats(raw, np.arange(6), [acc], block_sec=block_sec)[0].result()
+    np.testing.assert_allclose(result, expected, rtol=1e-9)
@@ -0,0 +1,61 @@
+import mne
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core.cache_key_helper import get_epochs_key
+from app.core.cache_manager import LocalCache
+from app.pipeline.task_processor import EEGTaskProcessor, preprocess_surround_supp
+from app.schemas.session_schema import PipelineSession
+from app.schemas.task_schema import SingleSubjectTask
+
+
+@pytest.fixture
+def processor(tmp_path):
+    task = SingleSubjectTask(subject="s", task="surroundSupp", run=1)
+    return EEGTaskProcessor(None, None, task, LocalCache(base_dir=tmp_path, pipeline_ver="v3"))
+
+
+def _wide_epochs(bad_onset: float | None):
+    """Epochs over [-0.4, 0.8] s; an optional bad annotation drops the epoch it overlaps."""
+    rng = np.random.default_rng(0)
+    raw = mne.io.RawArray(rng.normal(size=(3, 2000)), mne.create_info(3, 100.0, "eeg"), verbose="ERROR")
+    if bad_onset is not None:
+        raw.set_annotations(mne.Annotations([bad_onset], [0.1], ["BAD_segment"]))
+    events = np.array([[300 + 300 * i, 0, 1] for i in range(5)])
+    return mne.Epochs(raw, events, {"a": 1}, tmin=-0.4, tmax=0.8, preload=True, verbose="ERROR")
+
+
+@pytest.mark.parametrize("bad_onset, reused", [(None, True), (8.65, False)])
+def test_crop_reuses_only_wider_windows_that_kept_every_event(processor, bad_onset, reused):
+    wide = PipelineSession(epochs={"tmin": -0.4, "tmax": 0.8})
+    narrow = PipelineSession(epochs={"tmin": -0.1, "tmax": 0.5})
+    epochs = _wide_epochs(bad_onset)
+    # The bad segment sits in the wide window of the third event but outside its narrow one
+    assert len(epochs) == (5 if reused else 4)
+    processor.cache.save_epochs(epochs, processor.cache_key("epochs", get_epochs_key(wide)))
+
+    ck = processor.cache_key("epochs", get_epochs_key(narrow))
+    cropped, _ = processor._crop_cached_epochs(ck, narrow)
+    assert (cropped is not None) is reused
+    if reused:
+        assert cropped.times[0] == pytest.approx(-0.1) and cropped.times[-1] == pytest.approx(0.5)
+
+
+def test_stimulus_only_at_the_edges_is_not_offered(processor, monkeypatch):
+    raw = mne.io.RawArray(np.zeros((3, 2000)), mne.create_info(3, 100.0, "eeg"), verbose="ERROR")
+    rows = [(0.05, 1, 0.6, 2), (5.0, 0, 0.3, 1), (10.0, 0, 0.3, 1), (19.9, 1, 0.6, 2)]
+    events = pd.DataFrame(
+        [{"value": "stim_ON", "onset": onset, "background": bg, "foreground_contrast": fg, "stimulus_cond": st}
+         for onset, bg, fg, st in rows]
+    )
+    monkeypatch.setattr(processor, "get_filtered", lambda session: raw)
+    monkeypatch.setattr(processor, "get_events", lambda: events)
+    session = PipelineSession(epochs={"tmin": -0.2, "tmax": 0.5})
+
+    epochs, labels = preprocess_surround_supp(processor, session)
+    assert list(epochs.event_id) == ["bg0_fg0.3_stim1"] and list(labels) == ["bg0_fg0.3_stim1"] * 2
+    assert [log for log in epochs.drop_log if log] == [("NO_DATA",), ("NO_DATA",)]
+
+    edge_only = session.epochs.model_copy(update={"stimulus": "bg1_fg0.6_stim2"})
+    assert processor._apply_stimulus_filter(epochs, edge_only) is None